@@ -68,17 +68,38 @@ version - a version string of the form a.b.c
 
 WSGIApplication - an instance of this class is a callable WSGI application (see below)
 
+ASGIApplication - as WSGIApplication, but an instance is a callable ASGI application (see below)
+
 set_debug(mode) - a function to turn on debugging (if mode is True), or off (if mode is False)
 
+set_snapshot(mode, secret) - if mode is True, when a project is loaded, a snapshot of the built project is
+                     written to the file project.snapshot alongside project.json, and later loads read
+                     the snapshot rather than parsing project.json, provided the skipole version and the
+                     modification time and size of project.json are unchanged. The snapshot holds pickled
+                     objects, so is signed with an HMAC using secret, a string or bytes which you should keep
+                     private, and a snapshot without a valid signature is ignored. Call set_snapshot(True, secret)
+                     before creating the WSGIApplication to use snapshots. Default False.
+
+set_lazy_load(mode) - if mode is True, projects created afterwards only build their folders and the
+                      pages without part trees at startup, and each TemplatePage and SVG page is created
+                      from its JSON when first called. Default False.
+
+memory_report() - returns a dictionary of the resident, shared and private memory of the current process
+                  in kilobytes, with the process id, or None if not available (it reads the Linux /proc files).
+
 use_submit_list - is available to optionally wrap the user defined submit_data function
                   Enables a responder 'submit list' to define package,module,function to
                   be called as the responder's submit_data function, where package,module
-                  is relative to the users code.
+                  is relative to the users code. The functions are imported on first use,
+                  or at startup by calling the WSGIApplication resolve_submit_lists() method.
 
 PageData - An instance of this class is used to update page widgets.
 
 SectionData - An instance of this class is used to update section widgets
 
+MultipliedSectionData - An instance of this class holds the widget values of a multiplied section, as
+                        a column of values for each widget field, rather than a SectionData for each section
+
 widget_modules() - Return a tuple of widget module names
 
 widgets_in_module(module_name) - Returns a tuple of widget names present in the module
@@ -156,6 +177,69 @@ received_cookies dictionary, and with your application's proj_data dictionary. I
 returns None, the call proceeds unhindered to the subapplication. If however your function returns
 an ident tuple, of the form (proj_ident, pagenumber), then the call is routed to that page instead.
 
+Each project caches the page idents found for requested paths, including paths which are not
+found. The method path_cache_info() returns a dictionary of the cache 'hits', 'misses', 'size' and
+'maxsize', and the attribute path_cache_size sets the maximum number of paths held, default 1024.
+
+Submitted form data is only read when a responder requires it. The caller page ident is taken from
+the query string if present, otherwise the request body is only parsed when a responder reads the form
+data, or your functions read skicall.caller_ident or skicall.ident_data. Uploaded files are held in memory
+up to form_memory_limit bytes (default 1MB) and written to temporary files thereafter, their contents are
+received as bytes, and skicall.uploaded_file(widgfield) returns the file as a file like object which can be
+read as a stream, with attribute filename giving the name of the file. The attribute form_disk_limit
+sets the maximum size of a request body, default None for no limit, larger requests are rejected.
+
+Template, SVG, CSS and JSON pages with enable_cache set are held in a response cache, and later
+calls are answered from the cache, with an ETag header so If-None-Match requests receive
+'304 Not Modified'. A page is only cached if your functions set no page_data for it, or if they
+set skicall.cache_key to a hashable value, such as a tuple, which determines the page_data set.
+The page is then cached against its ident, the language and this key. The attribute
+response_cache_size sets the maximum number of responses held, default 256, zero disables the cache.
+
+The method set_compression() enables gzip or deflate compression of responses, for clients which
+accept it, with a minimum size, a list of compressible mimetypes and a compression level.
+
+For production, the method preload_files() reads the files of all FilePages into memory, which are
+then served without reading the file, with an ETag, gzip (or brotli if installed) compression where
+the client accepts it, and support for Range requests. skis.makeapp(preload=True) does this for the
+skis javascript and css files.
+
+If set_lazy_load(True) is called before the WSGIApplication is created, template and SVG pages are
+created when first called. Setting the attribute page_idle_time to a number of seconds then releases
+pages which have not been called for that time, these are checked at most once per page_idle_time,
+and a released page is created again when next called. The method evict_idle_pages() does this directly.
+
+For pre-forking servers, such as gunicorn with preload_app = True, or uwsgi without lazy-apps, the
+application module is imported in the parent process before workers are forked. At the end of that module,
+once all sub projects are added, call my_application.freeze(preload=None), where preload is an optional
+function of your own, called with the application, to load any further data to be shared. This creates
+all pages and their field indexes, then calls gc.freeze() so the collector in each worker leaves the
+loaded objects untouched, and their memory pages remain shared between the workers. Calling
+skipole.memory_report() within a worker, for example in your end_call function, then shows how much of
+its memory is shared, and how much private.
+
+The same project can be served several times, with a different proj_ident for each instance, for example
+one per tenant, each with its own proj_data. Instances created one after another share the project.json file
+read and upgraded by the first, only the last file read being held, and all share one set of TextBlocks, while
+the files are unchanged. In lazy load mode they also share the json from which each template and svg page is
+created. The built pages are not shared, each instance builds its own, as these hold its idents, and with
+set_snapshot these are saved to project.<proj_ident>.snapshot.
+
+The method reload() reads project.json and the textblocks files again, while calls continue to be served.
+Pages and sections which are unchanged are kept with their cached data, and the new version is swapped in
+once built, so calls in progress finish with the previous version. The method watch_files(interval=2.0)
+starts a thread which calls reload() whenever these files change, and stop_watching() stops it.
+
+Rather than each browser calling a JSON page every interval seconds, a template page can set
+page_data['EventTarget'] to a SubmitEventStream responder. Its submit_data returns a channel, and the
+browser then holds one open response, a stream of server sent events. Whenever your code calls
+my_application.publish(channel, page_data), the page_data is set into the responder's target JSON page,
+once, and sent to every browser on that channel. Browsers without EventSource, or whose stream is refused,
+fall back to calling the target every interval seconds. Each stream is closed after five minutes, and the
+browser reconnects. Under WSGI each open stream holds a server thread, so only max_wsgi_streams streams, default
+8, are held open, further browsers being sent the JSON page, which they then call at intervals. Serve the project
+with the ASGIApplication, where streams wait in the event loop, to hold more streams open.
+
 The skis module has the function makeapp() which creates a project providing needed javascript
 files which should be added to your application, for example:
 
@@ -165,23 +249,49 @@ my_application.add_project(skis_application, url='/lib')
 
 Which causes the skis project to be served at /lib.
 
+
+ASGIApplication
+---------------
+
+ASGIApplication takes the same arguments as WSGIApplication, and has the same methods, but an
+instance is an ASGI application, served by an ASGI server such as uvicorn or hypercorn. Your
+start_call, submit_data and end_call functions may then be async def functions, and are awaited
+in the server's event loop, so can use asynchronous database and http clients. The request body
+is received in the event loop, and the page is built in a thread of a pool, optional argument
+max_workers, so the event loop is not held while pages are built. The thread is released while
+your async functions are awaited, and the building of the page continues in a thread of the pool
+when they complete, so calls waiting on slow clients or services do not hold threads. A
+SubmitIterator responder's submit_data may return an asynchronous iterator, and event streams
+wait in the event loop rather than in a thread. The same project files are served unchanged by
+either class, and a WSGIApplication also accepts async def functions, running them in an event
+loop held by each server thread.
+
+my_application = ASGIApplication(project=PROJECT,
+                                 projectfiles=PROJECTFILES,
+                                 proj_data=PROJ_DATA,
+                                 start_call=start_call,
+                                 submit_data=submit_data,
+                                 end_call=end_call,
+                                 url="/")
+
 """
 
-import sys, traceback, inspect, pkgutil
+import sys, os, traceback, inspect, pkgutil, gc
 
+from concurrent.futures import ThreadPoolExecutor
 from functools import wraps
 from importlib import import_module
 
-from .ski import skiboot, widgets
+from .ski import skiboot, widgets, read_json, asgi
 
-from .ski.project_class_definition import SkipoleProject, PageData, SectionData
+from .ski.project_class_definition import SkipoleProject, PageData, SectionData, MultipliedSectionData
 from .ski.excepts import ValidateError, ServerError, GoTo, FailPage, ServeFile
 
 version = skiboot.version()
 
 
-__all__ = ['WSGIApplication', 'ValidateError', 'ServerError', 'GoTo', 'FailPage', 'ServeFile',
-           'set_debug', 'use_submit_list', 'version', 'PageData', 'SectionData', 'widget_modules', 'widgets_in_module']
+__all__ = ['WSGIApplication', 'ASGIApplication', 'ValidateError', 'ServerError', 'GoTo', 'FailPage', 'ServeFile',
+           'set_debug', 'set_snapshot', 'set_lazy_load', 'memory_report', 'use_submit_list', 'version', 'PageData', 'SectionData', 'MultipliedSectionData', 'widget_modules', 'widgets_in_module']
 
 
 class WSGIApplication(object):
@@ -271,6 +381,165 @@ proj_ident - generally set to None, in which case it will be auto set to the pro
            proj is the sub project WSGIApplication object."""
         return self._skipoleproject.add_project(proj._skipoleproject, url, check_cookies)
 
+    def preload_files(self, compress=True):
+        """Reads the files of all FilePages of this project into memory, and serves them from memory thereafter.
+           If compress is True, gzip compressed variants are also held, and brotli if the brotli package is installed.
+           Files changed after this is called are not served until it is called again. Returns the number of files loaded."""
+        return self._skipoleproject.preload_files(compress)
+
+    def set_compression(self, enable=True, min_size=1024, mimetypes=None, level=6):
+        """Enables or disables gzip or deflate compression of responses, for clients which accept it.
+           Only responses of at least min_size bytes, with a content-type in the mimetypes list are compressed,
+           if mimetypes is None, a default list of text, javascript, json, xml and svg types is used.
+           level is the compression level, 1 to 9. Compressed variants of cached responses are cached, so are
+           only compressed once. This should be set on the root application, and applies to all sub projects."""
+        proj = self._skipoleproject
+        proj.compression = bool(enable)
+        proj.compress_min_size = int(min_size)
+        if mimetypes is None:
+            proj.compress_mimetypes = SkipoleProject.compress_mimetypes
+        else:
+            proj.compress_mimetypes = tuple(mimetype.lower() for mimetype in mimetypes)
+        proj.compress_level = int(level)
+        # clear any cached compressed responses
+        proj.clear_cache()
+        for subproj in proj.subprojects.values():
+            subproj.clear_cache()
+
+    def path_cache_info(self):
+        """Returns a dictionary of statistics of this project's cache of paths against page idents,
+           with keys 'hits', 'misses', 'size' and 'maxsize'. The maximum size can be changed by setting
+           the path_cache_size attribute of this application."""
+        return self._skipoleproject.path_cache_info()
+
+    def get_path_cache_size(self):
+        return self._skipoleproject.path_cache_size
+
+    def set_path_cache_size(self, size):
+        self._skipoleproject.path_cache_size = int(size)
+        self._skipoleproject.clear_cache()
+
+    path_cache_size = property(get_path_cache_size, set_path_cache_size, doc="The maximum number of paths held in the path cache")
+
+    def get_response_cache_size(self):
+        return self._skipoleproject.response_cache_size
+
+    def set_response_cache_size(self, size):
+        self._skipoleproject.response_cache_size = int(size)
+        self._skipoleproject.clear_cache()
+
+    response_cache_size = property(get_response_cache_size, set_response_cache_size, doc="The maximum number of responses held in the response cache")
+
+    def get_section_cache_size(self):
+        return self._skipoleproject.section_cache_size
+
+    def set_section_cache_size(self, size):
+        self._skipoleproject.section_cache_size = int(size)
+
+    section_cache_size = property(get_section_cache_size, set_section_cache_size,
+                                  doc="The maximum number of sections held ready to be imported into pages")
+
+    def get_max_wsgi_streams(self):
+        return self._skipoleproject.max_wsgi_streams
+
+    def set_max_wsgi_streams(self, number):
+        self._skipoleproject.max_wsgi_streams = int(number)
+
+    max_wsgi_streams = property(get_max_wsgi_streams, set_max_wsgi_streams,
+                                doc="The maximum number of event streams held open by a WSGI server, each holding a server thread")
+
+    def get_form_memory_limit(self):
+        return self._skipoleproject.form_memory_limit
+
+    def set_form_memory_limit(self, limit):
+        self._skipoleproject.form_memory_limit = int(limit)
+
+    form_memory_limit = property(get_form_memory_limit, set_form_memory_limit,
+                                 doc="The number of bytes of an uploaded file held in memory before it is written to a temporary file")
+
+    def get_form_disk_limit(self):
+        return self._skipoleproject.form_disk_limit
+
+    def set_form_disk_limit(self, limit):
+        if limit is None:
+            self._skipoleproject.form_disk_limit = None
+        else:
+            self._skipoleproject.form_disk_limit = int(limit)
+
+    form_disk_limit = property(get_form_disk_limit, set_form_disk_limit,
+                               doc="The maximum size in bytes of a request body, None for no limit")
+
+    def get_page_idle_time(self):
+        return self._skipoleproject.page_idle_time
+
+    def set_page_idle_time(self, seconds):
+        if seconds is None:
+            self._skipoleproject.page_idle_time = None
+        else:
+            self._skipoleproject.page_idle_time = float(seconds)
+
+    page_idle_time = property(get_page_idle_time, set_page_idle_time,
+                              doc="In lazy load mode, pages not accessed for this number of seconds are released, None to keep all pages")
+
+    def evict_idle_pages(self, max_idle=None):
+        """In lazy load mode, releases pages not accessed for max_idle seconds, or if None, for page_idle_time seconds.
+           A released page is created again from its JSON when next accessed. Returns the number of pages released"""
+        return self._skipoleproject.evict_idle_pages(max_idle)
+
+    def freeze(self, preload=None):
+        """Call once the application and its sub projects are loaded, in the parent process of a pre-forking
+           server, before the workers are forked. Every page is created (in lazy load mode) with its compiled static
+           parts, field index and section templates, and the validation plans, routes and paths used when serving
+           calls are built, so the workers share them rather than building their own. Then if given, preload is called
+           with this application, to load any data of your own which should be shared. Finally a garbage collection is
+           run and gc.freeze() moves all objects to the permanent generation, so the collector of each worker does not
+           write to them, and their memory stays shared. The projects can no longer be altered, reload raises ServerError,
+           watch_files does not start, and pages are no longer released by page_idle_time.
+           Returns the number of pages and folders prepared"""
+        proj = self._skipoleproject
+        count = proj.freeze()
+        for subproj in proj.subprojects.values():
+            count += subproj.freeze()
+        if preload is not None:
+            preload(self)
+        # the project.json files shared while loading are no longer needed
+        read_json.clear_definitions()
+        gc.collect()
+        gc.freeze()
+        return count
+
+    def reload(self):
+        """Reads this project's project.json and textblocks files again, and swaps in the new version once it is built,
+           keeping unchanged pages and their cached data. Calls in progress finish with the previous version.
+           Returns the number of pages and sections changed, added or removed"""
+        return self._skipoleproject.reload()
+
+    def watch_files(self, interval=2.0):
+        """Starts a thread which checks this project's project.json and textblocks files every interval seconds,
+           and reloads the project when they change. Returns True if started, False if already running"""
+        return self._skipoleproject.watch_files(interval)
+
+    def stop_watching(self):
+        "Stops the thread started by watch_files"
+        self._skipoleproject.stop_watching()
+
+    def publish(self, channel, page_data):
+        """Sends page_data, a PageData, SectionData or dictionary, to every client holding an event stream opened on
+           channel by a SubmitEventStream responder, of this project or its sub projects. The page_data is set into the
+           responder's target JSON page, and sent as that page would be to a call. Returns the number of clients sent the update"""
+        return self._skipoleproject.publish(channel, page_data)
+
+    def close_streams(self, channel=None):
+        """Ends the event streams on channel, or every stream if channel is None, for example before the server is
+           stopped. The browsers reconnect when they are able"""
+        self._skipoleproject.close_streams(channel)
+
+    def resolve_submit_lists(self):
+        """If submit_data is decorated with use_submit_list, imports the functions given by the submit_list
+           of every responder in this project, so any missing function raises a ServerError now, rather than
+           when the responder is called. Returns the number of submit lists resolved"""
+        return self._skipoleproject.resolve_submit_lists()
+
     def set_accesstextblocks(self, accesstextblocks):
         """Set an instance of a class which reads and writes TextBlocks. The default class is defined in the skipole.textblocks module,
            which simply stores TextBlocks in memory after reading them from a JSON file, and is not suitable for the dynamic creation
@@ -280,45 +549,142 @@ proj_ident - generally set to None, in which case it will be auto set to the pro
         self._skipoleproject.textblocks = accesstextblocks
 
 
+class ASGIApplication(WSGIApplication):
+    """The ASGIApplication - an instance being a callable ASGI application, with the methods of the WSGIApplication"""
+
+    def __init__(self, project, projectfiles, proj_data={}, start_call=None, submit_data=None, end_call=None, url="/", proj_ident=None, max_workers=None):
+        """An instance of this class is a callable ASGI application.
+
+Arguments are as WSGIApplication, with:
+
+start_call, submit_data, end_call - your functions, which may be async def functions
+
+max_workers - the number of threads in which pages are built, a thread is not held while async user functions
+are awaited, None for the ThreadPoolExecutor default
+"""
+        WSGIApplication.__init__(self, project, projectfiles, proj_data, start_call, submit_data, end_call, url, proj_ident)
+        self.max_workers = max_workers
+        # the thread pool, created on the first call
+        self._executor = None
+
+    async def __call__(self, scope, receive, send):
+        "The instance is callable"
+        if scope['type'] == 'http':
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='skipole')
+            await asgi.respond(self._skipoleproject, self._executor, scope, receive, send)
+        elif scope['type'] == 'lifespan':
+            while True:
+                message = await receive()
+                if message['type'] == 'lifespan.startup':
+                    await send({'type': 'lifespan.startup.complete'})
+                elif message['type'] == 'lifespan.shutdown':
+                    # end any event streams, and the thread pool
+                    self.close_streams()
+                    if self._executor is not None:
+                        self._executor.shutdown(wait=False)
+                        self._executor = None
+                    await send({'type': 'lifespan.shutdown.complete'})
+                    return
+        elif scope['type'] == 'websocket':
+            # websockets are not served
+            await receive()
+            await send({'type': 'websocket.close'})
+
+
 def set_debug(mode):
     "If mode is True, this sets increased debug error messages to be displayed"
     skiboot.set_debug(mode)
 
 
+def memory_report():
+    """Returns a dictionary of the memory used by this process, with keys 'pid', 'rss', 'shared' and 'private',
+       the sizes being in kilobytes, read from /proc/self/smaps_rollup. Returns None if this is not available,
+       as it is Linux specific. Calling this in each worker shows how much of the memory remains shared"""
+    report = {'pid':os.getpid(), 'rss':0, 'shared':0, 'private':0}
+    try:
+        with open('/proc/self/smaps_rollup', 'r') as fp:
+            for line in fp:
+                key, sep, value = line.partition(':')
+                if not sep:
+                    continue
+                size = value.split()
+                if (not size) or (not size[0].isdigit()):
+                    continue
+                if key == 'Rss':
+                    report['rss'] = int(size[0])
+                elif key.startswith('Shared_'):
+                    report['shared'] += int(size[0])
+                elif key.startswith('Private_'):
+                    report['private'] += int(size[0])
+    except OSError:
+        return
+    return report
+
+
+def set_snapshot(mode, secret=None):
+    """If mode is True, projects are loaded from, and saved to, a project.snapshot file, signed with
+       secret, a string or bytes, which is required if mode is True"""
+    skiboot.set_snapshot(mode, secret)
+
+
+def set_lazy_load(mode):
+    "If mode is True, projects created afterwards create template and SVG pages when first accessed"
+    skiboot.set_lazy_load(mode)
+
+
 
 # This 'use_submit_list' is available to wrap the submit_data function if required
 
 def use_submit_list(submit_data):
-    "Used to decorate submit_data to enable submit_list to define package,module,function"
-    @wraps(submit_data)
-    def submit_function(skicall):
-        "This function replaces submit_data, if skicall.submit_list has two or more elements"
-        if not skicall.submit_list:
-            # do nothing, simply return the original submit_data
-            return submit_data(skicall)
-        if len(skicall.submit_list) < 2:
-            # do nothing, simply return the original submit_data
-            return submit_data(skicall)
-        # get the module where submit_data is defined
-        sdmodule = inspect.getmodule(submit_data)
+    """Used to decorate submit_data to enable submit_list to define package,module,function
+       The functions found are cached against the submit_list, so each is only imported once.
+       The decorated function has a resolve(submit_list) attribute which returns the function,
+       used by WSGIApplication.resolve_submit_lists() to import all functions at startup"""
+    # get the module where submit_data is defined
+    sdmodule = inspect.getmodule(submit_data)
+    # cache of {tuple of submit_list: function}
+    resolved = {}
+
+    def resolve(submit_list):
+        "Returns the function given by submit_list, raises ServerError if not found"
+        key = tuple(submit_list)
+        submitfunc = resolved.get(key)
+        if submitfunc is not None:
+            return submitfunc
         if sdmodule.__name__ == "__main__":
             # absolute path
-            submitpath = ".".join(skicall.submit_list[:-1])
+            submitpath = ".".join(key[:-1])
             sdpackage = None
         else:
             # relative path
-            submitpath = "." + ".".join(skicall.submit_list[:-1])
+            submitpath = "." + ".".join(key[:-1])
             sdpackage = sdmodule.__name__
         try:
             submitmodule = import_module(submitpath, sdpackage)
         except Exception as e:
             raise ServerError("Unable to import project module defined as %s in submit list" % (submitpath,)) from e
-        # now obtain and run the specified function
+        # now obtain the specified function
         try:
-            submitfunc = getattr(submitmodule, skicall.submit_list[-1])
+            submitfunc = getattr(submitmodule, key[-1])
         except Exception as e:
-            raise ServerError("submit_list package %s found, but the required function %s is not recognised" % (submitpath, skicall.submit_list[-1])) from e
-        return submitfunc(skicall)
+            raise ServerError("submit_list package %s found, but the required function %s is not recognised" % (submitpath, key[-1])) from e
+        resolved[key] = submitfunc
+        return submitfunc
+
+    @wraps(submit_data)
+    def submit_function(skicall):
+        "This function replaces submit_data, if skicall.submit_list has two or more elements"
+        if not skicall.submit_list:
+            # do nothing, simply return the original submit_data
+            return submit_data(skicall)
+        if len(skicall.submit_list) < 2:
+            # do nothing, simply return the original submit_data
+            return submit_data(skicall)
+        # obtain and run the specified function
+        return resolve(skicall.submit_list)(skicall)
+
+    submit_function.resolve = resolve
     return submit_function
 
 
@@ -0,0 +1,209 @@
+"""
+This module serves a SkipoleProject as an ASGI application, used by skipole.ASGIApplication
+
+The request body is received in the event loop, and held in a temporary file, which is
+held in memory up to the project form_memory_limit. The call is then made into a WSGI environ,
+and the project response is built by a generator, each step of which is run in a thread of
+a thread pool, so the event loop is not held while pages are built. Between steps, the
+coroutines returned by async def user functions are awaited in the event loop, and no thread
+is held while they wait. The response data is then sent from the event loop, asynchronous
+iterators, such as event streams, being iterated in the loop, and other iterators, such as
+files, read in the thread pool.
+"""
+
+
+import sys, asyncio, tempfile
+
+
+class ReceiveInput(object):
+    """A file like object used as wsgi.input, the request body is received from the ASGI receive
+       channel by the coroutine receive, called in the event loop before the response is built,
+       its read methods are then called from a thread of the pool"""
+
+    def __init__(self, memory_limit=1048576, disk_limit=None):
+        self._file = tempfile.SpooledTemporaryFile(max_size=memory_limit, mode='w+b')
+        self._disk_limit = disk_limit
+
+    async def receive(self, receive):
+        """Receives the request body, if it exceeds disk_limit, the remainder is not received, and the
+           form data is rejected when read. If the client disconnects, the body is incomplete"""
+        size = 0
+        while True:
+            message = await receive()
+            if message['type'] != 'http.request':
+                # the client has disconnected
+                break
+            body = message.get('body', b'')
+            if body:
+                self._file.write(body)
+                size += len(body)
+            if not message.get('more_body', False):
+                break
+            if (self._disk_limit is not None) and (size > self._disk_limit):
+                break
+        self._file.seek(0)
+
+    def read(self, size=-1):
+        "Reads up to size bytes, or if size is negative, the remainder of the body"
+        if size is None:
+            size = -1
+        return self._file.read(size)
+
+    def readline(self, size=-1):
+        "Reads a line of the body"
+        if size is None:
+            size = -1
+        return self._file.readline(size)
+
+    def close(self):
+        "Closes the body, if it has been written to disk, the temporary file is removed"
+        self._file.close()
+
+
+def make_environ(scope, wsgi_input):
+    "Returns a WSGI environ dictionary from the ASGI http scope"
+    server = scope.get('server') or ('localhost', 80)
+    # as PEP 3333, the path is given as latin-1 characters of the utf-8 bytes
+    path = scope['path'].encode('utf-8').decode('latin-1')
+    environ = {'REQUEST_METHOD': scope['method'].upper(),
+               'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+               'PATH_INFO': path,
+               'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+               'SERVER_NAME': str(server[0]),
+               'SERVER_PORT': str(server[1]) if server[1] is not None else '80',
+               'SERVER_PROTOCOL': 'HTTP/' + scope.get('http_version', '1.1'),
+               'wsgi.version': (1, 0),
+               'wsgi.url_scheme': scope.get('scheme', 'http'),
+               'wsgi.input': wsgi_input,
+               'wsgi.errors': sys.stderr,
+               'wsgi.multithread': True,
+               'wsgi.multiprocess': False,
+               'wsgi.run_once': False,
+               'asgi.scope': scope}
+    client = scope.get('client')
+    if client:
+        environ['REMOTE_ADDR'] = str(client[0])
+        environ['REMOTE_PORT'] = str(client[1])
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').lower()
+        value = value.decode('latin-1')
+        if name == 'content-type':
+            key = 'CONTENT_TYPE'
+        elif name == 'content-length':
+            key = 'CONTENT_LENGTH'
+        else:
+            key = 'HTTP_' + name.upper().replace('-', '_')
+        if key in environ:
+            if key == 'HTTP_COOKIE':
+                environ[key] += '; ' + value
+            else:
+                environ[key] += ',' + value
+        else:
+            environ[key] = value
+    if 'CONTENT_LENGTH' not in environ:
+        # the server gives the whole body, ending with a message without more_body
+        environ['wsgi.input_terminated'] = True
+    return environ
+
+
+async def _disconnected(receive):
+    "Returns when the client disconnects, discarding any unread parts of the request body"
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
+
+
+def _step(method, value):
+    """Called in a thread of the pool, sends value into a response generator with its method send or throw.
+       Returns (True, result) if the generator finishes, or (False, awaitable) for an awaitable it yields"""
+    try:
+        return False, method(value)
+    except StopIteration as e:
+        return True, e.value
+
+
+async def _run(steps, loop, executor):
+    """Runs the response generator steps in the thread pool, awaiting the awaitables it yields in
+       the event loop, and returns status, headers, data"""
+    method, value = steps.send, None
+    while True:
+        done, result = await loop.run_in_executor(executor, _step, method, value)
+        if done:
+            return result
+        try:
+            value = await result
+            method = steps.send
+        except Exception as e:
+            method, value = steps.throw, e
+
+
+async def respond(project, executor, scope, receive, send):
+    "Serves an ASGI http call with the SkipoleProject project, using the thread pool executor"
+    loop = asyncio.get_running_loop()
+    wsgi_input = ReceiveInput(project.form_memory_limit, project.form_disk_limit)
+    try:
+        await wsgi_input.receive(receive)
+        environ = make_environ(scope, wsgi_input)
+        status, headers, data = await _run(project.response_steps(environ), loop, executor)
+        await send({'type': 'http.response.start',
+                    'status': int(status[:3]),
+                    'headers': [ (key.lower().encode('latin-1'), str(value).encode('latin-1')) for key, value in headers ]})
+        if isinstance(data, list):
+            await send({'type': 'http.response.body', 'body': b''.join(data), 'more_body': False})
+            return
+        # any unread parts of the request body are discarded while waiting for a disconnect
+        disconnected = asyncio.ensure_future(_disconnected(receive))
+        try:
+            if hasattr(data, '__aiter__'):
+                complete = await _send_async(data, send, disconnected)
+            else:
+                complete = await _send_sync(data, send, disconnected, loop, executor)
+            if complete:
+                await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+        finally:
+            disconnected.cancel()
+    finally:
+        wsgi_input.close()
+
+
+async def _send_async(data, send, disconnected):
+    "Sends the parts of an asynchronous iterator, returns False if the client disconnected"
+    iterator = data.__aiter__()
+    try:
+        while True:
+            part = asyncio.ensure_future(iterator.__anext__())
+            await asyncio.wait((part, disconnected), return_when=asyncio.FIRST_COMPLETED)
+            if not part.done():
+                # the client has disconnected, stop the iterator
+                part.cancel()
+                try:
+                    await part
+                except (asyncio.CancelledError, Exception):
+                    pass
+                return False
+            try:
+                body = part.result()
+            except StopAsyncIteration:
+                return True
+            if body:
+                await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+    finally:
+        if hasattr(iterator, 'aclose'):
+            await iterator.aclose()
+
+
+async def _send_sync(data, send, disconnected, loop, executor):
+    "Sends the parts of an iterator, each read in the thread pool, returns False if the client disconnected"
+    iterator = iter(data)
+    try:
+        while not disconnected.done():
+            body = await loop.run_in_executor(executor, next, iterator, None)
+            if body is None:
+                return True
+            if body:
+                await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+        return False
+    finally:
+        if hasattr(data, 'close'):
+            await loop.run_in_executor(executor, data.close)
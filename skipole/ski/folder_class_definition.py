@@ -135,10 +135,10 @@ class Folder(object):
 
     @property
     def default_page(self):
-        "return a deep copy of the default page, or None if one not set"
+        "return a copy of the default page, or None if one not set"
         default_ident = self.default_page_ident
         if default_ident:
-            return skiboot.from_ident(default_ident)
+            return default_ident.item()
 
 
     @property
@@ -0,0 +1,368 @@
+"""
+This module defines the FormData class, which reads submitted form data
+from the WSGI environ, and is used in place of cgi.FieldStorage
+
+It provides the subset of the cgi.FieldStorage interface used by skipole,
+keys(), getlist(), getvalue(), 'in' and item access giving FormField objects
+(or lists of FormField objects) with attributes name, value, filename, type and file.
+
+The data is only read when first accessed, and query_value reads the query string
+alone, so the caller ident of a call can be found without reading the request body,
+which is then only parsed if a responder reads the form data, or the user functions
+ask for the caller ident. Urlencoded bodies and the query string are parsed with
+urllib.parse, multipart bodies are read in chunks, and uploaded file parts are
+written to a tempfile.SpooledTemporaryFile, which is held in memory up to memory_limit
+bytes, and rolled over to disk thereafter.
+"""
+
+
+import tempfile
+
+from urllib.parse import parse_qsl
+
+from email.message import Message
+
+from email.utils import collapse_rfc2231_value
+
+from .excepts import ValidateError
+
+
+# the number of bytes read from wsgi.input at a time
+_CHUNK_SIZE = 65536
+
+# the maximum length of the headers of a single multipart part
+_MAX_HEADER_SIZE = 16384
+
+
+class FormField(object):
+    """A received form field. For uploaded files, filename is the name given by the browser
+       and file is a binary file object positioned at the start of the file contents, in which case
+       the FormField object itself can be read as a stream"""
+
+    def __init__(self, name, value=None, filename=None, content_type=None, file=None):
+        self.name = name
+        self._value = value
+        self.filename = filename
+        self.type = content_type
+        self.file = file
+
+    @property
+    def value(self):
+        "The field value as a string, or for uploaded files, the file contents as bytes"
+        if self.file is None:
+            return self._value
+        position = self.file.tell()
+        self.file.seek(0)
+        contents = self.file.read()
+        self.file.seek(position)
+        return contents
+
+    def read(self, size=-1):
+        "Reads bytes from an uploaded file"
+        return self.file.read(size)
+
+    def readline(self, size=-1):
+        "Reads a line from an uploaded file"
+        return self.file.readline(size)
+
+    def seek(self, offset, whence=0):
+        return self.file.seek(offset, whence)
+
+    def tell(self):
+        return self.file.tell()
+
+    def close(self):
+        "Closes an uploaded file, if it has been rolled over to disk, the temporary file is removed"
+        if self.file is not None:
+            self.file.close()
+
+    def __iter__(self):
+        "Iterates over an uploaded file in chunks of bytes"
+        while True:
+            chunk = self.file.read(_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+    def __repr__(self):
+        if self.file is None:
+            return "FormField(%r, %r)" % (self.name, self._value)
+        return "FormField(%r, filename=%r)" % (self.name, self.filename)
+
+
+class FormData(object):
+    """Reads the form data submitted with a call, from the query string and the request body.
+       memory_limit is the number of bytes of an uploaded file held in memory before it is written
+       to a temporary file, and is also the maximum total size of the fields which are not files.
+       disk_limit is the maximum size of the request body, or None for no limit.
+       If either is exceeded, or the data is invalid, a ValidateError is raised when the data is first accessed"""
+
+    def __init__(self, environ, memory_limit=1048576, disk_limit=None):
+        self.environ = environ
+        self.memory_limit = memory_limit
+        self.disk_limit = disk_limit
+        # list of FormField objects, None until the data has been read
+        self._list = None
+        self._qs = environ.get('QUERY_STRING', '')
+        self._method = environ.get('REQUEST_METHOD', 'GET').upper()
+        # the length of the body, set when the data is read
+        self._length = 0
+        if self._method in ('GET', 'HEAD'):
+            # the body is not read
+            self.has_body = False
+        else:
+            self.has_body = environ.get('CONTENT_LENGTH', '0') not in ('', '0') or bool(environ.get('wsgi.input_terminated'))
+        if (not self._qs) and (not self.has_body):
+            # nothing to parse
+            self._list = []
+
+    def query_value(self, key):
+        "Returns the first value of key in the query string, or None if not present, the request body is not read"
+        if not self._qs:
+            return
+        for name, value in parse_qsl(self._qs, encoding='utf-8', errors='replace'):
+            if name == key:
+                return value
+
+    def _content_length(self):
+        "Returns the length of the request body, -1 if it should be read to the end, 0 if there is none"
+        try:
+            length = int(self.environ.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            raise ValidateError(message="Form data not accepted, (invalid content length)")
+        if length < 0:
+            raise ValidateError(message="Form data not accepted, (invalid content length)")
+        if (not length) and self.environ.get('wsgi.input_terminated'):
+            # a chunked request, which the server terminates
+            return -1
+        if (self.disk_limit is not None) and (length > self.disk_limit):
+            raise ValidateError(message="Form data not accepted, (request too large)", status='413 Payload Too Large')
+        return length
+
+    @property
+    def list(self):
+        "The list of FormField objects, reads the data on first access"
+        if self._list is None:
+            self._list = []
+            self._parse()
+        return self._list
+
+    def _parse(self):
+        "Reads the query string and body"
+        if self.has_body:
+            self._length = self._content_length()
+        content_type = self.environ.get('CONTENT_TYPE', '')
+        if (not content_type) and (self._method == 'POST'):
+            content_type = 'application/x-www-form-urlencoded'
+        ctype, params = self._parse_header(content_type)
+        if not self._length:
+            self._parse_urlencoded(self._qs)
+        elif ctype == 'application/x-www-form-urlencoded':
+            body = self._read_body()
+            if self._qs:
+                body = body + '&' + self._qs
+            self._parse_urlencoded(body)
+        elif ctype.startswith('multipart/'):
+            boundary = params.get('boundary', '')
+            if (not boundary) or (len(boundary) > 200):
+                raise ValidateError(message="Form data not accepted, (invalid multipart boundary)")
+            self._parse_urlencoded(self._qs)
+            self._parse_multipart(boundary.encode('latin-1', 'replace'))
+        else:
+            # other body content is left unread, for the user functions to read from environ['wsgi.input']
+            self._parse_urlencoded(self._qs)
+
+    def _read(self, size):
+        "Reads up to size bytes of the body, keeping within the content length and the disk limit"
+        if self._length >= 0:
+            size = min(size, self._length - self._received)
+            if size <= 0:
+                return b''
+        chunk = self.environ['wsgi.input'].read(size)
+        self._received += len(chunk)
+        if (self.disk_limit is not None) and (self._received > self.disk_limit):
+            raise ValidateError(message="Form data not accepted, (request too large)", status='413 Payload Too Large')
+        return chunk
+
+    def _read_body(self):
+        "Reads the whole of an urlencoded body, which is limited to memory_limit bytes"
+        self._received = 0
+        chunks = []
+        while True:
+            chunk = self._read(_CHUNK_SIZE)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            if self._received > self.memory_limit:
+                raise ValidateError(message="Form data not accepted, (request too large)", status='413 Payload Too Large')
+        return b''.join(chunks).decode('latin-1')
+
+    def _parse_urlencoded(self, qs):
+        "Parses an urlencoded string, blank values are discarded, as with cgi.FieldStorage"
+        if not qs:
+            return
+        for name, value in parse_qsl(qs, encoding='utf-8', errors='replace'):
+            self._list.append(FormField(name, value))
+
+    def _parse_multipart(self, boundary):
+        "Reads a multipart body in chunks, writing each part to a FormField"
+        self._received = 0
+        # the delimiter is preceded by CRLF, which is added to the start of the
+        # body so the first delimiter can be found in the same way as the others
+        delimiter = b'\r\n--' + boundary
+        buffer = b'\r\n'
+        field_size = 0
+        # skip the preamble
+        while True:
+            index = buffer.find(delimiter)
+            if index != -1:
+                buffer = buffer[index+len(delimiter):]
+                break
+            buffer = buffer[-len(delimiter):]
+            chunk = self._read(_CHUNK_SIZE)
+            if not chunk:
+                # no parts found
+                return
+            buffer += chunk
+        while True:
+            # buffer is positioned after a delimiter, which is followed either by
+            # -- marking the end of the body, or by the part headers
+            while len(buffer) < 2:
+                chunk = self._read(_CHUNK_SIZE)
+                if not chunk:
+                    raise ValidateError(message="Form data not accepted, (incomplete multipart data)")
+                buffer += chunk
+            if buffer.startswith(b'--'):
+                return
+            # read the headers
+            while True:
+                index = buffer.find(b'\r\n\r\n')
+                if index != -1:
+                    break
+                if len(buffer) > _MAX_HEADER_SIZE:
+                    raise ValidateError(message="Form data not accepted, (invalid multipart headers)")
+                chunk = self._read(_CHUNK_SIZE)
+                if not chunk:
+                    raise ValidateError(message="Form data not accepted, (incomplete multipart data)")
+                buffer += chunk
+            name, filename, content_type = self._part_headers(buffer[:index])
+            buffer = buffer[index+4:]
+            if filename is None:
+                sink = bytearray()
+            else:
+                sink = tempfile.SpooledTemporaryFile(max_size=self.memory_limit, mode='w+b')
+            # read the part contents up to the next delimiter
+            while True:
+                index = buffer.find(delimiter)
+                if index != -1:
+                    data = buffer[:index]
+                    buffer = buffer[index+len(delimiter):]
+                else:
+                    # keep enough of the buffer to hold a partial delimiter
+                    keep = len(delimiter) - 1
+                    data = buffer[:-keep]
+                    buffer = buffer[-keep:]
+                if data:
+                    if filename is None:
+                        field_size += len(data)
+                        if field_size > self.memory_limit:
+                            raise ValidateError(message="Form data not accepted, (request too large)", status='413 Payload Too Large')
+                        sink.extend(data)
+                    else:
+                        sink.write(data)
+                if index != -1:
+                    break
+                chunk = self._read(_CHUNK_SIZE)
+                if not chunk:
+                    if filename is not None:
+                        sink.close()
+                    raise ValidateError(message="Form data not accepted, (incomplete multipart data)")
+                buffer += chunk
+            if name is None:
+                # a part without a name is discarded
+                if filename is not None:
+                    sink.close()
+                continue
+            if filename is None:
+                self._list.append(FormField(name, sink.decode('utf-8', 'replace')))
+            else:
+                sink.seek(0)
+                self._list.append(FormField(name, filename=filename, content_type=content_type, file=sink))
+
+    def _part_headers(self, header_bytes):
+        "Returns name, filename and content type from the headers of a multipart part"
+        name = None
+        filename = None
+        content_type = 'text/plain'
+        for line in header_bytes.decode('utf-8', 'replace').split('\r\n'):
+            key, sep, value = line.partition(':')
+            if not sep:
+                continue
+            key = key.strip().lower()
+            if key == 'content-disposition':
+                disposition, params = self._parse_header(value)
+                name = params.get('name')
+                filename = params.get('filename')
+            elif key == 'content-type':
+                content_type = value.strip()
+        return name, filename, content_type
+
+    def _parse_header(self, value):
+        "Returns the main value of a header in lower case, and a dictionary of its parameters"
+        msg = Message()
+        msg['content-type'] = value
+        params = msg.get_params(header='content-type')
+        if not params:
+            return '', {}
+        main = params[0][0].strip().lower()
+        return main, {key.lower():collapse_rfc2231_value(val) for key, val in params[1:]}
+
+    def __bool__(self):
+        return bool(self.list)
+
+    def __contains__(self, key):
+        for item in self.list:
+            if item.name == key:
+                return True
+        return False
+
+    def __getitem__(self, key):
+        "Returns a FormField, or a list of FormFields if the key has been received more than once"
+        found = [ item for item in self.list if item.name == key ]
+        if not found:
+            raise KeyError(key)
+        if len(found) == 1:
+            return found[0]
+        return found
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def keys(self):
+        "Returns a list of field names, without duplicates"
+        return list(dict.fromkeys(item.name for item in self.list))
+
+    def getvalue(self, key, default=None):
+        "Returns the value of a field, or a list of values, or default if not present"
+        if key not in self:
+            return default
+        value = self[key]
+        if isinstance(value, list):
+            return [ item.value for item in value ]
+        return value.value
+
+    def getlist(self, key):
+        "Returns a list of the values received for a field"
+        return [ item.value for item in self.list if item.name == key ]
+
+    def close(self):
+        "Closes any uploaded files"
+        if self._list:
+            for item in self._list:
+                item.close()
+
+    def __repr__(self):
+        return "FormData(%r)" % (self._list,)
@@ -6,7 +6,7 @@ This module defines the page objects
 """
 
 
-import os, mimetypes, copy, collections, json, re, uuid, pprint
+import os, mimetypes, copy, collections, json, re, uuid, pprint, gzip, hashlib
 from string import Template
 from urllib.parse import quote
 from base64 import urlsafe_b64encode
@@ -16,6 +16,11 @@ from .tag import Part, ClosedPart, TextBlock, Section
 from .widgets import links
 from .excepts import ValidateError, ServerError, SkiError
 
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
 # a search for anything none-alphanumeric and not an underscore
 _AN = re.compile('[^\w]')
 
@@ -406,8 +411,7 @@ class TemplatePageAndSVG(ParentPage):
             sectionplaceholder = self.section_places.get(section_name)
             if not sectionplaceholder:
                 return
-            section = sectionplaceholder.get_section()
-            widget = section.widgets.get(widgetname)
+            widget = sectionplaceholder.get_widget(widgetname)
         elif "_" in section_name:
             result = self.widget_from_multiplier(section_name, widgetname)
             if result:
@@ -422,7 +426,8 @@ class TemplatePageAndSVG(ParentPage):
 
 
     def widget_from_multiplier(self, section_name, widgetname):
-        """Return (sectionplaceholder, widget) if section_name is a multiplied section, such as name_3, return None on failure"""
+        """Return (sectionplaceholder, widget) if section_name is a multiplied section, such as name_3, return None on failure.
+           The widget is that held by the project section, and must not be altered"""
         if "_" not in section_name:
             return
         sname, snumber = section_name.rsplit('_', 1)
@@ -433,8 +438,7 @@ class TemplatePageAndSVG(ParentPage):
         sectionplaceholder = self.section_places.get(sname)
         if not sectionplaceholder:
             return
-        section = sectionplaceholder.get_section()
-        return sectionplaceholder, section.widgets.get(widgetname)
+        return sectionplaceholder, sectionplaceholder.get_widget(widgetname)
 
 
     def append_scriptlink(self, label):
@@ -483,61 +487,42 @@ class TemplatePageAndSVG(ParentPage):
                 for m in range(placeholder.multiplier):
                     self._import_multiplied_section(m, placeholder, toppart, page_data)
                 continue
-            section_name = placeholder.section_name
-            sectionpart = self.project.section(section_name)
-            # sectionpart is a tag.Section
-            if not isinstance(sectionpart, Section):
+            template, scriptlinks = self.project.section_template(self.ident, placename, placeholder.section_name)
+            # template is a tag.Section
+            if not isinstance(template, Section):
                 continue
-            # gives sectionpart and subparts an ident of page_ident_name_locationnumbers
-            # and sets sectionpart into self.sections
-            sectionpart.widgets = {}
-            sectionpart.section_places = {}
-            sectionpart.set_idents(str(self.ident) + '_' + placename, sectionpart.widgets, sectionpart.section_places, embedded=(section_name,'',None))
-            # If no id placed in the top tag, inserts the section placename
-            if not ('id' in sectionpart.attribs):
-                sectionpart.insert_id(id_string=placename)
+            # the template has idents, id and placename already set, so only a copy is needed
+            sectionpart = skiboot.request_copy(template)
             self.sections[placename] = sectionpart
-            # Set section widgets field displaynames
-            for widget in sectionpart.widgets.values():
-                # Note - this is called on named widgets only
-                widget.set_placename(section_name, placename)
             # insert sectionpart at the point where the placeholder is
             toppart.set_location_value(placeholder.ident_list, sectionpart)
             # add section scriptlinks
             if self.page_type == 'TemplatePage':
-                if sectionpart.validator_scriptlinks:
-                    for link_label in sectionpart.validator_scriptlinks:
-                        self.append_scriptlink(link_label)
-                for widget in sectionpart.widgets.values():
-                    # get 'ski_modulename'
-                    link_label = "ski_" + widget.__class__.__module__.split(".")[-1]
-                    # add a link in the page head to the widget module javascript file
+                for link_label in scriptlinks:
                     self.append_scriptlink(link_label)
 
 
     def _import_multiplied_section(self, m, placeholder, toppart, page_data):
         "If a placeholder has a multiplier, import its section multiple times inside a div"
         placename = placeholder.placename + "_" + str(m)
-        section_name = placeholder.section_name
-        sectionpart = self.project.section(section_name)
-        # sectionpart is a tag.Section
-        if not isinstance(sectionpart, Section):
+        template, scriptlinks = self.project.section_template(self.ident, placename, placeholder.section_name)
+        # template is a tag.Section
+        if not isinstance(template, Section):
             return
-        if (placename,'show') in page_data:
-            sectionpart.show = bool(page_data[placename,'show'])
-        # gives sectionpart and subparts an ident of page_ident_name_locationnumbers
-        # and sets sectionpart into self.sections
-        sectionpart.widgets = {}
-        sectionpart.section_places = {}
-        sectionpart.set_idents(str(self.ident) + '_' + placename, sectionpart.widgets, sectionpart.section_places, embedded=(section_name,'',None))
-        # If no id placed in the top tag, inserts the section placename
-        if not ('id' in sectionpart.attribs):
-            sectionpart.insert_id(id_string=placename)
+        # the template has idents, id and placename already set, so only a copy is needed
+        sectionpart = skiboot.request_copy(template)
+        if page_data:
+            if (placename,'show') in page_data:
+                sectionpart.show = bool(page_data[placename,'show'])
+            # a MultipliedSectionData holds the widget values of all the sections in columns
+            multiplied = page_data.get((placeholder.placename, 'columns'))
+            if multiplied is not None:
+                widgets = sectionpart.widgets
+                for widgetname, fieldname, value in multiplied.row(m):
+                    widget = widgets.get(widgetname)
+                    if widget is not None:
+                        widget.set_value(fieldname, value)
         self.sections[placename] = sectionpart
-        # Set section widgets field displaynames
-        for widget in sectionpart.widgets.values():
-            # Note - this is called on named widgets only
-            widget.set_placename(section_name, placename)
         # now the sectionpart has to be set within a div which is set at the placeholder location
         if m == 0:
             topdiv = Part(tag_name=placeholder.mtag)
@@ -559,13 +544,7 @@ class TemplatePageAndSVG(ParentPage):
             toppart.insert_location_value(location, sectionpart)
         # add section scriptlinks
         if self.page_type == 'TemplatePage':
-            if sectionpart.validator_scriptlinks:
-                for link_label in sectionpart.validator_scriptlinks:
-                    self.append_scriptlink(link_label)
-            for widget in sectionpart.widgets.values():
-                # get 'ski_modulename'
-                link_label = "ski_" + widget.__class__.__module__.split(".")[-1]
-                # add a link in the page head to the widget module javascript file
+            for link_label in scriptlinks:
                 self.append_scriptlink(link_label)
 
 
@@ -653,6 +632,10 @@ class TemplatePage(TemplatePageAndSVG):
         else:
             self.interval_target = None
 
+        # the ident or label of a SubmitEventStream responder, set by page_data 'EventTarget', if the
+        # browser supports it, updates are received from this event stream rather than by interval calls
+        self.event_target = None
+
         # self.validator_scriptlinks is a list of validator module ski_name's
         # calculated when the page is saved, and used 
         # to add links to the validator js modules in the page head
@@ -686,6 +669,18 @@ class TemplatePage(TemplatePageAndSVG):
             if link_label not in self._validator_scriptlinks:
                 self._validator_scriptlinks.append(link_label)
 
+    def compile_parts(self):
+        """Called when page loaded or saved, compiles the parts of head and body which
+           cannot change during a call into encoded html, so they are not rebuilt
+           on every call. Head and body themselves are not compiled, as script links
+           and the page javascript are appended to them on each call"""
+        for part in self.head.parts:
+            if hasattr(part, 'compile'):
+                part.compile()
+        for part in self.body.parts:
+            if hasattr(part, 'compile'):
+                part.compile()
+
     def import_sections(self, page_data=None):
         "Imports javascript modules used by widgets and validators, and then imports sections"
         if self._validator_scriptlinks:
@@ -771,12 +766,11 @@ $(function(){
 
         # and create the script end
         scriptend = """
-  if(SKIPOLE.interval && SKIPOLE.IntervalTarget) {
-    SKIPOLE.interval_id = setInterval(SKIPOLE.refreshjson, SKIPOLE.interval*1000, SKIPOLE.IntervalTarget);
-    }
+  SKIPOLE.startrefresh();
 """
-        # SKIPOLE.interval_id is needed so clearInterval(SKIPOLE.interval_id) can be called
-        # if the interval changes
+        # SKIPOLE.startrefresh opens an event stream to SKIPOLE.EventTarget if given, or otherwise
+        # calls SKIPOLE.IntervalTarget every SKIPOLE.interval seconds, setting SKIPOLE.interval_id
+        # so clearInterval(SKIPOLE.interval_id) can be called if the interval changes
         if self.last_scroll:
             # restore to last store position
             scriptend += """
@@ -843,8 +837,7 @@ $(function(){
             # self.section_places is a page section name -> SectionPlaceHolder dictionary
             sectionplaceholder = self.section_places.get(widg_field.s)
             if sectionplaceholder:
-                sectionpart = sectionplaceholder.get_section()
-                widget = sectionpart.widgets.get(widg_field.w)
+                widget = sectionplaceholder.get_widget(widg_field.w)
             elif "_" in widg_field.s:
                 result = self.widget_from_multiplier(widg_field.s, widg_field.w)
                 if result:
@@ -941,6 +934,8 @@ $(function(){
                     self.interval=interval
             if 'IntervalTarget' in self.page_settings:
                 self.interval_target = self.page_settings['IntervalTarget']
+            if 'EventTarget' in self.page_settings:
+                self.event_target = self.page_settings['EventTarget']
             if 'last_scroll' in self.page_settings:
                 self.last_scroll = bool(self.page_settings['last_scroll'])
             if 'lang' in self.page_settings:
@@ -997,6 +992,10 @@ SKIPOLE.interval = %s;
             intervalurl = skiboot.get_url(self.interval_target, self.proj_ident)
             if intervalurl:
                 page_javascript += "SKIPOLE.IntervalTarget = \'" + quote(intervalurl, safe='/:?&=') + "\';\n"
+        if self.event_target:
+            eventurl = skiboot.get_url(self.event_target, self.proj_ident)
+            if eventurl:
+                page_javascript += "SKIPOLE.EventTarget = \'" + quote(eventurl, safe='/:?&=') + "\';\n"
         if self.catch_to_html:
             catchurl = skiboot.get_url(self.catch_to_html, self.proj_ident)
             if catchurl:
@@ -1023,10 +1022,11 @@ SKIPOLE.interval = %s;
         topbytes = topstring.encode('ascii', 'xmlcharrefreplace')
 
         docbytes = [topbytes]
-        docbytes.extend(d.encode('ascii', 'xmlcharrefreplace') for d in self.head.data())
-        docbytes.extend(d.encode('ascii', 'xmlcharrefreplace') for d in self.body.data())
-        docbytes.append("\n</html>".encode('ascii', 'xmlcharrefreplace'))
-        return docbytes
+        docbytes.extend(self.head.encoded_data())
+        docbytes.extend(self.body.encoded_data())
+        docbytes.append(b"\n</html>")
+        # join into a single buffer
+        return [b''.join(docbytes)]
 
     def __str__(self):
         "Returns the page as a string"
@@ -1057,7 +1057,8 @@ class RespondPage(ParentPage):
 
     def call_responder(self, skicall, form_data, caller_ident, ident_list, rawformdata):
         """Checks for circulating calls, then updates ident_list with this pages ident,
-           then calls the respond objects call method, note rawformdata is a cgi.FieldStorage object"""
+           then calls the respond objects call method, note rawformdata is a formdata.FormData object.
+           This is a generator used with yield from, which yields any awaitables from the user submit_data function"""
         if self.responder is None:
             raise ServerError(message = "No responder has been assigned to this page")
         if self.ident in ident_list:
@@ -1069,7 +1070,7 @@ class RespondPage(ParentPage):
         skicall.submit_dict["responder_brief"] = self.brief
         skicall.submit_dict["number"] = self.ident.num
 
-        page = self.responder(skicall, form_data, caller_ident, ident_list, proj, rawformdata)
+        page = yield from self.responder(skicall, form_data, caller_ident, ident_list, proj, rawformdata)
         return page
 
     def set_values(self, page_data):
@@ -1200,7 +1201,7 @@ class SVG(TemplatePageAndSVG):
         # https://developer.mozilla.org/en-US/docs/Web/SVG/Tutorial/Getting_Started
 
         svg_list = self.svg.data()
-        return [d.encode('ascii', 'xmlcharrefreplace') for d in svg_list]
+        return [''.join(svg_list).encode('ascii', 'xmlcharrefreplace')]
 
 
     def __str__(self):
@@ -1213,6 +1214,39 @@ class SVG(TemplatePageAndSVG):
             return "SVG Page name %s" % (self.name,)
 
 
+class StoredFile(object):
+    """The contents of a file held in memory, with an ETag, and compressed variants
+       where these are smaller than the original"""
+
+    # files of these mimetypes are not compressed
+    uncompressed_types = ('image/png', 'image/jpeg', 'image/gif', 'image/webp', 'application/zip', 'application/gzip', 'font/woff', 'font/woff2')
+
+    def __init__(self, filepath, mimetype, compress=True):
+        with open(filepath, "rb") as f:
+            self.content = f.read()
+        self.etag = '"%s"' % (hashlib.md5(self.content).hexdigest(),)
+        # dictionary of encoding:compressed content
+        self.variants = {}
+        if (not compress) or (len(self.content) < 256) or (mimetype in self.uncompressed_types):
+            return
+        compressed = gzip.compress(self.content, 9)
+        if len(compressed) < len(self.content):
+            self.variants['gzip'] = compressed
+        if brotli is not None:
+            compressed = brotli.compress(self.content)
+            if len(compressed) < len(self.content):
+                self.variants['br'] = compressed
+
+    def encoding(self, environ):
+        "Returns the preferred encoding accepted by the client, or None for the uncompressed content"
+        if not self.variants:
+            return
+        accepted = skiboot.accepted_encodings(environ)
+        for encoding in ('br', 'gzip'):
+            if (encoding in self.variants) and (encoding in accepted):
+                return encoding
+
+
 class FilePage(ParentPage):
     """A page representing a file to be downloaded to the user.
     """
@@ -1231,6 +1265,9 @@ class FilePage(ParentPage):
         self._set_enable_cache(enable_cache)
         # environ, set by the update method
         self._environ = None
+        # if the file has been preloaded, the StoredFile, and the content to send, set by the update method
+        self._stored = None
+        self._content = None
 
 
     def get_filepath(self):
@@ -1278,6 +1315,10 @@ class FilePage(ParentPage):
         if not self.filepath:
             raise ServerError(message="Filepath not set")
         self._absolute_filepath = os.path.join(skiboot.projectfiles(self.proj_ident), self.filepath)
+        self._stored = self.project.filestore.get(self._absolute_filepath)
+        if self._stored is not None:
+            self._update_stored(environ)
+            return
         if not os.path.isfile(self._absolute_filepath):
             # no need to do anything further
             return
@@ -1291,6 +1332,67 @@ class FilePage(ParentPage):
         self._create_header()
 
 
+    def _update_stored(self, environ):
+        "Sets the header and content to send from a preloaded file, responding to If-None-Match and Range requests"
+        stored = self._stored
+        if not self.header_content_type:
+            self.header_content_type = self.mimetype
+        encoding = stored.encoding(environ)
+        if encoding is None:
+            etag = stored.etag
+            self._content = stored.content
+        else:
+            etag = stored.etag[:-1] + '-' + encoding + '"'
+            self._content = stored.variants[encoding]
+        extra_headers = [("ETag", etag)]
+        if stored.variants:
+            extra_headers.append(("Vary", "Accept-Encoding"))
+        if encoding is not None:
+            extra_headers.append(("Content-Encoding", encoding))
+        if_none_match = environ.get('HTTP_IF_NONE_MATCH')
+        if if_none_match and ((if_none_match.strip() == '*') or (etag in [ tag.strip() for tag in if_none_match.split(',') ])):
+            self.status = '304 Not Modified'
+            self._content = b''
+            self.header_content_type = None
+            self.header_content_length = None
+        else:
+            extra_headers.append(("Accept-Ranges", "bytes"))
+            if (encoding is None) and ('HTTP_RANGE' in environ) and (environ.get('HTTP_IF_RANGE', etag) == etag):
+                self._set_range(environ['HTTP_RANGE'], extra_headers)
+            self.header_content_length = str(len(self._content))
+        self._create_header()
+        if not self.page_settings.get('headers'):
+            self.headers.extend(extra_headers)
+
+
+    def _set_range(self, byte_range, extra_headers):
+        "Sets the content to a single requested byte range, multiple ranges are ignored and the whole file sent"
+        size = len(self._content)
+        unit, sep, ranges = byte_range.partition('=')
+        if (unit.strip().lower() != 'bytes') or (',' in ranges):
+            return
+        start, sep, end = ranges.strip().partition('-')
+        try:
+            if not start:
+                # a suffix range, the last end bytes
+                start = max(size - int(end), 0)
+                end = size - 1
+            else:
+                start = int(start)
+                end = min(int(end), size - 1) if end else size - 1
+        except ValueError:
+            return
+        if (start >= size) or (start > end):
+            self.status = '416 Range Not Satisfiable'
+            self._content = b''
+            extra_headers.append(("Content-Range", "bytes */%s" % (size,)))
+            return
+        self.status = '206 Partial Content'
+        # the range is copied, as WSGI servers require bytes
+        self._content = self._content[start:end+1]
+        extra_headers.append(("Content-Range", "bytes %s-%s/%s" % (start, end, size)))
+
+
     def _readfile(self, size=32768):
         "Return a generator reading the file"
         with open(self._absolute_filepath, "rb") as f:
@@ -1302,6 +1404,9 @@ class FilePage(ParentPage):
 
     def data(self):
         "returns an iterator reading the file"
+        if self._stored is not None:
+            # the file is held in memory
+            return [self._content]
         if not os.path.isfile(self._absolute_filepath):
             # no need to do anything further
             return
@@ -1514,6 +1619,11 @@ class JSON(ParentPage):
             if url:
                 self.content["IntervalTarget"] = url
 
+        if "EventTarget" in self.page_settings:
+            url = skiboot.get_url(self.page_settings["EventTarget"], proj_ident=self.proj_ident)
+            if url:
+                self.content["EventTarget"] = url
+
         if 'interval' in self.page_settings:
             interval=0
             try:
@@ -1543,6 +1653,9 @@ class JSON(ParentPage):
         for field, item in page_data.items():
             if isinstance(field, str):
                 self.content[field] = item
+            elif (len(field) == 2) and (field[1] == 'columns') and hasattr(item, 'row'):
+                # a MultipliedSectionData, set the values of each multiplied section as sectionalias_n-widget:field
+                self.content.update(item.to_dict(attributes=False))
             else:
                 widgfield = str(skiboot.make_widgfield(field))
                 self.content[widgfield] = item
@@ -11,7 +11,7 @@ call and is passed as an argument to the user functions
 """
 
 
-import copy, os, cgi, collections, html, pprint, json, shutil, uuid, sys, traceback, re, pathlib, mimetypes
+import copy, os, collections, html, pprint, json, shutil, uuid, sys, traceback, re, pathlib, mimetypes, gzip, zlib, time, weakref, threading, types
 
 from base64 import urlsafe_b64decode
 
@@ -29,7 +29,8 @@ _AN = re.compile('[^\w]')
 
 _AN64 = re.compile('[^\w\-]')
 
-from . import skiboot, read_json
+from . import skiboot, read_json, page_class_definition
+from .formdata import FormData
 from .excepts import ValidateError, ServerError, FailPage, ErrorMessage, GoTo, PageError, ServeFile
 from .. import textblocks
 
@@ -53,9 +54,280 @@ def _end_call(page_ident, page_type, skicall):
 
 
 
+# AccessTextBlocks instances shared by projects reading the same textblocks files, see _shared_textblocks
+_TEXTBLOCKS = weakref.WeakValueDictionary()
+
+
+def _textblocks_files(directory):
+    "Returns a tuple of (filename, modification time) of the json files in the textblocks directory, or None if it cannot be read"
+    try:
+        return tuple(sorted((entry.name, entry.stat().st_mtime_ns) for entry in os.scandir(directory) if entry.name.endswith('.json')))
+    except OSError:
+        return
+
+
+def _shared_textblocks(proj_name, projectfiles):
+    """Returns an AccessTextBlocks instance for the project, if one has already been created by another
+       project with the same name and projectfiles, and the json files are unchanged, it is returned"""
+    directory = os.path.join(projectfiles, proj_name, "data", "textblocks_json")
+    files = _textblocks_files(directory)
+    if files is None:
+        return textblocks.AccessTextBlocks(proj_name, projectfiles, skiboot.default_language())
+    key = (directory, skiboot.default_language(), files)
+    accesstextblocks = _TEXTBLOCKS.get(key)
+    if accesstextblocks is None:
+        accesstextblocks = textblocks.AccessTextBlocks(proj_name, projectfiles, skiboot.default_language())
+        _TEXTBLOCKS[key] = accesstextblocks
+    return accesstextblocks
+
+
+class IdentItems(dict):
+    """A dictionary of Ident:item, which maintains a set of the ident numbers held
+       and the maximum ident number, so these can be found without scanning the dictionary"""
+
+    def __init__(self, *args, **kwargs):
+        dict.__init__(self)
+        self._nums = set()
+        self._max_num = 0
+        self.update(*args, **kwargs)
+
+    def __reduce__(self):
+        return (self.__class__, (dict(self),))
+
+    def __setitem__(self, ident, item):
+        dict.__setitem__(self, ident, item)
+        self._nums.add(ident.num)
+        if ident.num > self._max_num:
+            self._max_num = ident.num
+
+    def __delitem__(self, ident):
+        dict.__delitem__(self, ident)
+        self._discard(ident.num)
+
+    def _discard(self, num):
+        self._nums.discard(num)
+        if num == self._max_num:
+            # only a deletion of the maximum requires a scan
+            self._max_num = max(self._nums, default=0)
+
+    def pop(self, ident, *default):
+        if ident in self:
+            self._discard(ident.num)
+        return dict.pop(self, ident, *default)
+
+    def popitem(self):
+        ident, item = dict.popitem(self)
+        self._discard(ident.num)
+        return ident, item
+
+    def setdefault(self, ident, item=None):
+        if ident not in self:
+            self[ident] = item
+        return self[ident]
+
+    def update(self, *args, **kwargs):
+        for ident, item in dict(*args, **kwargs).items():
+            self[ident] = item
+
+    def clear(self):
+        dict.clear(self)
+        self._nums = set()
+        self._max_num = 0
+
+    def has_num(self, num):
+        "Returns True if the ident number is held, the root folder number 0 is always present"
+        return (num == 0) or (num in self._nums)
+
+    @property
+    def max_num(self):
+        "The maximum ident number held, or 0 if empty"
+        return self._max_num
+
+
+
+class LazyIdentItems(IdentItems):
+    """The IdentItems dictionary used in lazy load mode, where TemplatePages and SVG pages are held as
+       read_json.PageSource objects, and are created when first accessed by item access or get.
+       The values, items and pop methods return the PageSource of a page not yet created.
+       Pages created from a source can be released by the evict method, and are created again when next accessed"""
+
+    def __init__(self, *args, **kwargs):
+        # {ident:PageSource}
+        self._sources = {}
+        # {ident:time last accessed} of the pages created from a source
+        self._accessed = {}
+        IdentItems.__init__(self, *args, **kwargs)
+
+    def __getitem__(self, ident):
+        item = dict.__getitem__(self, ident)
+        source = self._sources.get(ident)
+        if source is not None:
+            if item is source:
+                item = source.create()
+                dict.__setitem__(self, ident, item)
+            self._accessed[ident] = time.monotonic()
+        return item
+
+    def get(self, ident, default=None):
+        if ident in self:
+            return self[ident]
+        return default
+
+    def __setitem__(self, ident, item):
+        IdentItems.__setitem__(self, ident, item)
+        if isinstance(item, read_json.PageSource):
+            self._sources[ident] = item
+        else:
+            # the page is set directly, and no longer has a source
+            self._forget(ident)
+
+    def _forget(self, ident):
+        self._sources.pop(ident, None)
+        self._accessed.pop(ident, None)
+
+    def __delitem__(self, ident):
+        IdentItems.__delitem__(self, ident)
+        self._forget(ident)
+
+    def pop(self, ident, *default):
+        self._forget(ident)
+        return IdentItems.pop(self, ident, *default)
+
+    def popitem(self):
+        ident, item = IdentItems.popitem(self)
+        self._forget(ident)
+        return ident, item
+
+    def clear(self):
+        IdentItems.clear(self)
+        self._sources = {}
+        self._accessed = {}
+
+    def adopt(self, ident, page):
+        """Sets an existing page as the page created from the source held for ident, used when a project is reloaded,
+           returns True if the page has the change of the source, otherwise the page is not used"""
+        source = self._sources.get(ident)
+        if (source is None) or (page.change != source.change):
+            return False
+        dict.__setitem__(self, ident, page)
+        self._accessed[ident] = time.monotonic()
+        return True
+
+    @property
+    def created(self):
+        "The number of pages currently created from their source"
+        return len(self._accessed)
+
+    def evict(self, max_idle):
+        """Releases pages created from a source which have not been accessed for max_idle seconds,
+           returns a list of the idents released"""
+        limit = time.monotonic() - max_idle
+        # pages may be accessed by other threads while this runs, so a copy of the access times is checked
+        evicted = []
+        for ident, accessed in list(self._accessed.items()):
+            if accessed > limit:
+                continue
+            source = self._sources.get(ident)
+            if source is None:
+                continue
+            dict.__setitem__(self, ident, source)
+            self._accessed.pop(ident, None)
+            evicted.append(ident)
+        return evicted
+
+
+
+def _folder_changed(current, folder):
+    """Returns True if the attributes of folder differ from those of the current folder, used by reload, as
+       a folder is given a new change uuid each time it is read"""
+    for attribute in ('name', 'parentfolder_ident', 'brief', 'default_page_name', 'restricted'):
+        if getattr(current, attribute) != getattr(folder, attribute):
+            return True
+    return False
+
+
+class _ProjectState(object):
+    """Holds the attributes of a project read from its project.json and textblocks files, with the caches which
+       depend on them. reload() builds a new instance, and swaps it in with a single assignment"""
+    pass
+
+
+# the states of the projects serving the call in this thread, {project:_ProjectState}, pinned by
+# SkipoleProject.response, so a call reads one version of a project even if it is reloaded meanwhile
+_PINNED = threading.local()
+
+
+def _state_attribute(name):
+    "Returns a property of SkipoleProject, giving the attribute name of the project state"
+
+    def get_attribute(self):
+        states = getattr(_PINNED, 'states', None)
+        if states:
+            state = states.get(self)
+            if state is not None:
+                return getattr(state, name)
+        return getattr(self._state, name)
+
+    def set_attribute(self, value):
+        setattr(self._state, name, value)
+
+    return property(get_attribute, set_attribute)
+
+
 class SkipoleProject(object):
     """The SkipoleProject - an instance being a callable WSGI application"""
 
+    # attributes held in the project state, swapped by reload
+    brief = _state_attribute('brief')
+    version = _state_attribute('version')
+    root = _state_attribute('root')
+    special_pages = _state_attribute('special_pages')
+    sections = _state_attribute('sections')
+    identitems = _state_attribute('identitems')
+    textblocks = _state_attribute('textblocks')
+    _paths = _state_attribute('_paths')
+    _routes = _state_attribute('_routes')
+    _section_templates = _state_attribute('_section_templates')
+    _responses = _state_attribute('_responses')
+    _field_indexes = _state_attribute('_field_indexes')
+    _validation_plans = _state_attribute('_validation_plans')
+
+    # The maximum number of paths held in the path cache
+    path_cache_size = 1024
+
+    # The maximum number of resolved labels, idents and urls held in the routing table of a root project
+    route_cache_size = 4096
+
+    # The number of bytes of an uploaded file held in memory, larger files are written to
+    # a temporary file, this is also the maximum size of the submitted fields which are not files
+    form_memory_limit = 1048576
+
+    # The maximum size in bytes of a request body, None for no limit
+    form_disk_limit = None
+
+    # The maximum number of responses held in the response cache
+    response_cache_size = 256
+
+    # The maximum number of sections held ready to be imported into pages, each multiplied
+    # section of a page being held separately
+    section_cache_size = 512
+
+    # The maximum number of event streams held open by a WSGI server, each holding a server thread, further
+    # SubmitEventStream calls are answered with the target JSON page. Streams served by the ASGIApplication
+    # wait in the event loop, and are not limited
+    max_wsgi_streams = 8
+
+    # In lazy load mode, pages not accessed for this number of seconds are released, and are created
+    # again when next accessed, None to keep all created pages
+    page_idle_time = None
+
+    # Response compression, set by WSGIApplication.set_compression, only the settings of the root project are used
+    compression = False
+    compress_min_size = 1024
+    compress_level = 6
+    compress_mimetypes = ('text/html', 'text/css', 'text/plain', 'text/javascript', 'application/javascript',
+                          'application/json', 'application/xml', 'image/svg+xml')
+
     def __init__(self, project, projectfiles, proj_data={}, start_call=None, submit_data=None, end_call=None, url="/", proj_ident=None):
         """Loads the project from JSON files and records the user functions"""
         if _AN.search(project):
@@ -93,6 +365,9 @@ class SkipoleProject(object):
         # initially it is None
         self.check_cookies = None
 
+        # the attributes read from the json files, and the caches which depend on them
+        self._state = _ProjectState()
+
         # initial values, will be set from the json file
         self.brief = "Project %s" % project
         self.version = "0.0.0"
@@ -111,21 +386,74 @@ class SkipoleProject(object):
 
         # an ordered dictionary of {proj_ident: url,...}, ordered by length of url
         self._subproject_paths = collections.OrderedDict()
+        # a tree of dictionaries, keyed by url path segments, used to find the sub project
+        # serving a path, the key None holds the proj_ident of a sub project, see _make_subproject_tree
+        self._subproject_tree = {}
         # self.subprojects is a dictionary of sub projects {proj_ident: Project instance,.....}
         self.subprojects = {}
 
         # dictionary of idents: to folder or page, apart from root
         # note keys are full Ident instances, values are  folder or page instances
-        self.identitems = {}
+        # an IdentItems dictionary also maintains an index of the ident numbers
+        self.identitems = IdentItems()
 
         # Create an instance of the AccessTextBlocks class for this project
         # self.proj_name is used as the location of the textblocks json file is
         # found at os.path.join(projectfiles, project, "data", "textblocks_json")
         # where project is the project name, not the proj_ident
-        self.textblocks = textblocks.AccessTextBlocks(self.proj_name, projectfiles, skiboot.default_language())
-
-        # maintain a cach dictionary of paths against idents {path:ident}
-        self._paths = {}
+        # projects reading the same unchanged textblocks files share one instance
+        self.textblocks = _shared_textblocks(self.proj_name, projectfiles)
+
+        # maintain a cache dictionary of paths against idents {path:ident}, ordered with the least
+        # recently used path first, and limited to self.path_cache_size entries. Paths which
+        # are not found are also cached, with value None
+        self._paths = collections.OrderedDict()
+        self.path_cache_hits = 0
+        self.path_cache_misses = 0
+
+        # the routing table of a root project, used by skiboot.route for this project and its sub projects,
+        # {key:Ident, url or None} ordered with the least recently used first, and limited to
+        # self.route_cache_size entries
+        self._routes = collections.OrderedDict()
+
+        # maintain a cache of sections ready to be imported into pages, ordered with the least
+        # recently used first, and limited to self.section_cache_size entries
+        # {(page ident, placename, section name):(section change, section, scriptlinks)}
+        self._section_templates = collections.OrderedDict()
+
+        # maintain a cache of responses of pages with enable_cache set, see _response_cache_key
+        # {(page ident, lang, cache_key):(validity, etag, status, headers, data)}, ordered with
+        # the least recently used first, and limited to self.response_cache_size entries
+        self._responses = collections.OrderedDict()
+
+        # maintain a cache of the widget fields of template pages, used when reading form data
+        # {page ident:(validity, {(section alias, widget name):{field name:senddict}})}
+        self._field_indexes = {}
+
+        # maintain a cache of validation plans, used by responders to validate submitted fields
+        # {(page ident, tuple of fields):(validity, [(field, widgfield, fieldarg, section name),...])}
+        self._validation_plans = {}
+
+        # in lazy load mode, the time.monotonic() value when idle pages are next released,
+        # and the lock held while they are released
+        self._next_eviction = 0
+        self._eviction_lock = threading.RLock()
+
+        # set True by the freeze method, after which loaded pages are not released
+        self.frozen = False
+
+        # the thread started by watch_files, and the event which stops it
+        self._watcher = None
+        self._stop_watcher = None
+
+        # the event streams opened by SubmitEventStream responders, {channel:set of streams}
+        # streams are added and removed by their own threads, so are guarded by a lock
+        self._streams = {}
+        self._streams_lock = threading.Lock()
+
+        # dictionary of files preloaded into memory {absolute filepath:page_class_definition.StoredFile}
+        # filled by the preload_files method
+        self.filestore = {}
 
         # load project from json files
         self.load_from_json()
@@ -158,24 +486,154 @@ class SkipoleProject(object):
 
     # self.proj_respond(), parses caller ident and called ident and calls
     # self.proj_start_call() which creates the skicall object and calls the users start_call function
-    # self.proj_respond() checks the ident returned from self.proj_start_call(), it then calls
-    # self.read_form_data() to read any any form data submitted in the raw data, and finally calls
+    # self.proj_respond() checks the ident returned from self.proj_start_call(), and calls
     # self.status_headers_data() or subproj.status_headers_data() if the page returned from start_call
     # is a page of a subproject. It checks for a ValidateError, and returns the validate error page if one is raised.
 
-    # self.status_headers_data() calls responders, and finally calls end_call, returning the wanted status, headers and data
+    # self.status_headers_data() calls responders, which are given the form data read by
+    # self.read_form_data() if they require it, and finally calls end_call, returning the wanted status, headers and data
+
+    # These methods are generators, used with yield from, which yield the awaitables returned by async def
+    # user functions, self.response_steps() is run by self.response() for WSGI calls, which awaits them in
+    # the event loop of the thread, or by the ASGIApplication, which awaits them in its own loop
 
 
 
     def __call__(self, environ, start_response):
         "Defines this projects callable as the wsgi application"
-        # get received cookies, and lang which is a tuple of (preferred language, default language)
-        lang, received_cookies = self.get_cookies(environ)
-        status, headers, data = self.respond(environ, lang, received_cookies)
+        status, headers, data = self.response(environ)
+        if not hasattr(data, '__iter__'):
+            # an asynchronous iterator, returned by a SubmitIterator responder
+            data = skiboot.sync_iterator(data)
         start_response(status, headers)
         return data
 
 
+    def response(self, environ):
+        """Returns status, headers, data for the call given by environ, data being a list of binary strings,
+           or an iterator, or an asynchronous iterator of binary strings"""
+        return skiboot.run(self.response_steps(environ))
+
+
+    def response_steps(self, environ):
+        """A generator which builds the response for the call given by environ, yielding any awaitables returned
+           by async def user functions, the caller awaits each and sends back its result, or throws in its exception.
+           Returns status, headers, data as self.response()"""
+        # the current states of this project and its sub projects are used for the whole call,
+        # and are pinned in the thread running each step
+        states = { subproj:subproj._state for subproj in self.subprojects.values() }
+        states[self] = self._state
+        steps = self._response_steps(environ)
+        method, value = steps.send, None
+        while True:
+            pinned = getattr(_PINNED, 'states', None)
+            _PINNED.states = states
+            try:
+                awaitable = method(value)
+            except StopIteration as e:
+                return e.value
+            finally:
+                _PINNED.states = pinned
+            try:
+                value = yield awaitable
+                method = steps.send
+            except Exception as e:
+                method, value = steps.throw, e
+
+
+    def _response_steps(self, environ):
+        "Called by response_steps, with the project states pinned"
+        # get received cookies, and lang which is a tuple of (preferred language, default language)
+        lang, received_cookies = self.get_cookies(environ)
+        status, headers, data = yield from self.respond(environ, lang, received_cookies)
+        if self.compression:
+            status, headers, data = self._compress_response(environ, status, headers, data)
+        if isinstance(data, list):
+            headers, data = self._single_buffer(status, headers, data)
+        return status, headers, data
+
+
+    def _single_buffer(self, status, headers, data):
+        """Joins a list of binary strings into a single buffer, so the server writes it once,
+           and sets a content-length header if not already given. Returns headers, data"""
+        if len(data) == 1:
+            body = data[0]
+        else:
+            body = b''.join(data)
+        if status[:3] in ('204', '304') or status.startswith('1'):
+            return headers, [body]
+        for key, value in headers:
+            if key.lower() == 'content-length':
+                return headers, [body]
+        headers = headers + [('content-length', str(len(body)))]
+        return headers, [body]
+
+
+    def _compress_encoding(self, environ, headers, size):
+        """Returns (vary, encoding) where vary is True if the response could be compressed, and encoding
+           is 'gzip' or 'deflate' if it should be compressed for this client, or None if not"""
+        if size < self.compress_min_size:
+            return False, None
+        mimetype = None
+        for key, value in headers:
+            key = key.lower()
+            if key == 'content-encoding':
+                # already encoded
+                return False, None
+            if (key == 'vary') and ('accept-encoding' in value.lower()):
+                # already negotiated
+                return False, None
+            if key == 'content-type':
+                mimetype = value.split(';')[0].strip().lower()
+        if mimetype not in self.compress_mimetypes:
+            return False, None
+        accepted = skiboot.accepted_encodings(environ)
+        for encoding in ('gzip', 'deflate'):
+            if encoding in accepted:
+                return True, encoding
+        return True, None
+
+
+    def _compress(self, encoding, body):
+        "Returns the body compressed with the given encoding"
+        if encoding == 'gzip':
+            return gzip.compress(body, self.compress_level)
+        return zlib.compress(body, self.compress_level)
+
+
+    def _encoded_headers(self, headers, vary, encoding, size):
+        "Returns a copy of headers with Vary, and if encoding is given, with Content-Encoding and the new length and ETag"
+        new_headers = []
+        for key, value in headers:
+            lowerkey = key.lower()
+            if encoding:
+                if lowerkey == 'content-length':
+                    continue
+                if lowerkey == 'etag':
+                    value = value[:-1] + '-' + encoding + '"'
+            new_headers.append((key, value))
+        if vary:
+            new_headers.append(('Vary', 'Accept-Encoding'))
+        if encoding:
+            new_headers.append(('Content-Encoding', encoding))
+            new_headers.append(('content-length', str(size)))
+        return new_headers
+
+
+    def _compress_response(self, environ, status, headers, data):
+        "Compresses the response data if the client accepts compression, returns status, headers, data"
+        if (not status.startswith('200')) or (not isinstance(data, list)):
+            # data read from files by generators are not compressed
+            return status, headers, data
+        body = b''.join(data)
+        vary, encoding = self._compress_encoding(environ, headers, len(body))
+        if not vary:
+            return status, headers, data
+        if encoding:
+            body = self._compress(encoding, body)
+        return status, self._encoded_headers(headers, vary, encoding, len(body)), [body]
+
+
     def get_cookies(self, environ):
         """Gets cookies from environ. and places them in 'received_cookies' dictionary.
            Checks presence of language in received cookie, or environ and creates a 'lang' tuple
@@ -206,7 +664,7 @@ class SkipoleProject(object):
            Finds the path called, and passes the path to self.proj_respond()
            or to subproj.proj_respond() if the path indicates the call is to a sub project.
            Detects if a ServerError occurs, and if so returns status, headers, data
-           for the system server_error page."""
+           for the system server_error page. This is a generator, used with yield from"""
         # The tuple s_h_data is the tuple to return, start with it as None
         s_h_data = None
         try:
@@ -221,41 +679,38 @@ class SkipoleProject(object):
                 return self._url_not_found(environ, path, lang)
 
             # This is the root project, check if the call is for a page in any sub project
-            for proj, projurl in self._subproject_paths.items():
-                if (path.find(projurl) == 0) or (path + "/" == projurl):
-                    # this url is within a sub project
-                    subproj = self.subprojects[proj]
-                    if subproj.check_cookies is None:
-                        # there is no check_cookies function, so no divertedcall. Call proj_respond of the sub project
-                        s_h_data = subproj.proj_respond(environ, projurl, path, lang, received_cookies)
-                        break
+            proj = self._subproject_from_path(path)
+            if proj is None:
+                # the call is for a page in this root project
+                s_h_data = yield from self.proj_respond(environ, self.url, path, lang, received_cookies)
+            else:
+                # this url is within a sub project
+                projurl = self._subproject_paths[proj]
+                subproj = self.subprojects[proj]
+                if subproj.check_cookies is None:
+                    # there is no check_cookies function, so no divertedcall. Call proj_respond of the sub project
+                    s_h_data = yield from subproj.proj_respond(environ, projurl, path, lang, received_cookies)
+                else:
                     # the subproj has a check_cookies function, call it. Call proj_respond of the sub project
-                    divertedcall = subproj.check_cookies(received_cookies, self.proj_data)
+                    divertedcall = yield from skiboot.awaited(subproj.check_cookies(received_cookies, self.proj_data))
                     if divertedcall is None:
                         # check_cookies returns None, so no diversion
-                        s_h_data = subproj.proj_respond(environ, projurl, path, lang, received_cookies)
-                        break
-                    # a divertedcall has been returned, it can be integer/tuple/label. Convert to ident
-                    divertedcall = skiboot.find_ident(divertedcall, proj_ident=self._proj_ident)
-                    if divertedcall is None:
-                        # no ident found, so this is a ulr_not_found, leave s_h_data as None
-                        break
-                    # a divertedcall ident is given, but it could be to a page in this root project or any sub project
-                    if divertedcall[0] == self._proj_ident:
-                        # the diversion is to an ident of this root project
-                        s_h_data = self.proj_respond(environ, self.url, path, lang, received_cookies, divertedcall)
-                        break
-                    elif divertedcall[0] in self.subprojects:
-                        # the diversion is to an ident of a sub project, identify the sub project
-                        subproj = self.subprojects[divertedcall[0]]
-                        s_h_data = subproj.proj_respond(environ, self._subproject_paths[divertedcall[0]], path, lang, received_cookies, divertedcall)
-                        break
+                        s_h_data = yield from subproj.proj_respond(environ, projurl, path, lang, received_cookies)
                     else:
-                        # should never occur, but if it does, leave s_h_data as None
-                        break
-            else:
-                # the call is for a page in this root project
-                s_h_data = self.proj_respond(environ, self.url, path, lang, received_cookies)
+                        # a divertedcall has been returned, it can be integer/tuple/label. Convert to ident
+                        divertedcall = skiboot.find_ident(divertedcall, proj_ident=self._proj_ident)
+                        # if no ident found, this is a ulr_not_found, leave s_h_data as None
+                        if divertedcall is None:
+                            pass
+                        # a divertedcall ident is given, but it could be to a page in this root project or any sub project
+                        elif divertedcall[0] == self._proj_ident:
+                            # the diversion is to an ident of this root project
+                            s_h_data = yield from self.proj_respond(environ, self.url, path, lang, received_cookies, divertedcall)
+                        elif divertedcall[0] in self.subprojects:
+                            # the diversion is to an ident of a sub project, identify the sub project
+                            subproj = self.subprojects[divertedcall[0]]
+                            s_h_data = yield from subproj.proj_respond(environ, self._subproject_paths[divertedcall[0]], path, lang, received_cookies, divertedcall)
+                        # else should never occur, but if it does, leave s_h_data as None
 
             if s_h_data is None:
                 # No page to return has been found, 
@@ -311,73 +766,46 @@ class SkipoleProject(object):
 
     def proj_respond(self, environ, projurl, path, lang, received_cookies, divertedcall=None):
         """Gets any received form data, and parses the ident field if present to find the caller page and ident_data
-           Calls start call, and depending on the returned page, calls the project status_headers_data method"""
+           Calls start call, and depending on the returned page, calls the project status_headers_data method.
+           This is a generator, used with yield from"""
+
+        if self.page_idle_time is not None:
+            now = time.monotonic()
+            # if another thread is already releasing pages, this call does not wait for it
+            if (now >= self._next_eviction) and self._eviction_lock.acquire(blocking=False):
+                try:
+                    if now >= self._next_eviction:
+                        self._next_eviction = now + self.page_idle_time
+                        self.evict_idle_pages()
+                finally:
+                    self._eviction_lock.release()
+
+        # the form data is only read when first accessed
+        rawformdata = FormData(environ, self.form_memory_limit, self.form_disk_limit)
+        s_h_data = None
+        try:
+            s_h_data = yield from self._form_respond(rawformdata, environ, projurl, path, lang, received_cookies, divertedcall)
+        finally:
+            # close any uploaded files once the response is built, unless the response is an iterator,
+            # which may read them as it is sent, and the files are then closed when garbage collected
+            if (s_h_data is None) or isinstance(s_h_data[2], list):
+                rawformdata.close()
+        return s_h_data
 
-        caller_page = None
-        ident_data = None
 
-        rawformdata = cgi.FieldStorage(fp=environ['wsgi.input'], environ=environ)
+    def _form_respond(self, rawformdata, environ, projurl, path, lang, received_cookies, divertedcall):
+        "Called by proj_respond with the received form data, returns status, headers, data or None, a generator"
 
         # if ident present in the rawformdata it should consist of project_pagenumber_identdata
         # and so the caller page can be found from the project_pagenumber
         # identdata may not exist
 
         try:
-            # get the caller_page, from the ident field of submitted data
-            # which could be None if no ident received
-
-            if rawformdata and ('ident' in rawformdata):
-                if not hasattr(rawformdata['ident'], 'value'):
-                    raise ValidateError(message="Form data not accepted, caller page ident not recognised")
-                else:
-                    # rawformdata has 'ident' with attribute 'value'
-                    # get the caller page ident, and the ident_data received from the 'ident' field
-                    # which will be project_pagenumber_b64encodeddata
-
-                    # Note: caller_page could belong to another project, so get it using ident.item() method
-                    # which will query the right project
-
-                    # project name, number and b64 encoded data should all be ascii characters passing this test
-                    if _AN64.search(rawformdata['ident'].value):
-                        raise ValidateError(message="Form data not accepted, caller page ident not recognised")
-
-                    ident_parts = rawformdata['ident'].value.split('_', 2)
-                    ident_items = len(ident_parts)
-                    try:
-                        if ident_items == 2:
-                            caller_page = skiboot.Ident(ident_parts[0], int(ident_parts[1])).item()
-                        elif ident_items == 3:
-                            caller_page = skiboot.Ident(ident_parts[0], int(ident_parts[1])).item()
-                            b64binarydata = ident_parts[2].encode('ascii') # get the submitted data and convert to binary
-                            # add padding
-                            b64binarydata = b64binarydata + b"=" * (4-len(b64binarydata)%4)
-                            ident_data = urlsafe_b64decode(b64binarydata).decode('utf-8') # b64 decode, and convert to string
-                    except Exception:
-                        caller_page = None
-                    if caller_page is None:
-                        raise ValidateError(message="Form data not accepted, (received ident is not valid)")
-                    if caller_page.page_type != 'TemplatePage':
-                        raise ValidateError(message="Form data not accepted, (caller page ident is not a template page)")
-
+            # the caller page is read from the ident field of the query string, or if not present there
+            # the request body is only read when the caller page or form data is required
+            caller = _Caller(rawformdata)
         except ValidateError as e:
-            page = self._system_page("validate_error")
-            if (not page) or (page.page_type != "TemplatePage"):
-                return self.default_validate_error_page(e.message)
-            # import any sections
-            page.import_sections()
-            # show message passed by the exception
-            page.show_error([e.errormessage])
-            # update head and body parts
-            page.update(environ, {}, lang, e.ident_list)
-            status, headers = page.get_status()
-            data = page.data()
-            if not data:
-                return self.default_validate_error_page(e.message)
-            # return page data
-            return e.status, headers, data
-
-
-        # so caller_page could be either given, or could be None
+            return self._validate_error_response(e, environ, {}, lang)
 
         # get the called ident, could be None
         if divertedcall is None:
@@ -385,24 +813,22 @@ class SkipoleProject(object):
         else:
             ident = divertedcall
 
-        if caller_page:
-            caller_page_ident = caller_page.ident
-        else:
-            caller_page_ident = None
-
         # now call the proj_start_call function which creates a skicall object and
         # calls the users start_call function, which could return a different page ident, or None
 
         try:
 
-            pident, skicall = self.proj_start_call(environ,
+            pident, skicall = yield from self.proj_start_call(environ,
                                                    path,
                                                    ident,
-                                                   caller_page_ident,
+                                                   caller,
                                                    received_cookies,
-                                                   ident_data,
                                                    lang)
 
+        except ValidateError as e:
+            # the caller ident, read by start_call, is invalid
+            return self._validate_error_response(e, environ, {}, lang)
+
         except ServeFile as e:
             server_file = e.server_file
             if server_file is None:
@@ -448,19 +874,13 @@ class SkipoleProject(object):
             if not page:
                 raise ServerError(message="Invalid ident returned from start_call")
 
-        # read any submitted data from rawformdata, and place in form_data
         try:
-            form_data = {}
-            if rawformdata and (caller_page is not None) and (page.page_type == "RespondPage"):
-                form_data = self.read_form_data(rawformdata, caller_page)
-
-            # so form_data only available if
+            # submitted data is read from rawformdata into form_data by the caller object, so form_data only available if
                 # rawformdata has been submitted
                 # and caller_page is known, so widgets can be extracted
-                # and the destination is a RespondPage
+                # and the destination is a RespondPage, with a responder which reads form data
 
                 # otherwise form_data is empty (though rawformdata is retained)
-        
 
             # dependent on wether the requested page is in this project or a sub project,
             # call status_headers_data() to find the final page to return to the client
@@ -473,39 +893,39 @@ class SkipoleProject(object):
             if page.ident.proj != self._proj_ident:
                 # page returned from start_call is in another project
                 subproj = self.subprojects.get(page.ident.proj)
-                return subproj.status_headers_data(skicall, environ, received_cookies, rawformdata, caller_page, page, ident_list, e_list, form_data)
+                return (yield from subproj.status_headers_data(skicall, environ, received_cookies, rawformdata, caller, page, ident_list, e_list))
                 
             # call status_headers_data to return status, headers and data to the top script
-            return self.status_headers_data(skicall, environ, received_cookies, rawformdata, caller_page, page, ident_list, e_list, form_data)
+            return (yield from self.status_headers_data(skicall, environ, received_cookies, rawformdata, caller, page, ident_list, e_list))
 
         except ValidateError as e:
-            page = self._system_page("validate_error")
-            if (not page) or (page.page_type != "TemplatePage"):
-                return self.default_validate_error_page(e.message)
-            # import any sections
-            page.import_sections()
-            # show message passed by the exception
-            page.show_error([e.errormessage])
-            # update head and body parts
-            page.update(environ, skicall.call_data, skicall.lang, e.ident_list)
-            status, headers = page.get_status()
-            data = page.data()
-            if not data:
-                return self.default_validate_error_page(e.message)
-            # return page data
-            return e.status, headers, page.data()
+            return self._validate_error_response(e, environ, skicall.call_data, skicall.lang)
 
 
+    def _validate_error_response(self, e, environ, call_data, lang):
+        "Returns status, headers, data of the validate_error page showing the message of ValidateError e"
+        page = self._system_page("validate_error")
+        if (not page) or (page.page_type != "TemplatePage"):
+            return self.default_validate_error_page(e.message)
+        # import any sections
+        page.import_sections()
+        # show message passed by the exception
+        page.show_error([e.errormessage])
+        # update head and body parts
+        page.update(environ, call_data, lang, e.ident_list)
+        status, headers = page.get_status()
+        data = page.data()
+        if not data:
+            return self.default_validate_error_page(e.message)
+        # return page data
+        return e.status, headers, data
+
 
-    def proj_start_call(self, environ, path, ident, caller_ident, received_cookies, ident_data, lang):
+    def proj_start_call(self, environ, path, ident, caller, received_cookies, lang):
         """Creates a skicall object and calls the users start_call function
            ident is the ident of the page being called, could be None if not recognised
-           Returns new called_ident, and the skicall object"""
-
-        if not caller_ident:
-            tuple_caller_ident = ()
-        else:
-            tuple_caller_ident = caller_ident.to_tuple()
+           caller is a _Caller object, giving the caller ident and ident_data when first required
+           Returns new called_ident, and the skicall object, this is a generator, used with yield from"""
 
         if ident is None:
             called_ident = None
@@ -518,15 +938,14 @@ class SkipoleProject(object):
                               path = path,
                               proj_ident = self._proj_ident,
                               rootproject = self.rootproject,
-                              caller_ident = tuple_caller_ident,
+                              caller = caller,
                               received_cookies = received_cookies,
-                              ident_data = ident_data,
                               lang = lang,
                               proj_data = self.proj_data)
 
             # the skicall object is changed in place, with call_data and page_data
             # being set by the users own start_call function
-            new_called_ident = self.start_call(called_ident, skicall)
+            new_called_ident = yield from skiboot.awaited(self.start_call(called_ident, skicall))
 
             # convert returned tuple to an Ident object
             if isinstance(new_called_ident, int):
@@ -538,6 +957,8 @@ class SkipoleProject(object):
             raise e
         except ServeFile as e:
             raise e
+        except ValidateError as e:
+            raise e
 ##########################################
         except AssertionError as e:
             raise e
@@ -558,6 +979,8 @@ class SkipoleProject(object):
             return {}
         if not caller_page:
             return {}
+        # the index of widget fields of the caller page, which may be in another project
+        field_index = caller_page.project.page_field_index(caller_page)
         form_data = {}
         for field in rawformdata.keys():
             # get fields and values from the rawformdata and store them in form_data
@@ -569,16 +992,24 @@ class SkipoleProject(object):
                 # All widgfields have a : in them to separate widget name from field name
                 raise ValidateError(message="Form data not accepted, (invalid field %s)" % (field,))
             widgfield = skiboot.make_widgfield(field)
-            # get fields and values from the rawformdata and store them in form_data
-            widget = caller_page.copy_widget_from_name(widgfield.s, widgfield.w)
-            if widget is None:
+            # get the widget fields from the index, which avoids copying the widget
+            widget_fields = field_index.get((widgfield.s, widgfield.w))
+            if (widget_fields is None) and ('_' in widgfield.s):
+                # could be in a multiplied section, such as name_3
+                sname, snumber = widgfield.s.rsplit('_', 1)
+                if snumber.isdigit():
+                    widget_fields = field_index.get((sname, widgfield.w))
+            if widget_fields is None:
                 raise ValidateError(message="Form data not accepted, (unexpected field %s)" % (field,))
+            senddict = widget_fields.get(widgfield.f)
+            if senddict is None:
+                raise ValidateError(message = "Widget %s field name %s not recognised" % (widgfield.w, widgfield.f))
             if isinstance(rawformdata[field], list):
                 # fieldvalue is a list of items
-                fieldvalue = [ item.value.strip() for item in rawformdata[field] ]
+                fieldvalue = [ self._field_value(item) for item in rawformdata[field] ]
             else:
-                fieldvalue = rawformdata[field].value.strip()
-            if widget.is_senddict(widgfield.f):
+                fieldvalue = self._field_value(rawformdata[field])
+            if senddict:
                 # field sends a dictionary, must have an index appended to the name
                 # this part removes the index from the field name, and creates a form value of a dictionary with the index as keys
                 fieldindex = widgfield.i
@@ -596,9 +1027,15 @@ class SkipoleProject(object):
         return form_data
 
 
+    def _field_value(self, item):
+        "Returns the stripped value of a received field, for an uploaded file this is bytes, skicall.uploaded_file gives a stream"
+        return item.value.strip()
 
-    def status_headers_data(self, skicall, environ, received_cookies, rawformdata, caller_page, page, ident_list, e_list, form_data):
-        """calls responders until it can return status, headers, page.data()"""
+
+    def status_headers_data(self, skicall, environ, received_cookies, rawformdata, caller, page, ident_list, e_list):
+        """calls responders until it can return status, headers, page.data()
+           caller is a _Caller object, which reads the caller page and form data if a responder requires them,
+           this is a generator, used with yield from"""
 
         try:
             while page.page_type == 'RespondPage':
@@ -606,7 +1043,8 @@ class SkipoleProject(object):
                 if page.responder is None:
                     raise ServerError(message="Respond page %s does not have any responder set" % (page.url,))
                 try:
-                    page = page.call_responder(skicall, form_data, caller_page, ident_list, rawformdata)
+                    caller_page, form_data = caller.form(page.responder.form_data_required)
+                    page = yield from page.call_responder(skicall, form_data, caller_page, ident_list, rawformdata)
                     if isinstance(page, str):
                         # must be a url
                         skicall.call_data.clear()
@@ -641,7 +1079,7 @@ class SkipoleProject(object):
                     e_list = ex.e_list
                 except GoTo as ex:
                     if ex.clear_submitted:
-                        form_data.clear()
+                        caller.clear_form_data()
                     if ex.clear_page_data:
                         skicall.page_data.clear()
                     if ex.clear_errors:
@@ -673,7 +1111,7 @@ class SkipoleProject(object):
                 # it is possible that a jump to a page in another project has been made
                 if page.ident.proj != self._proj_ident:
                     subproj = skiboot.getproject(proj_ident=page.ident.proj)
-                    return subproj.status_headers_data(skicall, environ, received_cookies, rawformdata, caller_page, page, ident_list, e_list, form_data)
+                    return (yield from subproj.status_headers_data(skicall, environ, received_cookies, rawformdata, caller, page, ident_list, e_list))
                 
         except (ServerError, ValidateError) as e:
             e.ident_list = ident_list
@@ -682,18 +1120,20 @@ class SkipoleProject(object):
         # the page to be returned to the client is now 'page'
         # and 'e_list' is a list of errors to be shown on it
 
-        # call the user function end_call
+        # call the user function end_call, end_call_error is set True if it raises FailPage
+        end_call_error = False
         try:
             skicall.proj_ident = self._proj_ident
             skicall.proj_data = self.proj_data
             skicall.rootproject = self.rootproject
             try:
-                session_string = self.end_call(page.ident.to_tuple(), page.page_type, skicall)
+                session_string = yield from skiboot.awaited(self.end_call(page.ident.to_tuple(), page.page_type, skicall))
                 if session_string:
                     # set cookie in target_page
                     page.session_cookie = "Set-Cookie", "%s=%s; Path=%s" % (skicall.proj_ident, session_string, skiboot.root_project().url)
             except FailPage as e:
                 page.show_error([e.errormessage])
+                end_call_error = True
             finally:
                 if skicall._lang_cookie:
                     page.language_cookie = skicall._lang_cookie
@@ -713,6 +1153,13 @@ class SkipoleProject(object):
         except Exception as e:
             raise ServerError("Invalid exception in end_call function.") from e
 
+        # check the response cache
+        cache_key = self._response_cache_key(page, skicall, e_list, end_call_error)
+        if cache_key is not None:
+            response = self._cached_response(cache_key, page, environ)
+            if response is not None:
+                return response
+
          # import any sections
         page.import_sections(skicall.page_data)
         if e_list:
@@ -728,13 +1175,209 @@ class SkipoleProject(object):
         except Exception as e:
             raise ServerError(message = "Exception setting page values.") from e
         status, headers = page.get_status()
+        if cache_key is not None:
+            return self._cache_response(cache_key, page, environ, status, headers, page.data())
         return status, headers, page.data()
 
 
+    def _response_cache_key(self, page, skicall, e_list, end_call_error=False):
+        """Returns the key of the response cache for this call, or None if the response is not to be cached.
+           A page is cached if it has enable_cache set, and either no page_data has been set by the user
+           functions, or the user functions have set skicall.cache_key, a hashable value which determines
+           the page_data set. The response then depends only on the page, language and this key"""
+        if not self.response_cache_size:
+            return
+        if e_list or end_call_error or skiboot.get_debug():
+            # a page showing errors is not cached
+            return
+        if page.page_type not in ('TemplatePage', 'SVG', 'CSS', 'JSON'):
+            # FilePages are read from the file, and RespondPages never reach here
+            return
+        if not skicall.page_data.get('enable_cache', page.enable_cache):
+            return
+        if skicall.page_data and (skicall.cache_key is None):
+            return
+        key = (page.ident, skicall.lang, skicall.cache_key)
+        try:
+            hash(key)
+        except TypeError:
+            return
+        return key
+
+
+    def _page_validity(self, page):
+        "Returns a tuple of the page change uuid, and the change uuids of sections placed in the page, used to validate cached data"
+        validity = [page.change]
+        section_places = getattr(page, 'section_places', None)
+        if section_places:
+            for placeholder in section_places.values():
+                section = self.sections.get(placeholder.section_name)
+                if section is not None:
+                    validity.append(section.change)
+        return tuple(validity)
+
+
+    def page_field_index(self, page):
+        """Returns a dictionary of {(section alias, widget name):{field name:senddict}} for the widgets
+           of a template or svg page, where section alias is '' for widgets not in a section, and senddict
+           is True if the field sends a dictionary. The dictionary is cached, and must not be altered"""
+        validity = self._page_validity(page)
+        entry = self._field_indexes.get(page.ident)
+        if entry and (entry[0] == validity):
+            return entry[1]
+        index = {}
+        for name, widget in page.widgets.items():
+            index['', name] = self._widget_field_index(widget)
+        for alias, placeholder in page.section_places.items():
+            section = self.sections.get(placeholder.section_name)
+            if section is None:
+                continue
+            for name, widget in section.widgets.items():
+                index[alias, name] = self._widget_field_index(widget)
+        self._field_indexes[page.ident] = (validity, index)
+        return index
+
+
+    def validation_plan(self, page, fields):
+        """Returns a list of (field, widgfield, fieldarg, section name) for each of the given fields of a template page,
+           where widgfield is the field as a WidgField, fieldarg is the widget field holding the validators, and section name is the name of the section
+           containing the widget, or '' if not in a section. The list is cached against the page and fields, and is
+           shared, so must not be altered. Raises ValidateError if a field is not found in the page"""
+        key = (page.ident, tuple(fields))
+        validity = self._page_validity(page)
+        entry = self._validation_plans.get(key)
+        if entry and (entry[0] == validity):
+            return entry[1]
+        # use the uncopied page if it is in this project
+        uncopied = self.get_item(page.ident)
+        if uncopied is None:
+            uncopied = page
+        plan = []
+        for widgfield in fields:
+            if not widgfield:
+                raise ValidateError(message = "Invalid widget-field, unable to validate")
+            widg_field = skiboot.make_widgfield(widgfield)
+            # widg_field is now a WidgField object with s, w, f and i attributes
+            if (not widg_field.w) or (not widg_field.f):
+                raise ValidateError(message = "Field %s not recognised" % (widgfield,))
+            widget = None
+            section_name = ''
+            if widg_field.s:
+                sectionplaceholder = uncopied.section_places.get(widg_field.s)
+                if (sectionplaceholder is None) and ("_" in widg_field.s):
+                    # could be a multiplied section, such as name_3
+                    sname, snumber = widg_field.s.rsplit('_', 1)
+                    if snumber.isdigit():
+                        sectionplaceholder = uncopied.section_places.get(sname)
+                if sectionplaceholder is not None:
+                    section_name = sectionplaceholder.section_name
+                    section = self.sections.get(section_name)
+                    if section is not None:
+                        widget = section.widgets.get(widg_field.w)
+            else:
+                # widget is not in a section, should be local to this page
+                widget = uncopied.widgets.get(widg_field.w)
+            if widget is None:
+                raise ValidateError(message = "Widget %s not found in page %s" % (widg_field.w, page.ident))
+            fieldarg = widget.get_field(widg_field.f)
+            if fieldarg is None:
+                raise ValidateError(message = "Field %s not found in widget %s, page %s" % (widg_field.f, widg_field.w, page.ident))
+            plan.append((widgfield, widg_field, fieldarg, section_name))
+        self._validation_plans[key] = (validity, plan)
+        return plan
+
+
+    def _widget_field_index(self, widget):
+        "Returns a dictionary of {field name:senddict} for the widget"
+        return { field.name:bool(field.senddict) for field in widget.fields.values() if field.name }
+
+
+    def _not_modified(self, environ, etag):
+        "Returns True if the request If-None-Match header matches the etag"
+        if_none_match = environ.get('HTTP_IF_NONE_MATCH')
+        if not if_none_match:
+            return False
+        if if_none_match.strip() == '*':
+            return True
+        return etag in [ tag.strip() for tag in if_none_match.split(',') ]
+
+
+    def _cached_response(self, cache_key, page, environ):
+        "Returns status, headers, data from the response cache, or None if not found"
+        try:
+            entry = self._responses[cache_key]
+            self._responses.move_to_end(cache_key)
+        except KeyError:
+            return
+        if entry[0] != self._page_validity(page):
+            return
+        return self._send_cached(entry, page, environ)
+
+
+    def _cache_response(self, cache_key, page, environ, status, headers, data):
+        "Adds the response to the response cache, and returns status, headers, data"
+        if (not status.startswith('200')) or (data is None):
+            return status, headers, data
+        validity = self._page_validity(page)
+        # the etag is the page change uuid, with a digest of the sections, language and cache key
+        etag = '"%s-%s"' % (page.change, uuid.uuid5(uuid.NAMESPACE_OID, repr((validity, cache_key))).hex[:12])
+        # cookies are particular to this call, and are not cached
+        cookies = (page.session_cookie, page.language_cookie)
+        cached_headers = [ header for header in headers if header not in cookies and header[0].lower() != 'etag' ]
+        cached_headers.append(('ETag', etag))
+        # the final dictionary holds compressed variants of the data {encoding:compressed data}
+        entry = (validity, etag, status, cached_headers, b''.join(data), {})
+        self._responses[cache_key] = entry
+        while len(self._responses) > self.response_cache_size:
+            try:
+                self._responses.popitem(last=False)
+            except KeyError:
+                break
+        return self._send_cached(entry, page, environ)
+
+
+    def _send_cached(self, entry, page, environ):
+        """Returns status, headers, data from a response cache entry, compressed if the root project
+           has compression enabled and the client accepts it, compressed data is kept in the entry"""
+        validity, etag, status, headers, body, variants = entry
+        rootproject = skiboot.root_project()
+        if rootproject.compression:
+            vary, encoding = rootproject._compress_encoding(environ, headers, len(body))
+            if encoding:
+                compressed = variants.get(encoding)
+                if compressed is None:
+                    compressed = rootproject._compress(encoding, body)
+                    variants[encoding] = compressed
+                body = compressed
+                etag = etag[:-1] + '-' + encoding + '"'
+            if vary:
+                headers = rootproject._encoded_headers(headers, vary, encoding, len(body))
+        # cookies set by end_call are not cached, but added to the response
+        headers = headers[:]
+        if page.session_cookie:
+            headers.append(page.session_cookie)
+        if page.language_cookie:
+            headers.append(page.language_cookie)
+        if self._not_modified(environ, etag):
+            return '304 Not Modified', [ header for header in headers if header[0].lower() not in ('content-type', 'content-length') ], []
+        return status, headers, [body]
+
+
 
     def clear_cache(self):
-        "clear the cache of paths"
-        self._paths = {}
+        "clear the cache of paths, the cache of responses and the shared routing table"
+        self._paths = collections.OrderedDict()
+        self._responses = collections.OrderedDict()
+        self._field_indexes = {}
+        self._validation_plans = {}
+        skiboot.clear_routes()
+
+    def path_cache_info(self):
+        "Returns a dictionary of path cache hits, misses, current size and maximum size"
+        return {'hits':self.path_cache_hits,
+                'misses':self.path_cache_misses,
+                'size':len(self._paths),
+                'maxsize':self.path_cache_size}
 
 
     def load_from_json(self):
@@ -744,23 +1387,343 @@ class SkipoleProject(object):
         self.brief = projectdict['brief']
         self.version = projectdict['version']
         self.special_pages = projectdict['specialpages']
+        skiboot.clear_routes()
         self.sections = projectdict['sections']
         self.root = projectdict['siteroot']
         itemlist = projectdict['itemlist']
-        self.identitems = {}
+        if skiboot.get_lazy_load():
+            self.identitems = LazyIdentItems()
+        else:
+            self.identitems = IdentItems()
         if itemlist:
             for item in itemlist:
                 self.identitems[item.ident] = item
 
 
+    def reload(self):
+        """Reads project.json and the textblocks files again, and builds the project from them, while calls continue to
+           be served by the current version. Pages and sections with an unchanged change uuid are kept from the current
+           version, and set into the new folders, together with their cached field indexes and validation plans. The new
+           version is then swapped in with a single assignment of the project state, and calls in progress finish with the
+           version they started with. Returns the number of folders, pages, sections and special pages which have been changed,
+           added or removed"""
+        self._check_not_frozen()
+        projectdict = read_json.create_project(self._proj_ident, self.projectfiles, self.proj_name)
+        changed = 0
+        sections = {}
+        for name, section in projectdict['sections'].items():
+            current = self.sections.get(name)
+            if (current is not None) and (current.change == section.change):
+                section = current
+            else:
+                changed += 1
+            sections[name] = section
+        changed += len(set(self.sections) - set(sections))
+        if _folder_changed(self.root, projectdict['siteroot']):
+            changed += 1
+        current_items = self.identitems
+        if skiboot.get_lazy_load():
+            identitems = LazyIdentItems()
+        else:
+            identitems = IdentItems()
+        # the unchanged pages kept from the current version
+        retained = []
+        for item in projectdict['itemlist']:
+            identitems[item.ident] = item
+            # the current item, without creating it if it is held as a PageSource
+            current = dict.get(current_items, item.ident)
+            if item.page_type == 'Folder':
+                # folders are always taken from the new version, as they hold the new pages
+                if (current is None) or (current.page_type != 'Folder') or _folder_changed(current, item):
+                    changed += 1
+                continue
+            if (current is None) or (current.change != item.change) or (current.name != item.name) or (current.parentfolder_ident != item.parentfolder_ident):
+                changed += 1
+            elif isinstance(current, read_json.PageSource):
+                # unchanged, but not yet created, so the new item is used
+                continue
+            elif isinstance(item, read_json.PageSource):
+                # a page already created from an unchanged source
+                if identitems.adopt(item.ident, current):
+                    retained.append(current)
+            elif type(current) is type(item):
+                identitems[item.ident] = current
+                retained.append(current)
+            else:
+                changed += 1
+        changed += len([ ident for ident in dict.keys(current_items) if ident not in identitems ])
+        # set the kept pages into the new folders
+        siteroot = projectdict['siteroot']
+        for page in retained:
+            parent_ident = page.parentfolder_ident
+            if parent_ident == siteroot.ident:
+                page.parentfolder = siteroot
+            else:
+                page.parentfolder = dict.get(identitems, parent_ident)
+        specialpages = projectdict['specialpages']
+        changed += len([ label for label in set(self.special_pages) | set(specialpages) if self.special_pages.get(label) != specialpages.get(label) ])
+        state = _ProjectState()
+        state.brief = projectdict['brief']
+        state.version = projectdict['version']
+        state.special_pages = specialpages
+        state.sections = sections
+        state.root = siteroot
+        state.identitems = identitems
+        state._paths = collections.OrderedDict()
+        state._routes = collections.OrderedDict()
+        # cached responses and section templates may hold the old urls, text and sections
+        state._responses = collections.OrderedDict()
+        state._section_templates = collections.OrderedDict()
+        state._field_indexes = { ident:value for ident, value in list(self._field_indexes.items()) if ident in identitems }
+        state._validation_plans = { key:value for key, value in list(self._validation_plans.items()) if key[0] in identitems }
+        state.textblocks = self.textblocks
+        if type(self.textblocks) is textblocks.AccessTextBlocks:
+            # textblocks set by set_accesstextblocks are left unchanged
+            state.textblocks = _shared_textblocks(self.proj_name, self.projectfiles)
+        state.textblocks.default_language = projectdict['default_language']
+        # the new version is swapped in with a single assignment, calls in progress keep the state they started with
+        self._state = state
+        skiboot.clear_routes()
+        return changed
+
+    def _file_times(self):
+        "Returns the modification times of project.json and the textblocks files, used by watch_files"
+        datadir = os.path.join(self.projectfiles, self.proj_name, "data")
+        try:
+            filestat = os.stat(os.path.join(datadir, "project.json"))
+            projecttime = (filestat.st_mtime_ns, filestat.st_size)
+        except OSError:
+            projecttime = None
+        return (projecttime, _textblocks_files(os.path.join(datadir, "textblocks_json")))
+
+    def watch_files(self, interval=2.0):
+        """Starts a daemon thread which checks project.json and the textblocks files every interval seconds,
+           and calls reload when they have changed, and then been unchanged for an interval. If a reload fails, the
+           error is printed to stderr, the current version is kept, and the files are checked again.
+           Returns True if the thread is started, False if it is already running, or the project is frozen"""
+        if self.frozen:
+            return False
+        if (self._watcher is not None) and self._watcher.is_alive():
+            return False
+        stop = threading.Event()
+        self._stop_watcher = stop
+        self._watcher = threading.Thread(target=self._watch, args=(interval, stop), name="skipole-watch-%s" % (self._proj_ident,), daemon=True)
+        self._watcher.start()
+        return True
+
+    def _watch(self, interval, stop):
+        "The loop of the watch_files thread"
+        filetimes = self._file_times()
+        changed = False
+        while not stop.wait(interval):
+            newtimes = self._file_times()
+            if newtimes != filetimes:
+                # wait until the files are unchanged for an interval, so a file being written is not read
+                filetimes = newtimes
+                changed = True
+                continue
+            if not changed:
+                continue
+            changed = False
+            try:
+                self.reload()
+            except Exception:
+                traceback.print_exc()
+
+    def stop_watching(self):
+        "Stops the thread started by watch_files"
+        if self._stop_watcher is not None:
+            self._stop_watcher.set()
+        self._watcher = None
+        self._stop_watcher = None
+
+
+    def add_stream(self, stream):
+        "Registers an event stream opened by a SubmitEventStream responder, to receive updates published to its channel"
+        with self._streams_lock:
+            self._streams.setdefault(stream.channel, set()).add(stream)
+
+    def remove_stream(self, stream):
+        "Removes an event stream, called as its connection closes"
+        with self._streams_lock:
+            streams = self._streams.get(stream.channel)
+            if streams is None:
+                return
+            streams.discard(stream)
+            if not streams:
+                del self._streams[stream.channel]
+
+    def wsgi_streams(self):
+        "Returns the number of this project's event streams held open by a WSGI server"
+        with self._streams_lock:
+            return len([ stream for channelstreams in self._streams.values() for stream in channelstreams if stream.wsgi ])
+
+    def event_data(self, ident, pagedict):
+        """Returns the binary JSON data of the JSON page with this ident, with the pagedict set into it, pagedict
+           being a dictionary as skicall.page_data. Returns None if the page is not found, or is not a JSON page"""
+        # a copy of the page
+        page = self[ident]
+        if (page is None) or (page.page_type != 'JSON'):
+            return
+        try:
+            page.set_values(pagedict)
+            page.update({}, {}, (self.default_language, self.default_language))
+        except ServerError as e:
+            raise e
+        except Exception as e:
+            raise ServerError(message = "Exception setting page values.") from e
+        return b''.join(page.data())
+
+    def publish(self, channel, page_data):
+        """Sends page_data, a PageData, SectionData or dictionary, to the clients holding event streams on channel,
+           as a JSON page update. The page_data is set into the target JSON page of each SubmitEventStream responder
+           once, and the result sent to all its streams. Returns the number of streams sent the update"""
+        with self._streams_lock:
+            streams = list(self._streams.get(channel, ()))
+        count = 0
+        if streams:
+            pd = PageData()
+            pd.update(page_data)
+            # {JSON page ident:binary data}
+            events = {}
+            for stream in streams:
+                if stream.target not in events:
+                    # set_values removes page settings from the dictionary, so it is given a copy
+                    events[stream.target] = self.event_data(stream.target, pd._page_data.copy())
+                data = events[stream.target]
+                if (data is not None) and stream.send(data):
+                    count += 1
+        for subproj in self.subprojects.values():
+            count += subproj.publish(channel, page_data)
+        return count
+
+    def close_streams(self, channel=None):
+        "Ends the event streams on channel, or all streams if channel is None, browsers then reconnect to them"
+        with self._streams_lock:
+            if channel is None:
+                streams = [ stream for channelstreams in self._streams.values() for stream in channelstreams ]
+            else:
+                streams = list(self._streams.get(channel, ()))
+        for stream in streams:
+            stream.close()
+        for subproj in self.subprojects.values():
+            subproj.close_streams(channel)
+
+
     @property
     def max_ident_num(self):
         "Returns the maximum identnumber currently in use"
-        maxnum = 0
-        for ident in self.identitems:
-            if ident.num > maxnum:
-                    maxnum = ident.num
-        return maxnum
+        return self.identitems.max_num
+
+    def has_ident_num(self, num):
+        "Returns True if the ident number is in use in this project, 0 being the root folder"
+        return self.identitems.has_num(num)
+
+    def evict_idle_pages(self, max_idle=None):
+        """In lazy load mode, releases pages which have not been accessed for max_idle seconds, or if None, for
+           self.page_idle_time seconds, together with their cached field indexes, validation plans and section templates.
+           Returns the number of pages released"""
+        if self.frozen or (not isinstance(self.identitems, LazyIdentItems)):
+            return 0
+        if max_idle is None:
+            max_idle = self.page_idle_time
+            if max_idle is None:
+                return 0
+        with self._eviction_lock:
+            evicted = set(self.identitems.evict(max_idle))
+            if not evicted:
+                return 0
+            for ident in evicted:
+                self._field_indexes.pop(ident, None)
+            # other threads may add to these caches while they are filtered, so copies of their items are read
+            self._validation_plans = { key:value for key, value in list(self._validation_plans.items()) if key[0] not in evicted }
+            self._section_templates = collections.OrderedDict((key, value) for key, value in list(self._section_templates.items()) if key[0] not in evicted)
+        return len(evicted)
+
+    def freeze(self):
+        """Prepares the project to be shared by forked worker processes. Creates every page in lazy load mode, which
+           compiles the static parts of template pages, and builds the field index and section templates of every
+           template and svg page, the validation plans of responders which validate fields submitted from those pages,
+           and the routes and paths of every page and folder. The caches are enlarged to hold these, and self.frozen
+           is set, so pages are no longer released, and reload and the methods which alter pages, folders, sections
+           and special pages raise ServerError. Returns the number of pages and folders"""
+        pages = []
+        responders = []
+        for ident in list(self.identitems):
+            item = self.identitems[ident]
+            if item.page_type in ('TemplatePage', 'SVG'):
+                pages.append(item)
+            elif (item.page_type == 'RespondPage') and (item.responder is not None):
+                if item.responder.validate_option and item.responder.fields:
+                    responders.append(item.responder)
+        for page in pages:
+            index = self.page_field_index(page)
+            for placename, placeholder in page.section_places.items():
+                self.section_template(page.ident, placename, placeholder.section_name)
+            for responder in responders:
+                # the caller page is only known when called, so a plan is built for each page
+                # which holds every widget of the responder fields
+                widgfields = [ skiboot.make_widgfield(field) for field in responder.fields ]
+                if not all( (widgfield.s or '', widgfield.w) in index for widgfield in widgfields ):
+                    continue
+                try:
+                    self.validation_plan(page, responder.fields)
+                except ValidateError:
+                    continue
+        if len(self._section_templates) > type(self).section_cache_size:
+            self.section_cache_size = len(self._section_templates) + type(self).section_cache_size
+        for ident in list(self.identitems):
+            ident.url()
+            self.page_ident_from_path(self.url, self.identitems[ident].url)
+        for label in self.special_pages:
+            self.label_to_url(label)
+        if len(self._paths) > type(self).path_cache_size:
+            self.path_cache_size = len(self._paths) + type(self).path_cache_size
+        skiboot.reserve_routes()
+        self.frozen = True
+        return len(self.identitems)
+
+    def _check_not_frozen(self):
+        "Raises ServerError if the project is frozen, as its pages, folders and sections are then shared and must not be altered"
+        if self.frozen:
+            raise ServerError(message="The project %s is frozen and cannot be altered" % (self._proj_ident,))
+
+    def preload_files(self, compress=True):
+        """Reads the files of all FilePages into memory, so they are served without reading the file,
+           with an ETag, and if compress is True, with gzip (and brotli if installed) variants.
+           Files changed after this is called are not seen until it is called again.
+           Returns the number of files loaded"""
+        filestore = {}
+        for item in self.identitems.values():
+            if item.page_type != 'FilePage':
+                continue
+            filepath = os.path.join(self.projectfiles, item.filepath)
+            if (filepath in filestore) or (not os.path.isfile(filepath)):
+                continue
+            filestore[filepath] = page_class_definition.StoredFile(filepath, item.mimetype, compress)
+        self.filestore = filestore
+        return len(filestore)
+
+
+    def resolve_submit_lists(self):
+        """If submit_data has a resolve attribute, as given by the use_submit_list decorator, calls it with
+           the submit_list of every responder with two or more elements, so any missing function raises
+           a ServerError. Returns the number of submit lists resolved"""
+        resolve = getattr(self.submit_data, 'resolve', None)
+        if resolve is None:
+            return 0
+        count = 0
+        for item in self.identitems.values():
+            if item.page_type != 'RespondPage':
+                continue
+            if item.responder is None:
+                continue
+            submit_list = item.responder.submit_list
+            if submit_list and (len(submit_list) >= 2):
+                resolve(submit_list)
+                count += 1
+        return count
+
 
     def list_section_names(self):
         "Returns a list of section names, alphabetacily ordered"
@@ -780,10 +1743,67 @@ class SkipoleProject(object):
         if section is None:
             return None
         return copy.deepcopy(section)
+
+
+    def section_widgets(self, section_name):
+        """Returns a read only {widget name:widget} mapping of the named section, or None if the section is not found.
+           The section is not copied, so the widgets must not be altered, this is used to read widget fields and validators"""
+        section = self.sections.get(section_name)
+        if section is None:
+            return
+        return types.MappingProxyType(section.widgets)
+
+    def section_template(self, page_ident, placename, section_name):
+        """Returns (section, scriptlinks) where section is a copy of the named section with idents,
+           id and placename set ready to be placed in the given page at placename, and scriptlinks
+           is a list of labels of javascript files required by the section.
+           The section is cached and shared, so must not be altered; use skiboot.request_copy
+           to obtain a copy for a call. Returns (None, []) if the section is not found"""
+        section = self.sections.get(section_name)
+        if section is None:
+            return None, []
+        key = (page_ident, placename, section_name)
+        templates = self._section_templates
+        template = templates.get(key)
+        if template and (template[0] == section.change):
+            try:
+                templates.move_to_end(key)
+            except KeyError:
+                # removed by another thread
+                pass
+            return template[1], template[2]
+        sectionpart = copy.deepcopy(section)
+        # gives sectionpart and subparts an ident of page_ident_name_locationnumbers
+        sectionpart.widgets = {}
+        sectionpart.section_places = {}
+        sectionpart.set_idents(str(page_ident) + '_' + placename, sectionpart.widgets, sectionpart.section_places, embedded=(section_name,'',None))
+        # If no id placed in the top tag, inserts the section placename
+        if not ('id' in sectionpart.attribs):
+            sectionpart.insert_id(id_string=placename)
+        # Set section widgets field displaynames
+        for widget in sectionpart.widgets.values():
+            # Note - this is called on named widgets only
+            widget.set_placename(section_name, placename)
+        # the section scriptlinks, validator modules and then widget modules
+        scriptlinks = list(sectionpart.validator_scriptlinks)
+        for widget in sectionpart.widgets.values():
+            # get 'ski_modulename'
+            link_label = "ski_" + widget.__class__.__module__.split(".")[-1]
+            if link_label not in scriptlinks:
+                scriptlinks.append(link_label)
+        templates[key] = (section.change, sectionpart, scriptlinks)
+        while len(templates) > self.section_cache_size:
+            try:
+                # remove the least recently used section
+                templates.popitem(last=False)
+            except KeyError:
+                break
+        return sectionpart, scriptlinks
  
 
     def add_section(self, name, section):
         "Adds a section to the project, returns section.change uuid"
+        self._check_not_frozen()
         # and save the section
         section.widgets = {}
         section.section_places = {}  # currently unused
@@ -794,13 +1814,16 @@ class SkipoleProject(object):
         # set the section change number
         section.change = uuid.uuid4().hex
         self.sections[name] = section
+        self._section_templates = collections.OrderedDict()
         return section.change
 
 
     def delete_section(self, name):
         "Deletes a section"
+        self._check_not_frozen()
         if name in self.sections:
             del self.sections[name]
+            self._section_templates = collections.OrderedDict()
 
     @property
     def ident_numbers(self):
@@ -813,8 +1836,8 @@ class SkipoleProject(object):
 
     def __getitem__(self, ident):
         """given an Ident, or a string version of ident, return page or folder. 
-              If folder or respond page return the item, any other page, return a deep copy
-              of the item. If item not found, return None"""
+              If folder or respond page return the item, any other page, return a copy
+              of the item made by skiboot.request_copy. If item not found, return None"""
         ident = skiboot.Ident.to_ident(ident, proj_ident=self._proj_ident)
         if ident is None:
             return
@@ -831,10 +1854,11 @@ class SkipoleProject(object):
             return item
         if item.page_type == 'RespondPage':
             return item
-        return copy.deepcopy(item)
+        return skiboot.request_copy(item)
 
     def add_item(self, parent_ident, item, ident=None):
         """Adds a new page or folder to the project, returns the item ident"""
+        self._check_not_frozen()
 
         # check ident
         if ident is None:
@@ -881,9 +1905,10 @@ class SkipoleProject(object):
         elif (item.page_type == 'TemplatePage') or (item.page_type == 'SVG'):
             item.set_idents()
             parent.pages[item.name] = item.ident
-            # now set validator modules in page
+            # now set validator modules in page, and compile its static parts
             if item.page_type == 'TemplatePage':
                 item.load_validator_scriptlinks()
+                item.compile_parts()
         else:
             parent.pages[item.name] = item.ident
 
@@ -899,6 +1924,7 @@ class SkipoleProject(object):
 
     def delete_item(self, itemident):
         """Deletes the page or folder with the given ident from the database."""
+        self._check_not_frozen()
         if itemident.num == 0:
             # cannot delete the root folder
             raise ServerError(message="Cannot delete the root folder")
@@ -923,6 +1949,7 @@ class SkipoleProject(object):
     def delete_folder_recursively(self, itemident):
         """Deletes the folder and contents with the given ident from the database.
            returns parentfolder number and change when done, raises ServerError on failure"""
+        self._check_not_frozen()
         if itemident.num == 0:
             # cannot delete the root folder
             raise ServerError(message="Cannot delete the root folder")
@@ -989,6 +2016,7 @@ class SkipoleProject(object):
         """Saves the page - used to save an altered page, not to add a new one
            If new_parent_ident is not None, indicates the page has moved to a different folder
            Returns the new page.change uuid"""
+        self._check_not_frozen()
         if item.page_type == 'Folder':
             raise ServerError(message="Invalid item, not a page.")
         item_ident = item.ident
@@ -1011,9 +2039,10 @@ class SkipoleProject(object):
                 new_parent_ident = None
         if (item.page_type == 'TemplatePage') or (item.page_type == 'SVG'):
             item.set_idents()
-        # now set validator modules in page
+        # now set validator modules in page, and compile its static parts
         if item.page_type == 'TemplatePage':
             item.load_validator_scriptlinks()
+            item.compile_parts()
         item.change = uuid.uuid4().hex
         if (old_name == item.name) and (new_parent_ident is None):
             # no folder change
@@ -1053,6 +2082,7 @@ class SkipoleProject(object):
         """Saves the folder - used to save an altered folder, not to add a new one
            If new_parent_ident is not None, indicates the folder has moved to a different parent folder
            Returns the new folder.change uuid"""
+        self._check_not_frozen()
         if item.page_type != 'Folder':
             raise ServerError(message="Invalid item, not a folder.")
         item_ident = item.ident
@@ -1165,6 +2195,7 @@ class SkipoleProject(object):
 
     def set_special_page(self, label, target):
         "Sets a special page"
+        self._check_not_frozen()
         if not label:
             raise ServerError(message="Sorry, a special page label must be given")
         if not target:
@@ -1183,12 +2214,15 @@ class SkipoleProject(object):
             if not item:
                 raise ServerError(message="Sorry, the page target is not recognised")
         self.special_pages[label] = item
+        skiboot.clear_routes()
 
 
     def delete_special_page(self, label):
         "Deletes a special page"
+        self._check_not_frozen()
         if label in self.special_pages:
             del self.special_pages[label]
+            skiboot.clear_routes()
 
     def _system_page(self, label):
         """Returns the system page with the given label, if not found, returns None"""
@@ -1268,7 +2302,11 @@ class SkipoleProject(object):
         """Given a page label, resolves the label to url string
            Follows subproject labels to the given depth, limited to avoid circular references
            Returns either the URL string, or None if unsuccessful"""
+        return skiboot.route(('label_to_url', self._proj_ident, label, depth), self._label_to_url, label, depth)
+
 
+    def _label_to_url(self, label, depth):
+        "Resolves the label for label_to_url"
         value = self.resolve_label(label, depth)
         if value is None:
             return
@@ -1276,14 +2314,7 @@ class SkipoleProject(object):
             # a url
             return value
         # value is "proj_id, integer"
-        proj = skiboot.getproject(value[0])
-        if proj is None:
-            return
-        # Get the page or folder of the proj
-        item = proj.get_item(value[1])
-        if item is None:
-            return
-        url = item.url
+        url = skiboot.Ident(value[0], value[1]).url()
         if not url:
             return
         return url
@@ -1352,11 +2383,71 @@ class SkipoleProject(object):
         return '400 Bad Request', [('content-type', 'text/html')], [page_text.encode('ascii', 'xmlcharrefreplace')]
 
 
+    def route(self, key, resolve, *args):
+        """Returns the value held in the routing table under key, if not present, calls resolve(*args)
+           and holds the result in the table, used by skiboot.route"""
+        routes = self._routes
+        try:
+            result = routes[key]
+        except KeyError:
+            pass
+        else:
+            try:
+                routes.move_to_end(key)
+            except KeyError:
+                # removed by another thread
+                pass
+            return result
+        result = resolve(*args)
+        routes[key] = result
+        while len(routes) > self.route_cache_size:
+            try:
+                # remove the least recently used route
+                routes.popitem(last=False)
+            except KeyError:
+                break
+        return result
+
+    def reserve_routes(self):
+        "Enlarges the routing table so the routes it now holds are kept, called by skiboot.reserve_routes"
+        if len(self._routes) > type(self).route_cache_size:
+            self.route_cache_size = len(self._routes) + type(self).route_cache_size
+
+    def clear_routes(self):
+        "Clears the routing table, called by skiboot.clear_routes"
+        self._routes = collections.OrderedDict()
+
     def page_ident_from_path(self, projurl, path):
-        """Tests if ident exists in the cache, return it, if not, call self.root.page_ident_from_path
-           and cach the result, then return the ident. If no ident found, or if ident within a restricted folder, return None."""
-        if path in self._paths:
-            return self._paths[path]
+        """Tests if path exists in the cache, return its ident, if not, call self._ident_from_path
+           and cache the result, then return the ident. If no ident found, or if ident within a restricted folder, return None,
+           and this is also cached so repeated calls for unknown paths do not search the folders again."""
+        paths = self._paths
+        try:
+            ident = paths[path]
+        except KeyError:
+            pass
+        else:
+            self.path_cache_hits += 1
+            try:
+                paths.move_to_end(path)
+            except KeyError:
+                # removed by another thread
+                pass
+            return ident
+        self.path_cache_misses += 1
+        ident = self._ident_from_path(projurl, path)
+        paths[path] = ident
+        while len(paths) > self.path_cache_size:
+            try:
+                # remove the least recently used path
+                paths.popitem(last=False)
+            except KeyError:
+                break
+        return ident
+
+
+    def _ident_from_path(self, projurl, path):
+        "Calls self.root.page_ident_from_path and returns the ident, or None if not found"
         ident = None
         strip_path = path.strip("/")
         if not strip_path:
@@ -1381,8 +2472,6 @@ class SkipoleProject(object):
                     # invalid call, the pathlist must start with the projurl
                     return
             ident = self.root.page_ident_from_path(self.identitems, pathlist)
-        if ident is not None:
-            self._paths[path] = ident
         return ident
 
 
@@ -1403,6 +2492,33 @@ class SkipoleProject(object):
         "Returns a list of subproject idents"
         return [i for i in self.subproject_paths]
 
+    def _subproject_from_path(self, path):
+        """Returns the proj_ident of the sub project serving path, or None if path is not within a sub project.
+           Walks self._subproject_tree by path segment, so the longest matching sub project url is found
+           in time proportional to the depth of the path, rather than the number of sub projects"""
+        node = self._subproject_tree
+        proj = None
+        # path starts with "/", so the first segment is empty and is skipped
+        for segment in path.split("/")[1:]:
+            node = node.get(segment)
+            if node is None:
+                break
+            if None in node:
+                proj = node[None]
+        return proj
+
+    @staticmethod
+    def _make_subproject_tree(subproject_paths):
+        """Given a dictionary of {proj_ident: url,...} returns a tree of dictionaries keyed by url segments,
+           with the key None holding the proj_ident at the node where its url ends"""
+        tree = {}
+        for proj_id, url in subproject_paths.items():
+            node = tree
+            for segment in url.strip("/").split("/"):
+                node = node.setdefault(segment, {})
+            node[None] = proj_id
+        return tree
+
     def add_project(self, proj, url=None, check_cookies=None):
         """Add a project to self, returns the url
            proj is the sub project application.
@@ -1439,10 +2555,13 @@ class SkipoleProject(object):
         sub_paths[proj_id] = url
         # save new subproject_paths dictionary
         self._subproject_paths = collections.OrderedDict(sorted(sub_paths.items(), key=lambda t: len(t[1].strip("/").split("/")), reverse=True))
+        self._subproject_tree = self._make_subproject_tree(self._subproject_paths)
         # add the subproject to this project
         proj.rootproject = False
         proj.url = url
+        proj.clear_cache()
         proj._subproject_paths = collections.OrderedDict()
+        proj._subproject_tree = {}
         proj.subprojects = {}
         self.subprojects[proj_id] = proj
         # set check_cookies function into the sub project
@@ -1461,19 +2580,110 @@ class SkipoleProject(object):
         return skiboot.Ident(self._proj_ident, self.max_ident_num+1)
 
 
+class _Caller(object):
+    """Finds the caller page and ident_data from the ident field of the submitted data, and reads the form data.
+       The ident is taken from the query string if present, otherwise the request body is only read
+       when the caller page or the form data is first required"""
+
+    def __init__(self, rawformdata):
+        self.rawformdata = rawformdata
+        # tuple of (caller_page, ident_data), None until read
+        self._ident = None
+        # the ValidateError raised if the received ident is invalid
+        self._error = None
+        # dictionary of widgfields and values, None until read
+        self._form_data = None
+        value = rawformdata.query_value('ident')
+        if value is not None:
+            self._ident = self._parse(value)
+        elif not rawformdata.has_body:
+            self._ident = (None, None)
+
+    def _parse(self, value):
+        "Returns the caller page and ident_data from a received ident, which will be project_pagenumber_b64encodeddata"
+
+        # Note: caller_page could belong to another project, so get it using ident.item() method
+        # which will query the right project
+
+        # project name, number and b64 encoded data should all be ascii characters passing this test
+        if _AN64.search(value):
+            raise ValidateError(message="Form data not accepted, caller page ident not recognised")
+
+        caller_page = None
+        ident_data = None
+        ident_parts = value.split('_', 2)
+        ident_items = len(ident_parts)
+        try:
+            if ident_items == 2:
+                caller_page = skiboot.Ident(ident_parts[0], int(ident_parts[1])).item()
+            elif ident_items == 3:
+                caller_page = skiboot.Ident(ident_parts[0], int(ident_parts[1])).item()
+                b64binarydata = ident_parts[2].encode('ascii') # get the submitted data and convert to binary
+                # add padding
+                b64binarydata = b64binarydata + b"=" * (4-len(b64binarydata)%4)
+                ident_data = urlsafe_b64decode(b64binarydata).decode('utf-8') # b64 decode, and convert to string
+        except Exception:
+            caller_page = None
+        if caller_page is None:
+            raise ValidateError(message="Form data not accepted, (received ident is not valid)")
+        if caller_page.page_type != 'TemplatePage':
+            raise ValidateError(message="Form data not accepted, (caller page ident is not a template page)")
+        return caller_page, ident_data
+
+    def ident(self):
+        "Returns the caller page and ident_data, either could be None, raises ValidateError if the received ident is invalid"
+        if self._error is not None:
+            raise self._error
+        if self._ident is None:
+            try:
+                if 'ident' in self.rawformdata:
+                    item = self.rawformdata['ident']
+                    if isinstance(item, list) or (item.filename is not None):
+                        raise ValidateError(message="Form data not accepted, caller page ident not recognised")
+                    self._ident = self._parse(item.value)
+                else:
+                    self._ident = (None, None)
+            except ValidateError as e:
+                self._error = e
+                raise
+        return self._ident
+
+    def form(self, required=True):
+        """Returns the caller page and a dictionary of form data, read from rawformdata when first required.
+           If required is False, and the form data has not been read, returns None and an empty dictionary"""
+        if self._form_data is None:
+            if not required:
+                return None, {}
+            caller_page = self.ident()[0]
+            if caller_page is None:
+                self._form_data = {}
+            else:
+                self._form_data = caller_page.project.read_form_data(self.rawformdata, caller_page)
+        return self.ident()[0], self._form_data
+
+    def clear_form_data(self):
+        "Clears the form data, which is then no longer read"
+        if self._form_data is None:
+            self._form_data = {}
+        else:
+            self._form_data.clear()
+
+
 class SkiCall(object):
     """SkiCall is the class of the skicall object which is created for each incoming
        call and is passed as an argument to the user functions"""
 
-    def __init__(self, environ, path, proj_ident, rootproject, caller_ident, received_cookies, ident_data, lang, proj_data):
+    def __init__(self, environ, path, proj_ident, rootproject, caller, received_cookies, lang, proj_data):
 
         self.environ = environ
         self.path = path
         self.proj_ident = proj_ident
         self.rootproject = rootproject
-        self.caller_ident = caller_ident
+        # the _Caller object, which reads caller_ident and ident_data when first required
+        self._caller = caller
+        self._caller_ident = None
+        self._ident_data = None
         self.received_cookies = received_cookies
-        self.ident_data = ident_data
         self._lang = lang
         self._lang_cookie = None
         self.proj_data = proj_data
@@ -1483,24 +2693,83 @@ class SkiCall(object):
         self.submit_dict = {'error_dict':{}}
         self.call_data = {}
         self.page_data = {}
+        # set by the user functions to allow pages with enable_cache set to be served from
+        # the response cache, a hashable value which determines the page_data set for the page
+        self.cache_key = None
 
     @property
     def project(self):
         return skiboot.project_name(self.proj_ident)
 
+    def _read_caller(self):
+        "Sets the caller ident and ident_data from the caller object, raises ValidateError if the received ident is invalid"
+        caller_page, ident_data = self._caller.ident()
+        if caller_page is None:
+            self._caller_ident = ()
+        else:
+            self._caller_ident = caller_page.ident.to_tuple()
+        self._ident_data = ident_data
+
+    @property
+    def caller_ident(self):
+        "The ident tuple of the page which submitted the call, or an empty tuple if not known"
+        if self._caller_ident is None:
+            self._read_caller()
+        return self._caller_ident
+
+    @caller_ident.setter
+    def caller_ident(self, value):
+        self._caller_ident = value
+
+    @property
+    def ident_data(self):
+        "The ident_data string of the page which submitted the call, or None"
+        if self._caller_ident is None:
+            self._read_caller()
+        return self._ident_data
+
+    @ident_data.setter
+    def ident_data(self, value):
+        if self._caller_ident is None:
+            self._read_caller()
+        self._ident_data = value
+
+    def uploaded_file(self, widgfield):
+        """Returns the uploaded file submitted in the given widgfield, as a file like object which can be read as a stream,
+           with attributes filename, and value giving the whole contents as bytes, or None if no file has been received.
+           widgfield is a tuple (widgetname, fieldname) or (sectionname, widgetname, fieldname)"""
+        rawformdata = self._caller.rawformdata
+        name = str(skiboot.make_widgfield(widgfield))
+        if name not in rawformdata:
+            return
+        item = rawformdata[name]
+        if isinstance(item, list) or (item.filename is None):
+            return
+        return item
+
 
-    def update(self, itemdata):
-        "Updates page_data from a PageData, SectionData or Dictionary"
+    def update(self, itemdata, share=False):
+        """Updates page_data from a PageData, SectionData, MultipliedSectionData or Dictionary. If share is True, itemdata is a PageData,
+           and no page_data has yet been set, the dictionary of the PageData becomes the page_data without being
+           copied, in which case the PageData should not be used again"""
         if isinstance(itemdata, PageData):
-            self.page_data.update(itemdata._page_data)
+            if share and (not self.page_data):
+                self.page_data = itemdata._page_data
+            else:
+                self.page_data.update(itemdata._page_data)
         elif isinstance(itemdata, SectionData):
             # create a PageData object and update it with the section
             pd = PageData()
             pd.update(itemdata)
             self.page_data.update(pd._page_data)
+        elif isinstance(itemdata, MultipliedSectionData):
+            # create a PageData object and update it with the multiplied sections
+            pd = PageData()
+            pd.update(itemdata)
+            self.page_data.update(pd._page_data)
         elif isinstance(itemdata, dict):
             # create a PageData object from the dictionary
-            pd = PageData.from_dict(itemdict)
+            pd = PageData.from_dict(itemdata)
             # and update from that
             self.page_data.update(pd._page_data)
         else:
@@ -1709,6 +2978,7 @@ class PageData(MutableMapping):
             else:
                 # a single string without / or : must be a page attribute
                 pd._page_data[key] = val
+        pd._index_widgets()
         return pd
 
 
@@ -1716,10 +2986,32 @@ class PageData(MutableMapping):
         "_page_data will become the skicall.page_data when this object is set into skicall"
         self._page_data = {}
         self.sections = set()
+        # the clash index, {widget name:set of field names} of the widgets not in sections, used to
+        # check that a section alias does not clash with a widget name without scanning _page_data
+        self._widgets = {}
 
     def clear(self):
         self._page_data.clear()
         self.sections.clear()
+        self._widgets.clear()
+
+    def _index_widgets(self):
+        "Builds the clash index from _page_data"
+        self._widgets = {}
+        for key in self._page_data:
+            if isinstance(key, tuple) and (len(key) == 2) and (key[0] not in self.sections):
+                self._widgets.setdefault(key[0], set()).add(key[1])
+
+    def _add_widgets(self, widgets):
+        "Adds the given {widget name:set of field names} to the clash index"
+        for widgetname, fieldnames in widgets.items():
+            if widgetname in self.sections:
+                # these keys are read as section attributes
+                continue
+            if widgetname in self._widgets:
+                self._widgets[widgetname].update(fieldnames)
+            else:
+                self._widgets[widgetname] = set(fieldnames)
 
     def to_dict(self):
         """Returns a dictionary containing the data held in this object, with keys as strings
@@ -1731,7 +3023,10 @@ class PageData(MutableMapping):
                 # keys are strings - page attributes, leave as strings
                 pagedict[key] = val
             elif isinstance(key, tuple):
-                if len(key) == 2:
+                if isinstance(val, MultipliedSectionData):
+                    # the columns are set as the keys of each multiplied section
+                    pagedict.update(val.to_dict(attributes=False))
+                elif len(key) == 2:
                     if key[0] in self.sections:
                         # keys are (sectionalias, attribute) set as "sectionalias/attribute"
                         pagedict[key[0]+'/'+key[1]] = val
@@ -1773,6 +3068,8 @@ class PageData(MutableMapping):
             if not isinstance(key, tuple):
                 continue
             if key[0] == sectionalias:
+                if isinstance(val, MultipliedSectionData):
+                    continue
                 if len(key) == 2:
                     s._section_data[key[1]] = val
                 else:
@@ -1798,38 +3095,49 @@ class PageData(MutableMapping):
         if isinstance(item, SectionData):
             # update from SectionData
             sectionalias = item.sectionalias
-            if sectionalias not in self.sections:
-                # test no widget clash
-                for key in self:
-                    # iterates through every widget, with key being (widg,fld)
-                    if sectionalias == key[0]:
-                        # sectionalias clashes with a widget
-                        raise KeyError
+            if sectionalias in self._widgets:
+                # sectionalias clashes with a widget
+                raise KeyError
             self._add_section(item)
+        elif isinstance(item, MultipliedSectionData):
+            if item.sectionalias in self._widgets:
+                # sectionalias clashes with a widget
+                raise KeyError
+            self._add_multiplied(item)
         elif isinstance(item, PageData):
             # update this PageData with another PageData object
             # test the sections in the item object do not clash with widgets in this object
-            for key in self:
-                # iterates through every widget in self, with key being (widg,fld)
-                if key[0] in item.sections:
-                    # widget in self has the same name as a section in item
-                    raise KeyError
+            if not item.sections.isdisjoint(self._widgets):
+                # widget in self has the same name as a section in item
+                raise KeyError
             self._page_data.update(item._page_data)
             self.sections.update(item.sections)
+            self._add_widgets(item._widgets)
         elif isinstance(item, dict):
             # create a PageData object from the dictionary, and update with that
-            pd = PageData.from_dict(item)
-            for key in self:
-                # iterates through every widget in self, with key being (widg,fld)
-                if key[0] in pd.sections:
-                    # widget in self has the same name as a section in pd
-                    raise KeyError
-            self._page_data.update(pd._page_data)
-            self.sections.update(pd.sections)
+            self.update(PageData.from_dict(item))
         else:
             raise KeyError
 
 
+    def extend(self, sections):
+        """Adds each SectionData or MultipliedSectionData of the iterable sections, as update does, so
+           hundreds of sections can be added in a single call. Raises KeyError if an item is not a
+           SectionData or MultipliedSectionData, or if a section alias is the name of a widget in this page data"""
+        widgets = self._widgets
+        for section in sections:
+            if isinstance(section, SectionData):
+                if section.sectionalias in widgets:
+                    raise KeyError
+                self._add_section(section)
+            elif isinstance(section, MultipliedSectionData):
+                if section.sectionalias in widgets:
+                    raise KeyError
+                self._add_multiplied(section)
+            else:
+                raise KeyError
+
+
     def _add_section(self, section):
         "Add section data"
         sectionalias = section.sectionalias
@@ -1843,6 +3151,17 @@ class PageData(MutableMapping):
         # add items from section
         for key,val in section.items():
             self._page_data[sectionalias, key[0], key[1]] = val
+
+    def _add_multiplied(self, multiplied):
+        """Add multiplied section data, its section attributes are set as for a section, and the
+           object itself is set with key (sectionalias, 'columns') to be read when the sections are imported"""
+        sectionalias = multiplied.sectionalias
+        self.sections.add(sectionalias)
+        for at, val in multiplied._section_data.items():
+            if val is None:
+                continue
+            self._page_data[sectionalias, at] = val
+        self._page_data[sectionalias, 'columns'] = multiplied
                 
 
     def __getattr__(self, name):
@@ -1880,18 +3199,35 @@ class PageData(MutableMapping):
 
     def __setitem__(self, key, value):
         if self._valid_widgfield(key):
-            if (value is None) and (key in self._page_data):
-                del self._page_data[key]
+            if value is None:
+                if key in self._page_data:
+                    del self._page_data[key]
+                    self._discard_widget(key)
             else:
                 self._page_data[key] = value
+                if key[0] in self._widgets:
+                    self._widgets[key[0]].add(key[1])
+                else:
+                    self._widgets[key[0]] = {key[1]}
         else:
             raise KeyError
 
 
+    def _discard_widget(self, key):
+        "Removes a (widget name, field name) key from the clash index"
+        fieldnames = self._widgets.get(key[0])
+        if fieldnames is None:
+            return
+        fieldnames.discard(key[1])
+        if not fieldnames:
+            del self._widgets[key[0]]
+
+
     def __delitem__(self, key):
         if self._valid_widgfield(key):
             if key in self._page_data:
                 del self._page_data[key]
+                self._discard_widget(key)
         else:
             raise KeyError
 
@@ -1912,12 +3248,7 @@ class PageData(MutableMapping):
 
     def __len__(self):
         "Returns the number of widgfields associated with the page"
-        page_data = self._page_data
-        length = 0
-        for key in page_data.keys():
-            if self._valid_widgfield(key):
-                length += 1
-        return length
+        return sum(len(fieldnames) for fieldnames in self._widgets.values())
 
 
 # instances of this SectionData is used with the update method of a PageData object to provide data for sections
@@ -2068,4 +3399,112 @@ class SectionData(MutableMapping):
 
 
 
+class MultipliedSectionData(MutableMapping):
+    """Holds the data of a section placeholder with a multiplier, in place of the SectionData objects given by
+       SectionData.multiply. Each key is a (widgetname, fieldname) tuple, and each value is a column, a list or
+       array with an item for each multiplied section, item n being set into the section with alias sectionalias_n.
+       Items which are None, or beyond the end of a column, are not set. Once added to a PageData by its update or
+       extend methods, the columns are read directly as the sections are imported into the page"""
+
+    section_variables = skiboot.SECTION_VARIABLES
+
+    def __init__(self, sectionalias, multiplier):
+        """sectionalias is the name of the section placeholder as set in the page,
+           multiplier is the number of sections"""
+        self._sectionalias = sectionalias
+        self._columns = {}
+        self._section_data = {'multiplier':multiplier}
+
+    def clear(self):
+        self._columns = {}
 
+    def to_dict(self, attributes=True):
+        """Returns a dictionary with keys as strings, of the form produced by SectionData.to_dict for each
+           multiplied section, and if attributes is True, with the section attributes as 'sectionalias/attribute'"""
+        sectiondict = {}
+        if attributes:
+            for key, val in self._section_data.items():
+                if val is None:
+                    continue
+                sectiondict[self._sectionalias + "/" + key] = val
+        for (widgetname, fieldname), column in self._columns.items():
+            for n, val in enumerate(column[:self.multiplier]):
+                if val is None:
+                    continue
+                sectiondict[self._sectionalias + "_" + str(n) + "-" + widgetname + ':' + fieldname] = val
+        return sectiondict
+
+    def set_value(self, index, key, value):
+        """Sets the value of the (widgetname, fieldname) key in the section with the given index, if the column
+           does not exist, a list of None values is created"""
+        if not self._valid_widgfield(key):
+            raise KeyError
+        column = self._columns.get(key)
+        if column is None:
+            column = [None] * self.multiplier
+            self._columns[key] = column
+        if index >= len(column):
+            column.extend([None] * (index + 1 - len(column)))
+        column[index] = value
+
+    def row(self, index):
+        "Returns a list of (widgetname, fieldname, value) of the values set for the section with the given index"
+        if index >= self.multiplier:
+            return []
+        values = []
+        for key, column in self._columns.items():
+            if index < len(column):
+                value = column[index]
+                if value is not None:
+                    values.append((key[0], key[1], value))
+        return values
+
+    def __getattr__(self, name):
+        "Get a section attribute from the _section_data dictionary"
+        if name == "sectionalias":
+            return self._sectionalias
+        if name not in self.section_variables:
+            raise AttributeError
+        return self._section_data.get(name)
+
+    def __setattr__(self, name, value):
+        "Sets a section attribute"
+        if name in ('_section_data', '_sectionalias', '_columns'):
+            super().__setattr__(name, value)
+            return
+        if name not in self.section_variables:
+            raise AttributeError
+        self._section_data[name] = value
+
+    def _valid_widgfield(self, key):
+        if not isinstance(key, tuple):
+            return False
+        if len(key) != 2:
+            # All widgfields have a two element tuple as key
+            return False
+        return True
+
+    def __setitem__(self, key, column):
+        if self._valid_widgfield(key):
+            self._columns[key] = column
+        else:
+            raise KeyError
+
+    def __delitem__(self, key):
+        if self._valid_widgfield(key):
+            del self._columns[key]
+        else:
+            raise KeyError
+
+    def __getitem__(self, key):
+        if self._valid_widgfield(key):
+            return self._columns[key]
+        else:
+            raise KeyError
+
+    def __iter__(self):
+        return iter(self._columns)
+
+    def __len__(self):
+        "Returns the number of columns"
+        return len(self._columns)
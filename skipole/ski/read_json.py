@@ -1,7 +1,7 @@
 
 
 
-import os, json, importlib, inspect, collections, uuid
+import os, json, importlib, inspect, collections, uuid, hashlib, hmac, pickle, tempfile
 
 
 from . import skiboot, excepts, folder_class_definition, page_class_definition, tag
@@ -268,8 +268,27 @@ def _check_idents_for_create_folder(project_numbers, new_numbers, addition_numbe
 
 
 
+# the project.json file last read by read_project, shared by projects loading the same file in turn, such as
+# several instances of one project with different proj_idents, {filepath:((mtime, size), project)}
+# only the last file is held, as the read project is no longer needed once the pages are built from it
+_DEFINITIONS = {}
+
+# in lazy load mode, the json strings of the pages of the project held in _DEFINITIONS, so the PageSource
+# objects of every instance built from it share one string for each page, {id(page_dict):(page_dict, json string)}
+# the built pages are not shared, as their idents hold the proj_ident of their instance
+_PAGE_SOURCES = {}
+
+
+def clear_definitions():
+    "Clears the shared project.json files held by read_project, and the page json strings built from them"
+    _DEFINITIONS.clear()
+    _PAGE_SOURCES.clear()
+
+
 def read_project(proj_ident, projectfiles, proj_name):
-    "Reads the project.json file and checks version, if ok returns the read project"
+    """Reads the project.json file and checks version, if ok returns the read project.
+       The last read project is held, and returned again for the same unchanged file, so must not be altered.
+       Only this parsed file is shared, each project builds its own pages from it"""
 
     if not proj_ident:
         raise excepts.ServerError("Sorry, the project has not been recognised")
@@ -279,6 +298,15 @@ def read_project(proj_ident, projectfiles, proj_name):
 
     filepath = os.path.join(projectfiles, proj_name, "data", "project.json")
 
+    try:
+        filestat = os.stat(filepath)
+    except Exception:
+        raise excepts.ServerError("Unable to read file %s" % (filepath,))
+    filekey = (filestat.st_mtime_ns, filestat.st_size)
+    definition = _DEFINITIONS.get(filepath)
+    if definition and (definition[0] == filekey):
+        return definition[1]
+
     try:
         with open(filepath, 'r') as fp:
             project = json.load(fp, object_pairs_hook=collections.OrderedDict)
@@ -342,6 +370,8 @@ def read_project(proj_ident, projectfiles, proj_name):
                         ph["multiplier"] = 0
             else:
                 continue
+    clear_definitions()
+    _DEFINITIONS[filepath] = (filekey, project)
     return project
 
 
@@ -384,7 +414,94 @@ def _allparts(toplist, part_type):
 
 
 def create_project(proj_ident, projectfiles, proj_name):
-    """Builds the project from the file project.json, returns a dictionary
+    """Builds the project from the file project.json, or if snapshots are enabled and
+       the file project.snapshot matches project.json, from the snapshot.
+       If it does not match, the project is built from project.json and a new snapshot
+       is written. Returns the dictionary given by _create_project"""
+    lazy = skiboot.get_lazy_load()
+    secret = skiboot.get_snapshot_secret()
+    if (not skiboot.get_snapshot()) or (not secret) or (not proj_ident) or (not proj_name):
+        return _create_project(proj_ident, projectfiles, proj_name, lazy)
+    datadir = os.path.join(projectfiles, proj_name, "data")
+    if proj_ident == proj_name:
+        snapshotpath = os.path.join(datadir, "project.snapshot")
+    else:
+        # each proj_ident has its own snapshot, as the idents of the items differ
+        snapshotpath = os.path.join(datadir, "project.%s.snapshot" % (proj_ident,))
+    key = _snapshot_key(proj_ident, os.path.join(datadir, "project.json"), lazy)
+    if key is None:
+        return _create_project(proj_ident, projectfiles, proj_name, lazy)
+    projectdict = _read_snapshot(snapshotpath, key, secret)
+    if projectdict is not None:
+        return projectdict
+    projectdict = _create_project(proj_ident, projectfiles, proj_name, lazy)
+    _write_snapshot(datadir, snapshotpath, key, secret, projectdict)
+    return projectdict
+
+
+def _snapshot_key(proj_ident, filepath, lazy):
+    """Returns the key of a snapshot, being the skipole version, project ident, the modification time
+       and size of project.json, and the lazy load mode, or None if project.json cannot be read"""
+    try:
+        filestat = os.stat(filepath)
+    except Exception:
+        return
+    return [skiboot.version(), proj_ident, filestat.st_mtime_ns, filestat.st_size, lazy]
+
+
+def _snapshot_signature(secret, header, payload):
+    "Returns the HMAC of the snapshot header and payload, as a hex string encoded to bytes"
+    signature = hmac.new(secret, header, hashlib.sha256)
+    signature.update(payload)
+    return signature.hexdigest().encode('ascii')
+
+
+def _read_snapshot(snapshotpath, key, secret):
+    """The snapshot file holds a header line of the key as JSON, a line with the HMAC signature of the header
+       and the payload, and the payload, being the pickled project dictionary. Returns the project dictionary,
+       or None if the file is not present, the key does not match, or the signature is not valid, in which
+       case the payload is not unpickled"""
+    if not os.path.isfile(snapshotpath):
+        return
+    try:
+        with open(snapshotpath, 'rb') as fp:
+            header = fp.readline()
+            if json.loads(header) != key:
+                return
+            signature = fp.readline().rstrip(b'\n')
+            payload = fp.read()
+        if not hmac.compare_digest(signature, _snapshot_signature(secret, header, payload)):
+            return
+        return pickle.loads(payload)
+    except Exception:
+        return
+
+
+def _write_snapshot(datadir, snapshotpath, key, secret, projectdict):
+    """Writes the snapshot to a temporary file, which then replaces any existing snapshot,
+       if the directory cannot be written to, no snapshot is made"""
+    try:
+        fd, temppath = tempfile.mkstemp(suffix='.tmp', prefix='project.snapshot.', dir=datadir)
+    except Exception:
+        return
+    try:
+        header = json.dumps(key).encode('utf-8') + b'\n'
+        payload = pickle.dumps(projectdict, pickle.HIGHEST_PROTOCOL)
+        with os.fdopen(fd, 'wb') as fp:
+            fp.write(header)
+            fp.write(_snapshot_signature(secret, header, payload) + b'\n')
+            fp.write(payload)
+        os.replace(temppath, snapshotpath)
+    except Exception:
+        try:
+            os.remove(temppath)
+        except OSError:
+            pass
+
+
+def _create_project(proj_ident, projectfiles, proj_name, lazy=False):
+    """Builds the project from the file project.json, if lazy is True, TemplatePages and SVG pages
+       are not created, but are given as PageSource objects. Returns a dictionary
           with the following keys
          original_skipole_version
          url
@@ -446,6 +563,7 @@ def create_project(proj_ident, projectfiles, proj_name):
         sections = {}
         for section_name, section_part in project['sections'].items():
             section = _create_item(section_part, proj_ident)
+            section.change = _json_change(proj_ident, section_name, json.dumps(section_part, separators=(',', ':')))
             section.widgets = {}
             section.section_places = {}  # currently unused
             embedded = (section_name, '', None)
@@ -472,10 +590,10 @@ def create_project(proj_ident, projectfiles, proj_name):
     item_list = []
     if "folders" in rootfolder:
         for folder_name, folder in rootfolder['folders'].items():
-            item_list.extend(_folder(siteroot, folder_name, folder, proj_ident))
+            item_list.extend(_folder(siteroot, folder_name, folder, proj_ident, lazy=lazy))
     if "pages" in rootfolder:
         for page_name, page in rootfolder['pages'].items():
-            pageinstance = _page(siteroot, page_name, page, proj_ident)
+            pageinstance = _page(siteroot, page_name, page, proj_ident, lazy=lazy)
             if pageinstance is not None:
                  item_list.append(pageinstance)
     projectdict['itemlist'] = item_list
@@ -501,7 +619,7 @@ def _to_dict(input_dict, proj_ident):
     return newdict
 
 
-def _folder(parent, folder_name, folder_dict, proj_ident, addition_number=0, restricted=False):
+def _folder(parent, folder_name, folder_dict, proj_ident, addition_number=0, restricted=False, lazy=False):
     "Create a folder"
     if 'ident' not in folder_dict:
         raise excepts.ServerError("A folder requires an ident")
@@ -528,19 +646,23 @@ def _folder(parent, folder_name, folder_dict, proj_ident, addition_number=0, res
     # now fill folder contents
     if "folders" in folder_dict:
         for subfolder_name, subfolder in folder_dict['folders'].items():
-            page_list.extend(_folder(folder, subfolder_name, subfolder, proj_ident, addition_number, restricted))
+            page_list.extend(_folder(folder, subfolder_name, subfolder, proj_ident, addition_number, restricted, lazy))
     if "pages" in folder_dict:
         for page_name, page in folder_dict['pages'].items():
-            pageinstance = _page(folder, page_name, page, proj_ident, addition_number)
+            pageinstance = _page(folder, page_name, page, proj_ident, addition_number, lazy)
             if pageinstance is not None:
                 page_list.append(pageinstance)
     # add folder to page_list
     page_list.append(folder)
     return page_list
 
-def _page(parent, page_name, page_dict, proj_ident, addition_number=0):
+def _page(parent, page_name, page_dict, proj_ident, addition_number=0, lazy=False):
     if 'ident' not in page_dict:
         raise excepts.ServerError("A page ident missing")
+    if lazy and (("SVG" in page_dict) or ("TemplatePage" in page_dict)):
+        source = PageSource(parent, page_name, page_dict, proj_ident, addition_number)
+        parent.pages[page_name] = source.ident
+        return source
     ident = skiboot.Ident(proj_ident, page_dict['ident']+addition_number)
     if 'brief' in page_dict:
         brief = page_dict['brief']
@@ -571,6 +693,7 @@ def _page(parent, page_name, page_dict, proj_ident, addition_number=0):
         return
     # set the page ident
     page.ident = ident
+    page.change = _json_change(proj_ident, addition_number, json.dumps(page_dict, separators=(',', ':')))
     # set the page parentfolder attribute
     page.parentfolder = parent
     # set the name:ident into the parent
@@ -580,9 +703,56 @@ def _page(parent, page_name, page_dict, proj_ident, addition_number=0):
     if ("TemplatePage" in page_dict):
         # now set validator modules in page
             page.load_validator_scriptlinks()
+            # and compile the static parts of the page
+            page.compile_parts()
     return page
 
 
+class PageSource(object):
+    """In lazy load mode, this holds the JSON of a TemplatePage or SVG page in place of the page,
+       which is created from it when first accessed. It has the name, ident, brief, page_type and
+       parentfolder attributes of the page"""
+
+    def __init__(self, parent, page_name, page_dict, proj_ident, addition_number=0):
+        self.name = page_name
+        self.ident = skiboot.Ident(proj_ident, page_dict['ident']+addition_number)
+        self.brief = page_dict.get('brief', "")
+        if "SVG" in page_dict:
+            self.page_type = 'SVG'
+        else:
+            self.page_type = 'TemplatePage'
+        self.parentfolder = parent
+        self.parentfolder_ident = parent.ident
+        self.proj_ident = proj_ident
+        self.addition_number = addition_number
+        self.json_string = _page_json(page_dict)
+        # the change uuid the page is given each time it is created
+        self.change = _json_change(proj_ident, addition_number, self.json_string)
+
+    def create(self):
+        "Creates and returns the page"
+        page_dict = json.loads(self.json_string, object_pairs_hook=collections.OrderedDict)
+        return _page(self.parentfolder, self.name, page_dict, self.proj_ident, self.addition_number)
+
+
+def _page_json(page_dict):
+    """Returns the page dictionary as a json string, which is shared by the PageSource objects of every
+       project built from the project.json held by read_project"""
+    entry = _PAGE_SOURCES.get(id(page_dict))
+    if (entry is not None) and (entry[0] is page_dict):
+        return entry[1]
+    json_string = json.dumps(page_dict, separators=(',', ':'))
+    _PAGE_SOURCES[id(page_dict)] = (page_dict, json_string)
+    return json_string
+
+
+def _json_change(proj_ident, addition, json_string):
+    """Returns the change uuid of a page or section created from json_string, this is the same whenever
+       the same json is loaded by this version of skipole, so an unchanged item is recognised when a
+       project is reloaded, and has the same ETag in every process"""
+    return uuid.uuid5(uuid.NAMESPACE_OID, "%s %s %s %s" % (skiboot.version(), proj_ident, addition, json_string)).hex
+
+
 def _create_filepage(page_name, brief, page_args):
     "Create a filepage"
     if 'filepath' in page_args:
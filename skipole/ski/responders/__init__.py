@@ -5,7 +5,7 @@
    The instance is callable, and the respondpage calls it
    to provide the page action"""
 
-import copy, sys, traceback
+import copy, sys, traceback, types
 
 from .. import skiboot, tag
 from ..excepts import ValidateError, ServerError, FailPage, ErrorMessage, PageError, GoTo, ServeFile, SkiStop, SkiRestart
@@ -38,6 +38,10 @@ main purpose is to act as a parent class for all other respond objects.
     # This indicates if the validate option is available
     validate_option_available = False
 
+    # If True, the submitted form data and the caller page are read before this responder is called,
+    # if False, and no previous responder has read them, the request body is not parsed for them
+    form_data_required = True
+
     # Options for the fields argument
     field_options = {'fields': True,                  # If False, no fields are expected
                      'widgfields':True,               # If True, fields are widgfields, if False, can be other constants
@@ -219,7 +223,8 @@ main purpose is to act as a parent class for all other respond objects.
 
 
     def _submit_data(self, ident_list, skicall):
-        "Calls the appropriate user submit_data function"
+        """Calls the appropriate user submit_data function, this is a generator used with yield from,
+           which yields the awaitable returned by an async def submit_data function"""
         # the call could have been passed to another project
         # so update skicall with this project
         proj_ident = ident_list[-1].proj
@@ -234,7 +239,8 @@ main purpose is to act as a parent class for all other respond objects.
         try:
             skicall.ident_list = tuple_ident_list
             skicall.submit_list = self.submit_list.copy()
-            result = this_project.submit_data(skicall)
+            # submit_data may be an async def function, in which case its result is awaited
+            result = yield from skiboot.awaited(this_project.submit_data(skicall))
         except (GoTo, FailPage, ServerError, ValidateError, ServeFile, SkiStop, SkiRestart) as e:
             raise e
         except Exception as e:
@@ -289,13 +295,22 @@ main purpose is to act as a parent class for all other respond objects.
         # e_list is a list of ErrorMessage exceptions with message to be displayed, and where to display them
         e_list = []
         # skicall.submit_dict["error_dict"] is a dictionary of errored widgfields: original value
- 
-        for field in self.fields:
+
+        # the validation plan gives the widget field holding the validators for each field,
+        # it is cached in the project of the caller page, so the widgets are not searched on each call
+        plan = caller_page.project.validation_plan(caller_page, self.fields)
+
+        for field, widg_field, fieldarg, section_name in plan:
             # validate each field
             if field not in form_data:
                 validated_form_data[field] = ''
             value = validated_form_data[field]
-            validated_form_data[field], errors = caller_page.validate(field, value, skicall.environ, skicall.lang, validated_form_data, skicall.call_data, skicall.page_data)
+            validated_form_data[field], errors = fieldarg.validate(widg_field, value, skicall.environ, skicall.lang, validated_form_data, skicall.call_data, caller_page.ident)
+            # errors in same section as the errored widget need s value changing
+            if widg_field.s:
+                for error in errors:
+                    if error.section == section_name:
+                        error.section = widg_field.s
             if errors:
                 e_list.extend(errors)
                 if field.s:
@@ -377,7 +392,8 @@ main purpose is to act as a parent class for all other respond objects.
 
 
     def __call__(self, skicall, form_data, caller_page, ident_list, proj_ident, rawformdata):
-        "gets the project ident, and page messages and calls self._respond"
+        """gets the project ident, and page messages and calls self._respond, this is a generator
+           used with yield from, which yields any awaitables from submit_data"""
 
         if self.target_ident_required:
             skicall.submit_dict['target_ident'] = self.ident_for_user(self.target_ident)
@@ -388,6 +404,9 @@ main purpose is to act as a parent class for all other respond objects.
         # call self._respond
         try:
             page = self._respond(skicall, form_data, caller_page, ident_list, proj_ident, rawformdata)
+            if isinstance(page, types.GeneratorType):
+                # _respond calls submit_data, and is a generator
+                page = yield from page
         except GoTo as e:
             e.proj_ident=proj_ident
             raise e
@@ -427,7 +446,7 @@ main purpose is to act as a parent class for all other respond objects.
 # import all responders here
 
 from .checkers import AllowedFields, PrettyFormData, StoreData, StoreDataKeyed, AllowStoreKeyed, AllowStore, Accept, AllowedAccept, PageData
-from .submitters import SubmitData, SubmitCSS, GetDictionaryDefaults, FieldStoreSubmit, ColourSubstitute, SetCookies, SubmitJSON, SubmitPlainText, SubmitIterator, MediaQuery
+from .submitters import SubmitData, SubmitCSS, GetDictionaryDefaults, FieldStoreSubmit, ColourSubstitute, SetCookies, SubmitJSON, SubmitPlainText, SubmitIterator, SubmitEventStream, MediaQuery
 from .navigators import CaseSwitch, EmptyGoto, EmptyCallDataGoto, DelCallDataItem, AddCallDataItem, NoOperation
 
 
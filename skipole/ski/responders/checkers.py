@@ -83,7 +83,7 @@ under key 'received_data' which contains a dictionary of widgfield tuples:values
                 # no form_data received, no fields to check, go to target page or submit_data
                 if self.submit_option:
                     try:
-                        self._submit_data(ident_list, skicall)
+                        yield from self._submit_data(ident_list, skicall)
                     except FailPage as e:
                         # raises a PageError exception
                         self.raise_error_page(proj_ident, [e.errormessage], e.failpage)
@@ -127,7 +127,7 @@ under key 'received_data' which contains a dictionary of widgfield tuples:values
             skicall.submit_dict['received_data'] = received_data
 
             try:
-                self._submit_data(ident_list, skicall)
+                yield from self._submit_data(ident_list, skicall)
             except FailPage as e:
                 # raises a PageError exception
                 self.raise_error_page(proj_ident, [e.errormessage], e.failpage)
@@ -187,7 +187,7 @@ class StoreData(Respond):
                 caller_ident = caller_page.ident
 
             try:
-                self._submit_data(ident_list, skicall)
+                yield from self._submit_data(ident_list, skicall)
             except FailPage as e:
                 # raises a PageError exception
                 self.raise_error_page(proj_ident, [e.errormessage], e.failpage)
@@ -245,7 +245,7 @@ class StoreDataKeyed(Respond):
                 caller_ident = caller_page.ident
 
             try:
-                self._submit_data(ident_list, skicall)
+                yield from self._submit_data(ident_list, skicall)
             except FailPage as e:
                 # raises a PageError exception
                 self.raise_error_page(proj_ident, [e.errormessage], e.failpage)
@@ -313,7 +313,7 @@ with keys equal to the field values set here.
                 if self.submit_option:
 
                     try:
-                        self._submit_data(ident_list, skicall)
+                        yield from self._submit_data(ident_list, skicall)
                     except FailPage as e:
                         # raises a PageError exception
                         self.raise_error_page(proj_ident, [e.errormessage], e.failpage)
@@ -346,7 +346,7 @@ with keys equal to the field values set here.
         if self.submit_option:
 
             try:
-                self._submit_data(ident_list, skicall)
+                yield from self._submit_data(ident_list, skicall)
             except FailPage as e:
                 # raises a PageError exception
                 self.raise_error_page(proj_ident, [e.errormessage], e.failpage)
@@ -412,7 +412,7 @@ class AllowStore(Respond):
                 if self.submit_option:
 
                     try:
-                        self._submit_data(ident_list, skicall)
+                        yield from self._submit_data(ident_list, skicall)
                     except FailPage as e:
                         # raises a PageError exception
                         self.raise_error_page(proj_ident, [e.errormessage], e.failpage)
@@ -449,7 +449,7 @@ class AllowStore(Respond):
         if self.submit_option:
 
             try:
-                self._submit_data(ident_list, skicall)
+                yield from self._submit_data(ident_list, skicall)
             except FailPage as e:
                 # raises a PageError exception
                 self.raise_error_page(proj_ident, [e.errormessage], e.failpage)
@@ -489,7 +489,7 @@ class PrettyFormData(Respond):
             skicall.submit_dict['form_data'] = ''
 
 
-        # rawformdata is a FieldStorage object
+        # rawformdata is a formdata.FormData object
         new_dict = {}
         for field in rawformdata.keys():
             value = rawformdata.getlist(field)
@@ -504,7 +504,7 @@ class PrettyFormData(Respond):
             skicall.submit_dict['raw_data'] = ''
 
         try:
-            self._submit_data(ident_list, skicall)
+            yield from self._submit_data(ident_list, skicall)
         except FailPage as e:
             # raises a PageError exception
             self.raise_error_page(proj_ident, [e.errormessage], e.failpage)
@@ -539,7 +539,7 @@ class Accept(Respond):
 
 
 
-        # rawformdata is a FieldStorage object
+        # rawformdata is a formdata.FormData object
 
         received_data = {}
         for field in rawformdata.keys():
@@ -552,7 +552,7 @@ class Accept(Respond):
         skicall.submit_dict['received_data'] = received_data
 
         try:
-            self._submit_data(ident_list, skicall)
+            yield from self._submit_data(ident_list, skicall)
         except FailPage as e:
             # raises a PageError exception
             self.raise_error_page(proj_ident, [e.errormessage], e.failpage)
@@ -614,7 +614,7 @@ class AllowedAccept(Respond):
         skicall.submit_dict['received_data'] = received_data
 
         try:
-            self._submit_data(ident_list, skicall)
+            yield from self._submit_data(ident_list, skicall)
         except FailPage as e:
             # raises a PageError exception
             self.raise_error_page(proj_ident, [e.errormessage], e.failpage)
@@ -629,6 +629,9 @@ class PageData(Respond):
     # This indicates a target page ident is required
     target_ident_required = True
 
+    # This responder does not read the submitted form data
+    form_data_required = False
+
     # Options for the fields argument
     field_options = {'fields': True,                  # If False, no fields are expected
                      'widgfields':True,               # If True, fields are widgfields, if False, can be other constants
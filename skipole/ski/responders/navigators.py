@@ -107,6 +107,9 @@ to alternate_ident.
     # This indicates an alternate page ident is required
     alternate_ident_required = True
 
+    # This responder does not read the submitted form data
+    form_data_required = False
+
     # Options for the fields argument
     field_options = {'fields': True,                  # If False, no fields are expected
                      'widgfields':False,               # If True, fields are widgfields, if False, can be other constants
@@ -137,6 +140,9 @@ For a single given key in call data, if present, that key:value will be deleted
     target_ident_required = True
 
 
+    # This responder does not read the submitted form data
+    form_data_required = False
+
     # Options for the fields argument
     field_options = {'fields': True,                  # If False, no fields are expected
                      'widgfields':False,               # If True, fields are widgfields, if False, can be other constants
@@ -168,6 +174,9 @@ Adds a single given key and value in call data.
     target_ident_required = True
 
 
+    # This responder does not read the submitted form data
+    form_data_required = False
+
     # Options for the fields argument
     field_options = {'fields': True,                  # If False, no fields are expected
                      'widgfields':False,               # If True, fields are widgfields, if False, can be other constants
@@ -198,6 +207,9 @@ Goes to Target page, can be used as a temporary place holder
     # This indicates a target page ident is required
     target_ident_required = True
 
+    # This responder does not read the submitted form data
+    form_data_required = False
+
     # Options for the fields argument
     field_options = {'fields': False,                  # If False, no fields are expected
                      'widgfields':False,               # If True, fields are widgfields, if False, can be other constants
@@ -4,7 +4,7 @@
    The instance is callable, and the respondpage calls it
    to provide the page action"""
 
-import json, collections
+import json, collections, threading, asyncio, time
 
 from http import cookies
 from string import Template
@@ -49,7 +49,7 @@ If submit_data raises a FailPage then the fail_ident page will be called.
         self._check_allowed_callers(caller_page, ident_list, proj_ident)
 
         try:
-            self._submit_data(ident_list, skicall)
+            yield from self._submit_data(ident_list, skicall)
         except FailPage as e:
             # raises a PageError exception
             self.raise_error_page(proj_ident, [e.errormessage], e.failpage)
@@ -72,6 +72,9 @@ If submit_data raises a FailPage then the fail page will be called unchanged.
     # This indicates an optional submit_list and fail_ident is required
     submit_required = True
 
+    # This responder does not read the submitted form data
+    form_data_required = False
+
     # Options for the fields argument
     field_options = {'fields': False,                  # If False, no fields are expected
                      'widgfields':False,              # If True, fields are widgfields, if False, can be other constants
@@ -87,7 +90,7 @@ If submit_data raises a FailPage then the fail page will be called unchanged.
         """Calls submit_data"""
 
         try:
-            colours = self._submit_data(ident_list, skicall)
+            colours = yield from self._submit_data(ident_list, skicall)
         except FailPage as e:
             # return fail page unchanged, without an error
             if e.failpage:
@@ -138,7 +141,7 @@ class SetCookies(Respond):
 
         self._check_allowed_callers(caller_page, ident_list, proj_ident)
         try:
-            sendcookies = self._submit_data(ident_list, skicall)
+            sendcookies = yield from self._submit_data(ident_list, skicall)
         except FailPage as e:
             # raises a PageError exception
              self.raise_error_page(proj_ident, [e.errormessage], e.failpage)
@@ -212,7 +215,7 @@ The call to submit data will have the 'widgfield':widgfield tuple in the submit
         skicall.submit_dict['widgfield']=self.widgfield.to_tuple_no_i()
         try:
             # and send the widgfield to submit_data
-            defaultdict = self._submit_data( ident_list, skicall)
+            defaultdict = yield from self._submit_data( ident_list, skicall)
         except FailPage as e:
             # raises a PageError exception
             self.raise_error_page(proj_ident, [e.errormessage], e.failpage)
@@ -288,7 +291,7 @@ class FieldStoreSubmit(Respond):
         skicall.submit_dict['received'] = received
 
         try:
-            self._submit_data(ident_list, skicall)
+            yield from self._submit_data(ident_list, skicall)
         except FailPage as e:
             # raises a PageError exception
             self.raise_error_page(proj_ident, [e.errormessage], e.failpage)
@@ -371,6 +374,9 @@ Only page_data['status'] and page_data['headers'] will be used if given.
     # This indicates an optional submit_list and fail_ident is required
     submit_required = True
 
+    # This responder does not read the submitted form data
+    form_data_required = False
+
     # Options for the fields argument
     field_options = {'fields': False,                  # If False, no fields are expected
                      'widgfields':False,              # If True, fields are widgfields, if False, can be other constants
@@ -385,7 +391,7 @@ Only page_data['status'] and page_data['headers'] will be used if given.
         """Calls submit_data"""
 
         try:
-            jsondict = self._submit_data(ident_list, skicall)
+            jsondict = yield from self._submit_data(ident_list, skicall)
         except FailPage as e:
             # raises a PageError exception
             self.raise_error_page(proj_ident, [e.errormessage], e.failpage)
@@ -461,6 +467,9 @@ Only page_data['status'] and page_data['headers'] will be used if given
     # This indicates an optional submit_list and fail_ident is required
     submit_required = True
 
+    # This responder does not read the submitted form data
+    form_data_required = False
+
     # Options for the fields argument
     field_options = {'fields': False,                  # If False, no fields are expected
                      'widgfields':False,              # If True, fields are widgfields, if False, can be other constants
@@ -475,7 +484,7 @@ Only page_data['status'] and page_data['headers'] will be used if given
     def _respond(self, skicall, form_data, caller_page, ident_list, proj_ident, rawformdata):
         """Calls submit_data"""
         try:
-            text = self._submit_data(ident_list, skicall)
+            text = yield from self._submit_data(ident_list, skicall)
         except FailPage as e:
             # raises a PageError exception
             self.raise_error_page(proj_ident, [e.errormessage], e.failpage)
@@ -617,6 +626,9 @@ list of two element lists acting as css declaration blocks.
     # This indicates an optional submit_list and fail_ident is required
     submit_required = True
 
+    # This responder does not read the submitted form data
+    form_data_required = False
+
     # Options for the fields argument
     field_options = {'fields': False,                  # If False, no fields are expected
                      'widgfields':False,              # If True, fields are widgfields, if False, can be other constants
@@ -632,7 +644,7 @@ list of two element lists acting as css declaration blocks.
         """Calls submit_data"""
 
         try:
-            styledict = self._submit_data(ident_list, skicall)
+            styledict = yield from self._submit_data(ident_list, skicall)
         except FailPage as e:
             # raises a PageError exception
             self.raise_error_page(proj_ident, [e.errormessage], e.failpage)
@@ -648,6 +660,9 @@ Given media queries and CSS page targets, wraps the targets with the media queri
     # The form data can be submitted
     submit_option_available = True
 
+    # This responder does not read the submitted form data
+    form_data_required = False
+
     # Options for the fields argument
     field_options = {'fields': True,                  # If False, no fields are expected
                      'widgfields':False,               # If True, fields are widgfields, if False, can be other constants
@@ -668,7 +683,7 @@ Given media queries and CSS page targets, wraps the targets with the media queri
         if self.submit_option:
             try:
                 skicall.submit_dict['media_target'] = media_target.copy()
-                mediadict = self._submit_data(ident_list, skicall)
+                mediadict = yield from self._submit_data(ident_list, skicall)
                 if mediadict:
                     media_target.update(mediadict)
             except FailPage as e:
@@ -764,12 +779,16 @@ class _Iterator(object):
 
 class SubmitIterator(Respond):
     """
-submit_data should return a binary file iterator
+submit_data should return a binary file iterator, or an asynchronous iterator of binary strings,
+which under WSGI is run in its own event loop, and under ASGI is iterated in the application's event loop
 """
 
     # This indicates an optional submit_list and fail_ident is required
     submit_required = True
 
+    # This responder does not read the submitted form data
+    form_data_required = False
+
     # Options for the fields argument
     field_options = {'fields': False,                  # If False, no fields are expected
                      'widgfields':False,              # If True, fields are widgfields, if False, can be other constants
@@ -784,7 +803,7 @@ submit_data should return a binary file iterator
     def _respond(self, skicall, form_data, caller_page, ident_list, proj_ident, rawformdata):
         """Calls submit_data"""
         try:
-            biniterator = self._submit_data(ident_list, skicall)
+            biniterator = yield from self._submit_data(ident_list, skicall)
         except FailPage as e:
             # raises a PageError exception
             self.raise_error_page(proj_ident, [e.errormessage], e.failpage)
@@ -792,3 +811,262 @@ submit_data should return a binary file iterator
         return _Iterator(ident_list[-1], biniterator)
 
 
+class _EventStream(object):
+    """An object used by SubmitEventStream responder, its data is an iterator which keeps the
+       response open, and sends each update published to its channel as a server sent event"""
+
+    page_type = "SubmitEventStream"
+
+    # seconds between comments sent to keep the connection open, and to detect a closed connection
+    keepalive = 15
+
+    # milliseconds before the browser reconnects a closed stream
+    retry = 3000
+
+    # the maximum number of events waiting to be sent, if exceeded the client is not reading
+    # the stream, which is then closed, and the browser reconnects when it is able
+    max_pending = 64
+
+    # seconds after which the stream is closed, and the browser reconnects, so a stream whose
+    # client has gone without the server noticing is not held, None for no limit
+    max_lifetime = 300
+
+    def __init__(self, ident, project, channel, target):
+        self.project = project
+        self.channel = channel
+        # the ident of the JSON page which the published page_data is set into
+        self.target = target
+        self.status = '200 OK'
+        self.headers = [('content-type', 'text/event-stream'),
+                        ('cache-control','no-cache, no-store, must-revalidate'),
+                        ('X-Accel-Buffering', 'no')]
+        self.ident = ident
+        self.ident_data = None
+        # Set by end_call
+        self.session_cookie = ()
+        self.language_cookie = ()
+        # events waiting to be sent, each being the binary JSON data
+        self._events = collections.deque()
+        self._condition = threading.Condition()
+        self.closed = False
+        # when iterated by the ASGIApplication, the event loop and the asyncio.Event which wakes the stream
+        self._loop = None
+        self._wakeup = None
+        # True while iterated by a WSGI server, and so holding a server thread
+        self.wsgi = False
+
+    def import_sections(self, page_data):
+        "Only used by Template and SVG, everything else just returns"
+        return
+
+    def show_error(self, error_messages=[]):
+        return
+
+    def set_values(self, page_data):
+        """Checks for header and status values, any other page_data is set into the target JSON page
+           and sent as the first event"""
+        if not page_data:
+            return
+        if ('status' in page_data) and page_data['status']:
+            self.status = page_data['status']
+        if ('headers' in page_data) and page_data['headers']:
+            self.headers = page_data['headers']
+        pagedict = { key:val for key,val in page_data.items() if key not in ('status', 'headers') }
+        if pagedict:
+            data = self.project.event_data(self.target, pagedict)
+            if data is not None:
+                self._events.append(data)
+
+    def get_status(self):
+        "Returns (status, headers)"
+        return self.status, self.headers
+
+    def update(self, environ, call_data, lang, ident_list=[]):
+        if self.session_cookie:
+            self.headers.append(self.session_cookie)
+        if self.language_cookie:
+            self.headers.append(self.language_cookie)
+
+    def send(self, data):
+        "Adds data to the events waiting to be sent, returns False if the stream is closed"
+        with self._condition:
+            if self.closed:
+                return False
+            if len(self._events) >= self.max_pending:
+                self.closed = True
+                self._condition.notify()
+                return False
+            self._events.append(data)
+            self._condition.notify()
+        self._wake()
+        return True
+
+    def close(self):
+        "Ends the stream, once any waiting events are sent"
+        with self._condition:
+            self.closed = True
+            self._condition.notify()
+        self._wake()
+
+    def _wake(self):
+        "Wakes the asynchronous stream, send and close may be called from any thread"
+        if self._loop is not None:
+            try:
+                self._loop.call_soon_threadsafe(self._wakeup.set)
+            except RuntimeError:
+                # the loop is closed
+                pass
+
+    def data(self):
+        return _StreamData(self)
+
+    def _take(self, deadline):
+        "Returns the list of waiting events, and the closed flag, which is set once the deadline has passed"
+        with self._condition:
+            if (deadline is not None) and (time.monotonic() >= deadline):
+                self.closed = True
+            events = list(self._events)
+            self._events.clear()
+            return events, self.closed
+
+    def _wait_time(self, deadline):
+        "Returns the seconds to wait for an event, being the keepalive time, or less if the deadline is sooner"
+        if deadline is None:
+            return self.keepalive
+        return max(min(self.keepalive, deadline - time.monotonic()), 0)
+
+    def _deadline(self):
+        "Returns the time.monotonic() value when the stream is closed, or None if it has no maximum lifetime"
+        if self.max_lifetime is None:
+            return
+        return time.monotonic() + self.max_lifetime
+
+    def _stream(self):
+        "A generator, registered with the project while the response is being sent"
+        deadline = self._deadline()
+        self.wsgi = True
+        self.project.add_stream(self)
+        try:
+            yield ("retry: %s\n\n" % (self.retry,)).encode('UTF-8')
+            while True:
+                with self._condition:
+                    if (not self._events) and (not self.closed):
+                        self._condition.wait(self._wait_time(deadline))
+                events, closed = self._take(deadline)
+                if events:
+                    yield b"".join(b"data: " + data + b"\n\n" for data in events)
+                elif closed:
+                    return
+                else:
+                    yield b": keepalive\n\n"
+        finally:
+            # on the connection closing, the server closes this generator
+            self.project.remove_stream(self)
+            self.wsgi = False
+
+    async def _astream(self):
+        "An asynchronous generator, as _stream, which waits in the event loop rather than in a thread"
+        deadline = self._deadline()
+        self._wakeup = asyncio.Event()
+        self._loop = asyncio.get_running_loop()
+        self.project.add_stream(self)
+        try:
+            yield ("retry: %s\n\n" % (self.retry,)).encode('UTF-8')
+            while True:
+                # cleared before taking the events, so an event sent afterwards sets it again
+                self._wakeup.clear()
+                events, closed = self._take(deadline)
+                if events:
+                    yield b"".join(b"data: " + data + b"\n\n" for data in events)
+                elif closed:
+                    return
+                else:
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), self._wait_time(deadline))
+                    except asyncio.TimeoutError:
+                        yield b": keepalive\n\n"
+        finally:
+            self.project.remove_stream(self)
+            self._loop = None
+
+
+class _StreamData(object):
+    "The data of an _EventStream, iterated by a WSGI server, or asynchronously by the ASGIApplication"
+
+    def __init__(self, stream):
+        self.stream = stream
+        self._iterator = None
+
+    def __iter__(self):
+        self._iterator = self.stream._stream()
+        return self._iterator
+
+    def __aiter__(self):
+        self._iterator = self.stream._astream()
+        return self._iterator
+
+    def close(self):
+        "Called by the WSGI server as the connection closes"
+        if hasattr(self._iterator, 'close'):
+            self._iterator.close()
+
+
+class SubmitEventStream(Respond):
+    """
+Keeps the response open as a stream of server sent events, and sends widget updates to the client
+whenever your code calls the publish(channel, page_data) method of the application.
+The target page should be a JSON page, each update being the page_data set into this page.
+submit_data should return the channel, a string or other hashable value, any page_data it sets is
+sent as the first event. If the client does not accept an event stream, the target JSON page is
+returned, so the same responder can be called at intervals by browsers without EventSource.
+submit_dict['event_stream'] is True if a stream is being opened, False if the JSON page is to be returned.
+Set page_data['EventTarget'] in a template page to the label or ident of this responder.
+Each stream is closed after five minutes, and the browser then reconnects.
+Under WSGI each open stream holds a server thread, so at most max_wsgi_streams streams are held open,
+further browsers being returned the JSON page, serve the project with the ASGIApplication to hold
+streams in the event loop without this limit.
+"""
+
+    # This indicates a target page ident is required
+    target_ident_required = True
+
+    # This indicates an optional submit_list and fail_ident is required
+    submit_required = True
+
+    # This responder does not read the submitted form data
+    form_data_required = False
+
+    # Options for the fields argument
+    field_options = {'fields': False,                  # If False, no fields are expected
+                     'widgfields':False,              # If True, fields are widgfields, if False, can be other constants
+                     'widgfield_values':False,        # If True the field values are widgfields
+                     'fields_optional': False,         # if fields is True, then False here means fields must be supplied
+                     'field_values':False,            # if True, field values are used
+                     'field_keys': False,             # if field_values is True, and this field_keys is True, the values supplied are dictionary keys
+                     'empty_values_allowed':True,     # If True, '' is a valid value, if False, some data must be provided
+                     'single_field': False}           # Multiple fields accepted
+
+
+    def _respond(self, skicall, form_data, caller_page, ident_list, proj_ident, rawformdata):
+        """Calls submit_data, and returns an _EventStream instance, or the target page"""
+        event_stream = 'text/event-stream' in skicall.environ.get('HTTP_ACCEPT', '')
+        project = skiboot.getproject(ident_list[-1].proj)
+        if event_stream and ('asgi.scope' not in skicall.environ) and (project.wsgi_streams() >= project.max_wsgi_streams):
+            # under WSGI each stream holds a server thread, so the stream is refused, and the
+            # target page returned, which the browser then calls at intervals
+            event_stream = False
+        skicall.submit_dict['event_stream'] = event_stream
+        try:
+            channel = yield from self._submit_data(ident_list, skicall)
+        except FailPage as e:
+            # raises a PageError exception
+            self.raise_error_page(proj_ident, [e.errormessage], e.failpage)
+        target = self.get_target_page(proj_ident)
+        if not event_stream:
+            return target
+        if target.page_type != 'JSON':
+            raise ServerError(message="The target of a SubmitEventStream responder must be a JSON page")
+        if channel is None:
+            raise ServerError(message="submit_data called by a SubmitEventStream responder must return a channel")
+        # so all ok, return an _EventStream instance
+        return _EventStream(ident_list[-1], project, channel, target.ident)
@@ -5,14 +5,17 @@ This module defines a number of functions and classes used throughout
 the program.
 """
 
-import os, copy, collections
+import os, copy, collections, types, threading, inspect, asyncio
 
 # Configuration defaults
 
 _CFG = {
 "version"         : "5.6.2",             # The skipole version
 "default_language": 'en',                # The default language of the project
-"debug"           : False                # The debug mode, True shows exceptions on server error
+"debug"           : False,               # The debug mode, True shows exceptions on server error
+"snapshot"        : False,               # If True, projects are loaded from, and saved to, project.snapshot
+"snapshot_secret" : None,                # The key with which snapshots are signed, bytes
+"lazy_load"       : False                # If True, template and SVG pages are only created when first accessed
 }
 
 # As projects are created they are added to this PROJECT_REGISTER list, but as projects
@@ -34,10 +37,14 @@ Info = collections.namedtuple('Info', ['project', 'project_version', 'ident', 'i
 PAGE_VARIABLES = [ 'add_jscript', 'backcol', 'body_class', 'headers', 'ident_data', 'lang', 'last_scroll', 'set_cookie', 'localStorage',
                    'sessionStorage', 'show_backcol', 'show_error', 'status', 'filepath', 'mimetype', 'enable_cache', 'height', 'width',
                    'cssimport', 'colour_substitution', 'ClearAllErrors', 'interval', 'IntervalTarget', 'JSONtoHTML', 'CatchToHTML', 'throw',
-                   'content_length']
+                   'content_length', 'EventTarget']
 
 SECTION_VARIABLES = ['hide', 'multiplier', 'multiplier_tag', 'section_class',  'show']
 
+# The routing table of resolved labels, idents and urls is held by the root project, for itself and
+# its sub projects, see SkipoleProject.route, and is cleared by clear_routes whenever special pages,
+# folders or pages change, which is done by SkipoleProject.clear_cache() and reload()
+
 
 def add_to_project_register(project):
     "Adds the project to a list of root projects"
@@ -53,6 +60,82 @@ def del_from_project_register():
     PROJECT_REGISTER = new_list
 
 
+def clear_routes():
+    "Clears the routing table of resolved labels, idents and urls"
+    for project in PROJECT_REGISTER:
+        project.clear_routes()
+
+
+# holds the event loop of each thread serving WSGI calls
+_ASYNC = threading.local()
+
+
+def event_loop():
+    "Returns the event loop of this thread, created when first required, in which WSGI calls run the user coroutines"
+    loop = getattr(_ASYNC, 'loop', None)
+    if loop is None:
+        loop = asyncio.new_event_loop()
+        _ASYNC.loop = loop
+    return loop
+
+
+def awaited(result):
+    """Used with yield from in the generators which build a response, if result is awaitable, as returned by an async def
+       user function, it is yielded to the function running the generator, which awaits it and sends back its result,
+       or throws in its exception. Otherwise result is returned"""
+    if inspect.isawaitable(result):
+        result = yield result
+    return result
+
+
+def run(steps):
+    """Runs the generator steps, which builds a response, and returns its result. Any awaitables it yields
+       are run in the event loop of this thread, used by WSGI calls, as an ASGIApplication awaits them in its own loop"""
+    method, value = steps.send, None
+    while True:
+        try:
+            awaitable = method(value)
+        except StopIteration as e:
+            return e.value
+        try:
+            value = event_loop().run_until_complete(awaitable)
+            method = steps.send
+        except Exception as e:
+            method, value = steps.throw, e
+
+
+def sync_iterator(aiterator):
+    """A generator giving the items of an asynchronous iterator, used when an async iterator is to be sent
+       by a WSGI server, the iterator is run in the event loop of the thread sending it"""
+    iterator = aiterator.__aiter__()
+    loop = event_loop()
+    try:
+        while True:
+            try:
+                yield loop.run_until_complete(iterator.__anext__())
+            except StopAsyncIteration:
+                return
+    finally:
+        if hasattr(iterator, 'aclose'):
+            loop.run_until_complete(iterator.aclose())
+
+
+def route(key, resolve, *args):
+    """Returns the value held in the routing table of the root project under key, if not present, calls resolve(*args)
+       and holds the result in the table. key must be hashable, and not clash with the keys of find_ident_or_url
+       or Ident.url. If there is not a single root project, the result is not held"""
+    if len(PROJECT_REGISTER) != 1:
+        return resolve(*args)
+    return PROJECT_REGISTER[0].route(key, resolve, *args)
+
+
+def reserve_routes():
+    """Enlarges the routing table of the root project so the routes it now holds are not removed, called when a
+       project is frozen with its routes resolved"""
+    if len(PROJECT_REGISTER) == 1:
+        PROJECT_REGISTER[0].reserve_routes()
+
+
 def root_project():
     "Return the root project"
     global PROJECT_REGISTER
@@ -103,6 +186,33 @@ def set_debug(mode):
     global _CFG
     _CFG["debug"] = bool(mode)
 
+def get_snapshot():
+    "Returns the snapshot mode"
+    return _CFG["snapshot"]
+
+def get_snapshot_secret():
+    "Returns the key with which snapshots are signed"
+    return _CFG["snapshot_secret"]
+
+def set_snapshot(mode, secret=None):
+    "Sets snapshot mode, and the secret key, a string or bytes, with which snapshots are signed, required if mode is True"
+    global _CFG
+    if mode and (not secret):
+        raise ValueError("A secret is required to sign project snapshots")
+    if isinstance(secret, str):
+        secret = secret.encode('utf-8')
+    _CFG["snapshot"] = bool(mode)
+    _CFG["snapshot_secret"] = secret if mode else None
+
+def get_lazy_load():
+    "Returns the lazy load mode"
+    return _CFG["lazy_load"]
+
+def set_lazy_load(mode):
+    "Sets lazy load mode"
+    global _CFG
+    _CFG["lazy_load"] = bool(mode)
+
 
 def getproject(proj_ident):
     """Returns the project given by the proj_ident
@@ -176,6 +286,62 @@ def from_ident(ident, proj_ident=None):
     return copy.deepcopy(item)
 
 
+# These types are never altered in place, so are shared rather than copied by request_copy
+_SHARED_TYPES = {str, int, float, bool, bytes, type(None), type, types.FunctionType, types.BuiltinFunctionType, types.MethodType, types.ModuleType}
+
+
+def request_copy(item):
+    """Returns a copy of a loaded page for use during a single call.
+
+       The loaded page is never altered. The copy shares with it every value which is
+       not changed while a page is built - strings, numbers, idents, widgfields and any
+       object whose class sets shared_in_request to True, such as validators - and
+       creates new containers and objects only for the parts, attributes and fields
+       which a call may alter."""
+    return _request_copy(item, {})
+
+
+def _request_copy(item, memo):
+    "Copies item, memo is a dictionary of id(original):copy which keeps shared references intact"
+    cls = item.__class__
+    if cls in _SHARED_TYPES:
+        return item
+    item_id = id(item)
+    if item_id in memo:
+        return memo[item_id]
+    if (cls is Ident) or (cls is WidgField):
+        return item
+    if (cls is list):
+        newitem = []
+        memo[item_id] = newitem
+        for value in item:
+            newitem.append(_request_copy(value, memo))
+        return newitem
+    if (cls is dict) or (cls is collections.OrderedDict):
+        newitem = cls()
+        memo[item_id] = newitem
+        for key, value in item.items():
+            newitem[key] = _request_copy(value, memo)
+        return newitem
+    if getattr(cls, 'shared_in_request', False):
+        memo[item_id] = item
+        return item
+    if (cls is tuple):
+        newitem = tuple(_request_copy(value, memo) for value in item)
+        memo[item_id] = newitem
+        return newitem
+    if (cls.__new__ is object.__new__) and (cls.__reduce_ex__ is object.__reduce_ex__) and hasattr(item, '__dict__'):
+        # a plain instance, create a new instance and copy its attributes
+        newitem = cls.__new__(cls)
+        memo[item_id] = newitem
+        newdict = newitem.__dict__
+        for key, value in item.__dict__.items():
+            newdict[key] = _request_copy(value, memo)
+        return newitem
+    # anything else is deep copied
+    return copy.deepcopy(item, memo)
+
+
 def item_info(ident):
     """Returns a namedtuple of item information
           None if not found, tuple has contents:
@@ -246,7 +412,7 @@ def ident_exists(ident, proj_ident=None):
     project = getproject(ident.proj)
     if project is None:
         return False
-    return ident.num in project.ident_numbers
+    return project.has_ident_num(ident.num)
 
 
 def ident_exists_strict(ident):
@@ -256,13 +422,34 @@ def ident_exists_strict(ident):
     project = getproject(ident.proj)
     if project is None:
         return
-    if ident.num in project.ident_numbers:
+    if project.has_ident_num(ident.num):
         return ident
 
 
 # usefull functions
 
 
+def accepted_encodings(environ):
+    "Returns a list of content encodings, in lower case, which the client accepts from the Accept-Encoding header"
+    accept = environ.get('HTTP_ACCEPT_ENCODING', '')
+    if not accept:
+        return []
+    accepted = []
+    for item in accept.split(','):
+        encoding, sep, params = item.partition(';')
+        params = params.replace(' ', '')
+        if params.startswith('q='):
+            try:
+                if not float(params[2:]):
+                    # q=0 means not acceptable
+                    continue
+            except ValueError:
+                continue
+        accepted.append(encoding.strip().lower())
+    return accepted
+
+
+
 def mergedict(dict1, dict2):
     "returns a dictionary, which is the update of two dictionaries"
     newdict = dict1.copy()
@@ -339,7 +526,29 @@ def find_ident_or_url(item, proj_ident=None):
        existing in the project, item could have an ident attribute,
        or be an ident in string or integer or Ident form
        or label, or tuple of form (project,ident) or (project,label).
-       If no existing ident or url found, returns None"""
+       If no existing ident or url found, returns None.
+       Results for strings, integers, Idents and tuples of strings and integers are held in the
+       routing table, so each is only resolved once"""
+    if _routable(item):
+        return route((type(item), item, proj_ident), _find_ident_or_url, item, proj_ident)
+    return _find_ident_or_url(item, proj_ident)
+
+
+def _routable(item):
+    "Returns True if item is a string, integer, Ident, or a tuple of strings and integers"
+    cls = type(item)
+    if (cls is str) or (cls is int) or (cls is Ident):
+        return True
+    if cls is tuple:
+        for value in item:
+            if (type(value) is not str) and (type(value) is not int):
+                return False
+        return True
+    return False
+
+
+def _find_ident_or_url(item, proj_ident=None):
+    "Resolves the item for find_ident_or_url"
 
     if item == 0:
         return ident_exists_strict(Ident.to_ident(item, proj_ident))
@@ -368,7 +577,7 @@ def find_ident_or_url(item, proj_ident=None):
             if item_parts[1].isdigit():
                 return ident_exists_strict(Ident.to_ident(item, proj_ident))
             # may be 'project,label' - so find [project,label]
-            return find_ident_or_url(item_parts, proj_ident=proj_ident)
+            return _find_ident_or_url(item_parts, proj_ident=proj_ident)
         # could be case of 'project_number'
         if '_' in item:
             item_parts = item.split('_')
@@ -392,7 +601,7 @@ def find_ident_or_url(item, proj_ident=None):
         if ',' in target:
             # so item is a label pointing to project,newitem
             target_parts = target.split(',')
-            return find_ident_or_url(target_parts[1], proj_ident=target_parts[0])
+            return _find_ident_or_url(target_parts[1], proj_ident=target_parts[0])
 
     if not ( (isinstance(item, tuple)) or (isinstance(item, list)) ):
         # not a tuple or a list, so maybe integer - try to convert to ident
@@ -411,7 +620,7 @@ def find_ident_or_url(item, proj_ident=None):
     if project is None:
         return
 
-    return find_ident_or_url(item[1], proj_ident=proj)
+    return _find_ident_or_url(item[1], proj_ident=proj)
 
 
 
@@ -471,7 +680,7 @@ class Ident(collections.namedtuple('Ident', ['proj','num'])):
 
     def item(self):
         """Return page or folder with this ident.
-           If folder or respond page return the item, any other page, return a deep copy
+           If folder or respond page return the item, any other page, return a request copy
            If not found, return None."""
         project = getproject(self.proj)
         if project is None:
@@ -494,7 +703,11 @@ class Ident(collections.namedtuple('Ident', ['proj','num'])):
         return item.name
 
     def url(self):
-        "Returns the url of the page or folder with this ident"
+        "Returns the url of the page or folder with this ident, held in the routing table"
+        return route(('url', self), self._url)
+
+    def _url(self):
+        "Finds the url for the url method"
         item = get_item(self)
         if item is None:
             return
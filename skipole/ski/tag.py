@@ -145,6 +145,10 @@ class ParentPart(object):
         # parts contains a list of sub parts, always empty for a closedpart
         self.parts = []
 
+        # If this part can never change during a call, this is set to its encoded html
+        # by the compile method, otherwise it is None
+        self._compiled = None
+
     def set_idents(self, ident_string, widgets, section_places, embedded=('','',None)):
         """Sets self.ident_string in this and sub parts, called when a page is saved,
              embedded is (section_name, parent_widget_name, parent_widget_container)"""
@@ -328,6 +332,13 @@ class ParentPart(object):
                 str_attribs += " {att!s}=\"\"".format(att=att)
         return str_attribs
 
+    def _static_attribs(self):
+        "Returns False if any attribute is a {label} which is expanded to a url on each call"
+        for val in self.attribs.values():
+            if val and (str(val)[0] == '{'):
+                return False
+        return True
+
     def _expand_label(self, valstring):
         "If valstring starts with a  label in the form {label}, substitute url here"
         if valstring[0] != '{':
@@ -663,6 +674,15 @@ class Part(ParentPart):
                 content.append("\n")
         if (not content) and self.hide_if_empty:
             return []
+        start_tag, end_tag = self._start_end_tags()
+        partbytes = [start_tag]
+        partbytes.extend(content)
+        partbytes.append(end_tag)
+        return partbytes
+
+
+    def _start_end_tags(self):
+        "Returns the start and end tag strings"
         # this creates some new lines around head and body tags
         if self.tag_name == "head":
             start_tag = "<{tag_name}{str_attribs}>\n".format(tag_name=self.tag_name, str_attribs=self.attributes_string)
@@ -673,9 +693,73 @@ class Part(ParentPart):
         else:
             start_tag = "<{tag_name}{str_attribs}>".format(tag_name=self.tag_name, str_attribs=self.attributes_string)
             end_tag = "</{tag_name}>".format(tag_name=self.tag_name)
-        partbytes = [start_tag]
+        return start_tag, end_tag
+
+
+    def compile(self):
+        """Called when a page is loaded or saved. If this part and all its contents cannot change
+           during a call, sets self._compiled to the encoded html, otherwise sets it to None.
+           Widgets, TextBlocks, section placeholders and attributes set with {label} values
+           can all change, and so are never compiled"""
+        self._compiled = None
+        if self.__class__ is not Part:
+            # widgets and sections build their own contents
+            return
+        static = (not self._error) and self._static_attribs()
+        for part in self.parts:
+            if isinstance(part, str) or isinstance(part, HTMLSymbol) or isinstance(part, Comment):
+                continue
+            if isinstance(part, ParentPart):
+                part.compile()
+                if part._compiled is None:
+                    static = False
+            else:
+                static = False
+        if static:
+            self._compiled = b''.join(d.encode('ascii', 'xmlcharrefreplace') for d in self.data())
+
+
+    def encoded_data(self):
+        """Returns the part as a list of binary strings, as data() but any compiled
+           parts are included as their compiled bytes rather than being rebuilt"""
+        if self._compiled is not None:
+            if self._compiled:
+                return [self._compiled]
+            return []
+        if self.__class__ is not Part:
+            # widgets and sections build their own contents, which are joined and encoded once
+            return [''.join(self.data()).encode('ascii', 'xmlcharrefreplace')]
+        if (not self.show) or self._error:
+            return [''.join(self.data()).encode('ascii', 'xmlcharrefreplace')]
+        content = []
+        for part in self.parts:
+            if isinstance(part, str):
+                if part:
+                    if (self.tag_name == 'script') or not self.htmlescaped:
+                        content.append(part.encode('ascii', 'xmlcharrefreplace'))
+                    elif (self.tag_name == 'pre') or (self.tag_name == 'textarea'):
+                        content.append(html.escape(part).encode('ascii', 'xmlcharrefreplace'))
+                    else:
+                        content.append(expand_text(part, linebreaks=self.linebreaks).encode('ascii', 'xmlcharrefreplace'))
+            elif isinstance(part, Part):
+                content.extend(part.encoded_data())
+            elif isinstance(part, ClosedPart) and (part._compiled is not None):
+                if part._compiled:
+                    content.append(part._compiled)
+            elif hasattr(part, 'data'):
+                content.append(''.join(part.data()).encode('ascii', 'xmlcharrefreplace'))
+            else:
+                str_part = str(part)
+                if str_part:
+                    content.append(str_part.encode('ascii', 'xmlcharrefreplace'))
+            if self.tag_name == "head":
+                content.append(b"\n")
+        if (not content) and self.hide_if_empty:
+            return []
+        start_tag, end_tag = self._start_end_tags()
+        partbytes = [start_tag.encode('ascii', 'xmlcharrefreplace')]
         partbytes.extend(content)
-        partbytes.append(end_tag)
+        partbytes.append(end_tag.encode('ascii', 'xmlcharrefreplace'))
         return partbytes
 
 
@@ -782,6 +866,15 @@ class ClosedPart(ParentPart):
         return [parttext]
 
 
+    def compile(self):
+        """Called when a page is loaded or saved. If this part cannot change during a call,
+           sets self._compiled to the encoded html, otherwise sets it to None"""
+        if (self.__class__ is ClosedPart) and (not self._error) and self._static_attribs():
+            self._compiled = b''.join(d.encode('ascii', 'xmlcharrefreplace') for d in self.data())
+        else:
+            self._compiled = None
+
+
     def outline(self, proj_ident):
         "Creates a list of ['ClosedPart', dictionary]"
         part_dict = OrderedDict()
@@ -917,17 +1010,31 @@ class SectionPlaceHolder(object):
         self.multiplier=mult
 
 
-    def get_section(self):
+    def _project(self):
+        "Returns the project holding this placeholder"
         if not self.ident_string:
             return
         proj_ident = self.ident_string.split('_')[0]
-        proj = skiboot.getproject(proj_ident)
+        return skiboot.getproject(proj_ident)
+
+    def get_section(self):
+        "Returns a deep copy of the section, or None if not found"
+        proj = self._project()
         if proj is None:
             return
-        if self.section_name not in proj.list_section_names():
-            return
         return proj.section(self.section_name)
 
+    def get_widget(self, widgetname):
+        """Returns the named widget of the section without copying the section, or None if not found.
+           The widget is held by the project, and is only to be read, such as for its fields and validators"""
+        proj = self._project()
+        if proj is None:
+            return
+        widgets = proj.section_widgets(self.section_name)
+        if widgets is None:
+            return
+        return widgets.get(widgetname)
+
     @property
     def pagepart(self):
         """pagepart is typically head, body or svg.
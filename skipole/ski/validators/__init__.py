@@ -17,6 +17,10 @@ class Validator(object):
     # and the value is the default if the argument is not given
     arg_descriptions = {}
 
+    # validators are not altered while a page is built, so copies of a page made for
+    # each call share its validators, see skiboot.request_copy
+    shared_in_request = True
+
     @classmethod
     def args_exist(cls):
         return bool(cls.arg_descriptions)
@@ -38,7 +38,8 @@ class SubmitUploadFile1(Widget):
         filebutton_label: The text displayed to the left of the file button
         filebuttonlabel_class: The css class of the label
         filebutton_class: The css class of the file browse button
-        action: The ident or label to send this file to, name of this field is used as widgfield fieldname
+        action: The ident or label to send this file to, name of this field is used as widgfield fieldname,
+                the received value is the file contents as bytes, skicall.uploaded_file gives it as a stream
         submitbutton_text: The text on the button
         submitbutton_label: The text displayed to the left of the submit button
         submitbuttonlabel_class: The css class of the label
@@ -275,7 +276,8 @@ class SubmitUploadFile2(Widget):
         filebutton_label: The text displayed to the left of the file button
         filebuttonlabel_class: The css class of the label
         filebutton_class: The css class of the file browse button
-        action: The ident or label to send this file to, name of this field is used as widgfield fieldname for file contents
+        action: The ident or label to send this file to, name of this field is used as widgfield fieldname for file contents,
+                the received value is the file contents as bytes, skicall.uploaded_file gives it as a stream
         submitbutton: Sets the text on the button. The name of this field is used as the widgfield fieldname for the filename
         submitbutton_label: The text displayed to the left of the submit button
         submitbuttonlabel_class: The css class of the label
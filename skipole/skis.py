@@ -35,12 +35,16 @@ def end_call(page_ident, page_type, skicall):
 # As this project is not intended to run as a stand-alone service, a function
 # is provided rather than an application object being immediately created.
 
-def makeapp():
-    """This function returns the skis application."""
+def makeapp(preload=False):
+    """This function returns the skis application. If preload is True, the javascript
+       and css files are read into memory and served from there."""
 
     # The WSGIApplication created here is generally given a URL of "/lib"
     # when added to the root project using application.add_project
 
-    return WSGIApplication('skis', PROJECTFILES, {}, start_call, submit_data, end_call)
+    skis_application = WSGIApplication('skis', PROJECTFILES, {}, start_call, submit_data, end_call)
+    if preload:
+        skis_application.preload_files()
+    return skis_application
 
 
@@ -47,6 +47,51 @@ SKIPOLE.refreshjson = function( target ) {
     };
 
 
+SKIPOLE.startrefresh = function() {
+    /* called when the page is loaded, opens an event stream to SKIPOLE.EventTarget if given and
+       supported by the browser, otherwise calls SKIPOLE.IntervalTarget every SKIPOLE.interval seconds */
+    SKIPOLE.stoprefresh();
+    if (SKIPOLE.EventTarget && (typeof(EventSource) !== "undefined")) {
+        SKIPOLE.eventsource = new EventSource(SKIPOLE.EventTarget + "?ident=" + SKIPOLE.identdata);
+        SKIPOLE.eventsource.onmessage = function(event) {
+            SKIPOLE.setfields(JSON.parse(event.data));
+            };
+        SKIPOLE.eventsource.onerror = function() {
+            // the browser reconnects a dropped stream by itself, but if the stream
+            // has been refused, fall back to calls at intervals
+            if (SKIPOLE.eventsource && (SKIPOLE.eventsource.readyState === EventSource.CLOSED)) {
+                SKIPOLE.eventsource = null;
+                SKIPOLE.startpolling();
+                }
+            };
+        return;
+        }
+    SKIPOLE.startpolling();
+    };
+
+
+SKIPOLE.startpolling = function() {
+    /* calls the IntervalTarget, or if not given the EventTarget, every SKIPOLE.interval seconds */
+    let target = SKIPOLE.IntervalTarget || SKIPOLE.EventTarget;
+    if (SKIPOLE.interval && target) {
+        SKIPOLE.interval_id = setInterval(SKIPOLE.refreshjson, SKIPOLE.interval*1000, target);
+        }
+    };
+
+
+SKIPOLE.stoprefresh = function() {
+    /* closes any event stream, and stops any interval calls */
+    if (SKIPOLE.interval_id) {
+        clearInterval(SKIPOLE.interval_id);
+        SKIPOLE.interval_id=null;
+        }
+    if (SKIPOLE.eventsource) {
+        SKIPOLE.eventsource.close();
+        SKIPOLE.eventsource = null;
+        }
+    };
+
+
 SKIPOLE.inallowedlist =  function (item, allowed_values) {
     /* Fail if no allowed values given, otherwise item must be in allowed values */
     if (allowed_values.length === 0) {
@@ -105,26 +150,26 @@ SKIPOLE.setfields = function(result) {
            }
        if ("IntervalTarget" in result) {
            // Set the SKIPOLE.IntervalTarget variable to the given URL
-           if (SKIPOLE.interval_id) {
-               clearInterval(SKIPOLE.interval_id);
-               SKIPOLE.interval_id=null;
-               }
            SKIPOLE.IntervalTarget = result["IntervalTarget"];
-           if(SKIPOLE.interval && SKIPOLE.IntervalTarget) {
-              SKIPOLE.interval_id = setInterval(SKIPOLE.refreshjson, SKIPOLE.interval*1000, SKIPOLE.IntervalTarget);
+           if (!SKIPOLE.eventsource) {
+              // updates are not being received from an event stream, so restart the interval calls
+              SKIPOLE.stoprefresh();
+              SKIPOLE.startpolling();
               }
            }
        if ("interval" in result) {
            // Set the SKIPOLE.interval variable
-           if (SKIPOLE.interval_id) {
-               clearInterval(SKIPOLE.interval_id);
-               SKIPOLE.interval_id=null;
-               }
            SKIPOLE.interval = result["interval"];
-           if(SKIPOLE.interval && SKIPOLE.IntervalTarget) {
-              SKIPOLE.interval_id = setInterval(SKIPOLE.refreshjson, SKIPOLE.interval*1000, SKIPOLE.IntervalTarget);
+           if (!SKIPOLE.eventsource) {
+              SKIPOLE.stoprefresh();
+              SKIPOLE.startpolling();
               }
            }
+       if ("EventTarget" in result) {
+           // Set the SKIPOLE.EventTarget variable to the given URL, and open a stream to it
+           SKIPOLE.EventTarget = result["EventTarget"];
+           SKIPOLE.startrefresh();
+           }
        if ("sessionStorage" in result) {
            // set the session storage data
             if (typeof(Storage) !== "undefined") {
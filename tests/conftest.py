@@ -0,0 +1,16 @@
+"""
+Fixtures shared by the tests
+"""
+
+import pytest
+
+from skipole.ski import skiboot
+
+
+@pytest.fixture(autouse=True)
+def project_register():
+    "Each test starts with an empty register of root projects, as a process serves a single root project"
+    register = skiboot.PROJECT_REGISTER
+    skiboot.PROJECT_REGISTER = []
+    yield
+    skiboot.PROJECT_REGISTER = register
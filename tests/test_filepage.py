@@ -0,0 +1,139 @@
+"""
+Tests of FilePages served from files preloaded into memory, with ETag and Range requests,
+using the skis project which serves the skipole javascript and css files
+"""
+
+import io, os
+
+import pytest
+
+from skipole import skis
+
+
+W3CSS = os.path.join(skis.PROJECTFILES, 'skis', 'static', 'css', 'w3.css')
+
+
+@pytest.fixture
+def app():
+    return skis.makeapp(preload=True)
+
+
+def call(app, path='/css/w3.css', **headers):
+    "Calls the application, and returns (status, headers dictionary with lower case keys, body)"
+    environ = {'REQUEST_METHOD':'GET',
+               'PATH_INFO':path,
+               'QUERY_STRING':'',
+               'SERVER_NAME':'localhost',
+               'SERVER_PORT':'80',
+               'HTTP_HOST':'localhost',
+               'wsgi.url_scheme':'http',
+               'wsgi.input':io.BytesIO(b'')}
+    environ.update(headers)
+    received = []
+    def start_response(status, headers, exc_info=None):
+        received.append((status, headers))
+    data = b''.join(app(environ, start_response))
+    status, headers = received[0]
+    return status, {key.lower():value for key, value in headers}, data
+
+
+def file_contents():
+    with open(W3CSS, 'rb') as fp:
+        return fp.read()
+
+
+def test_full_file(app):
+    "The whole file is served with an ETag, and ranges are accepted"
+    status, headers, data = call(app)
+    assert status == '200 OK'
+    assert data == file_contents()
+    assert headers['content-length'] == str(len(data))
+    assert headers['accept-ranges'] == 'bytes'
+    assert headers['etag'].startswith('"')
+
+
+def test_not_modified(app):
+    "A request with the ETag in If-None-Match receives 304 without a body"
+    etag = call(app)[1]['etag']
+    status, headers, data = call(app, HTTP_IF_NONE_MATCH=etag)
+    assert status == '304 Not Modified'
+    assert data == b''
+    assert headers['etag'] == etag
+    assert 'content-length' not in headers
+    status, headers, data = call(app, HTTP_IF_NONE_MATCH='"other", ' + etag)
+    assert status == '304 Not Modified'
+    status, headers, data = call(app, HTTP_IF_NONE_MATCH='*')
+    assert status == '304 Not Modified'
+
+
+def test_modified(app):
+    "A request with a different ETag receives the file"
+    status, headers, data = call(app, HTTP_IF_NONE_MATCH='"other"')
+    assert status == '200 OK'
+    assert data == file_contents()
+
+
+def test_range(app):
+    "A byte range is served as 206 Partial Content"
+    contents = file_contents()
+    status, headers, data = call(app, HTTP_RANGE='bytes=10-19')
+    assert status == '206 Partial Content'
+    assert data == contents[10:20]
+    assert headers['content-length'] == '10'
+    assert headers['content-range'] == 'bytes 10-19/%s' % (len(contents),)
+
+
+def test_suffix_range(app):
+    "A suffix range serves the end of the file"
+    contents = file_contents()
+    status, headers, data = call(app, HTTP_RANGE='bytes=-5')
+    assert status == '206 Partial Content'
+    assert data == contents[-5:]
+    assert headers['content-range'] == 'bytes %s-%s/%s' % (len(contents)-5, len(contents)-1, len(contents))
+
+
+def test_open_range(app):
+    "A range without an end is served to the end of the file"
+    contents = file_contents()
+    status, headers, data = call(app, HTTP_RANGE='bytes=%s-' % (len(contents)-100,))
+    assert status == '206 Partial Content'
+    assert data == contents[-100:]
+
+
+def test_unsatisfiable_range(app):
+    "A range starting beyond the end of the file receives 416"
+    contents = file_contents()
+    status, headers, data = call(app, HTTP_RANGE='bytes=%s-' % (len(contents)+10,))
+    assert status == '416 Range Not Satisfiable'
+    assert data == b''
+    assert headers['content-range'] == 'bytes */%s' % (len(contents),)
+
+
+def test_multiple_ranges(app):
+    "Multiple ranges are not served as multipart, the whole file is sent"
+    status, headers, data = call(app, HTTP_RANGE='bytes=0-1,5-6')
+    assert status == '200 OK'
+    assert data == file_contents()
+
+
+def test_if_range(app):
+    "A range is served if If-Range matches the ETag, otherwise the whole file is sent"
+    etag = call(app)[1]['etag']
+    status, headers, data = call(app, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=etag)
+    assert status == '206 Partial Content'
+    assert len(data) == 10
+    status, headers, data = call(app, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"other"')
+    assert status == '200 OK'
+    assert data == file_contents()
+
+
+def test_gzip_etag(app):
+    "The gzip variant has its own ETag, and receives 304 when it is given"
+    status, headers, data = call(app, HTTP_ACCEPT_ENCODING='gzip')
+    assert status == '200 OK'
+    assert headers['content-encoding'] == 'gzip'
+    assert headers['vary'] == 'Accept-Encoding'
+    etag = headers['etag']
+    assert etag != call(app)[1]['etag']
+    status, headers, data = call(app, HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=etag)
+    assert status == '304 Not Modified'
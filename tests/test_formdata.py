@@ -0,0 +1,205 @@
+"""
+Tests of skipole.ski.formdata.FormData, which reads form data in place of cgi.FieldStorage
+"""
+
+import io, warnings
+
+import pytest
+
+from skipole import ValidateError
+from skipole.ski.formdata import FormData
+
+
+class DribbleInput(object):
+    "A wsgi.input which returns at most size bytes at a time, as a slow client would send them"
+
+    def __init__(self, body, size=7):
+        self._body = io.BytesIO(body)
+        self._size = size
+
+    def read(self, size=-1):
+        if size < 0:
+            size = self._size
+        return self._body.read(min(size, self._size))
+
+
+def make_environ(body=b'', content_type='application/x-www-form-urlencoded', method='POST', query='', wsgi_input=None):
+    "Returns a WSGI environ of a call submitting body"
+    return {'REQUEST_METHOD':method,
+            'QUERY_STRING':query,
+            'CONTENT_TYPE':content_type,
+            'CONTENT_LENGTH':str(len(body)),
+            'wsgi.input':wsgi_input if wsgi_input is not None else io.BytesIO(body)}
+
+
+def multipart(parts, boundary='----skipoleboundary'):
+    """Returns (body, content_type) of a multipart body, parts is a list of (name, value, filename, content type)
+       where filename and content type are None for a field which is not a file"""
+    body = b''
+    for name, value, filename, content_type in parts:
+        body += b'--' + boundary.encode() + b'\r\n'
+        disposition = 'Content-Disposition: form-data; name="%s"' % (name,)
+        if filename is not None:
+            disposition += '; filename="%s"' % (filename,)
+        body += disposition.encode('utf-8') + b'\r\n'
+        if content_type is not None:
+            body += b'Content-Type: ' + content_type.encode() + b'\r\n'
+        body += b'\r\n' + value + b'\r\n'
+    body += b'--' + boundary.encode() + b'--\r\n'
+    return body, 'multipart/form-data; boundary=%s' % (boundary,)
+
+
+def field_storage_values(environ):
+    "Returns {name:list of values} as read by cgi.FieldStorage, or skips the test if cgi is not available"
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", DeprecationWarning)
+        cgi = pytest.importorskip("cgi")
+    environ = dict(environ)
+    environ['wsgi.input'] = io.BytesIO(environ['wsgi.input'].getvalue())
+    form = cgi.FieldStorage(fp=environ['wsgi.input'], environ=environ)
+    return {key:form.getlist(key) for key in form.keys()}
+
+
+def test_urlencoded():
+    "Fields and repeated fields are read from an urlencoded body and the query string"
+    environ = make_environ(b'a=1&b=two+words&a=3&c=%C3%A9', query='ident=proj_5')
+    form = FormData(environ)
+    assert form.getvalue('a') == ['1', '3']
+    assert form.getvalue('b') == 'two words'
+    assert form.getvalue('c') == '\xe9'
+    assert form.getvalue('ident') == 'proj_5'
+    assert form.getlist('missing') == []
+    assert 'a' in form
+    assert len(form) == 4
+
+
+def test_urlencoded_blank_values_discarded():
+    "As with cgi.FieldStorage, blank values are not included"
+    environ = make_environ(b'a=&b=2')
+    form = FormData(environ)
+    assert form.keys() == ['b']
+    assert form.keys() == list(field_storage_values(environ))
+
+
+def test_query_value_does_not_read_body():
+    "query_value reads the query string, leaving the body unread"
+    environ = make_environ(b'a=1', query='ident=proj_5_data')
+    form = FormData(environ)
+    assert form.query_value('ident') == 'proj_5_data'
+    assert form.query_value('a') is None
+    assert environ['wsgi.input'].tell() == 0
+    assert form.getvalue('a') == '1'
+
+
+def test_get_has_no_body():
+    "The body of a GET request is not read"
+    environ = make_environ(b'a=1', method='GET', query='b=2')
+    form = FormData(environ)
+    assert not form.has_body
+    assert form.keys() == ['b']
+
+
+def test_multipart_fields_and_file():
+    "Fields and an uploaded file are read from a multipart body, the file value being bytes"
+    filedata = b'line one\r\n--not a boundary\r\nline \xff\x00 three'
+    body, content_type = multipart([('name', 'caf\xe9'.encode('utf-8'), None, None),
+                                    ('upload', filedata, 'data.bin', 'application/octet-stream'),
+                                    ('name', b'second', None, None)])
+    environ = make_environ(body, content_type)
+    form = FormData(environ)
+    assert form.getvalue('name') == ['caf\xe9', 'second']
+    upload = form['upload']
+    assert upload.filename == 'data.bin'
+    assert upload.type == 'application/octet-stream'
+    assert upload.value == filedata
+    assert upload.read() == filedata
+    form.close()
+
+
+def test_multipart_matches_field_storage():
+    "The fields read from a multipart body are the same as those read by cgi.FieldStorage"
+    body, content_type = multipart([('a', b'1', None, None),
+                                    ('b', b'', None, None),
+                                    ('f', b'contents', 'f.txt', 'text/plain'),
+                                    ('a', b'2', None, None)])
+    environ = make_environ(body, content_type)
+    expected = field_storage_values(environ)
+    form = FormData(environ)
+    received = {key:form.getlist(key) for key in form.keys()}
+    assert received == expected
+    form.close()
+
+
+def test_multipart_dribbled_input():
+    "A body read a few bytes at a time, splitting the boundary between reads, gives the same fields"
+    filedata = bytes(range(256)) * 20
+    body, content_type = multipart([('a', b'first', None, None),
+                                    ('f', filedata, 'f.bin', 'application/octet-stream')])
+    environ = make_environ(body, content_type, wsgi_input=DribbleInput(body))
+    form = FormData(environ)
+    assert form.getvalue('a') == 'first'
+    assert form['f'].value == filedata
+    form.close()
+
+
+def test_multipart_preamble_and_unnamed_part():
+    "A preamble before the first boundary, and a part without a name, are ignored"
+    body, content_type = multipart([('a', b'1', None, None)])
+    body = b'preamble text\r\n' + body.replace(b'--\r\n', b'\r\nContent-Disposition: form-data\r\n\r\nno name\r\n------skipoleboundary--\r\n', 1)
+    form = FormData(make_environ(body, content_type))
+    assert form.keys() == ['a']
+
+
+def test_multipart_incomplete():
+    "A body ending before the final boundary raises ValidateError"
+    body, content_type = multipart([('a', b'1', None, None)])
+    body = body[:-30]
+    form = FormData(make_environ(body, content_type))
+    with pytest.raises(ValidateError):
+        form.keys()
+
+
+def test_multipart_invalid_boundary():
+    "A multipart content type without a boundary raises ValidateError"
+    form = FormData(make_environ(b'a', 'multipart/form-data'))
+    with pytest.raises(ValidateError):
+        form.keys()
+
+
+def test_upload_rolled_over_to_disk():
+    "An uploaded file larger than memory_limit is written to a temporary file"
+    filedata = b'x' * 5000
+    body, content_type = multipart([('f', filedata, 'big.txt', 'text/plain')])
+    form = FormData(make_environ(body, content_type), memory_limit=1000)
+    upload = form['f']
+    assert upload.file._rolled
+    assert b''.join(upload) == filedata
+    form.close()
+
+
+def test_field_larger_than_memory_limit():
+    "A field, which is not a file, larger than memory_limit raises a 413 ValidateError"
+    body, content_type = multipart([('a', b'x' * 5000, None, None)])
+    form = FormData(make_environ(body, content_type), memory_limit=1000)
+    with pytest.raises(ValidateError) as excinfo:
+        form.keys()
+    assert excinfo.value.status == '413 Payload Too Large'
+
+
+def test_body_larger_than_disk_limit():
+    "A content length larger than disk_limit raises a 413 ValidateError without reading the body"
+    environ = make_environ(b'a=' + b'x' * 5000)
+    form = FormData(environ, disk_limit=1000)
+    with pytest.raises(ValidateError) as excinfo:
+        form.keys()
+    assert excinfo.value.status == '413 Payload Too Large'
+    assert environ['wsgi.input'].tell() == 0
+
+
+def test_invalid_content_length():
+    "An invalid content length raises ValidateError"
+    environ = make_environ(b'a=1')
+    environ['CONTENT_LENGTH'] = 'abc'
+    form = FormData(environ)
+    with pytest.raises(ValidateError):
+        form.keys()
@@ -0,0 +1,51 @@
+"""
+Tests of SkipoleProject.freeze, which prepares a project to be shared by forked workers
+"""
+
+import io
+
+import pytest
+
+from skipole import skis, ServerError
+
+
+@pytest.fixture
+def app():
+    app = skis.makeapp()
+    app._skipoleproject.freeze()
+    return app
+
+
+def test_caches_built(app):
+    "The field index of every template and svg page, and the path of every page and folder, are built"
+    proj = app._skipoleproject
+    pages = [ proj.identitems[ident] for ident in proj.identitems if proj.identitems[ident].page_type in ('TemplatePage', 'SVG') ]
+    assert set(proj._field_indexes) == set(page.ident for page in pages)
+    assert len(proj._paths) == len(proj.identitems)
+    hits = proj.path_cache_hits
+    proj.page_ident_from_path(proj.url, '/css/w3.css')
+    assert proj.path_cache_hits == hits + 1
+
+
+def test_calls_served(app):
+    "A frozen project serves calls"
+    environ = {'REQUEST_METHOD':'GET', 'PATH_INFO':'/css/w3.css', 'QUERY_STRING':'', 'SERVER_NAME':'localhost',
+               'SERVER_PORT':'80', 'HTTP_HOST':'localhost', 'wsgi.url_scheme':'http', 'wsgi.input':io.BytesIO(b'')}
+    received = []
+    data = b''.join(app(environ, lambda status, headers, exc_info=None: received.append(status)))
+    assert received == ['200 OK']
+    assert data
+
+
+def test_changes_rejected(app):
+    "A frozen project cannot be reloaded or altered"
+    proj = app._skipoleproject
+    with pytest.raises(ServerError):
+        app.reload()
+    label = next(iter(proj.special_pages))
+    with pytest.raises(ServerError):
+        proj.delete_special_page(label)
+    assert label in proj.special_pages
+    with pytest.raises(ServerError):
+        proj.delete_section('anything')
+    assert not app.watch_files()
@@ -0,0 +1,49 @@
+"""
+Tests of several instances of one project, each with its own proj_ident
+"""
+
+import pytest
+
+from skipole import skis, WSGIApplication
+from skipole.ski import skiboot
+
+
+@pytest.fixture
+def lazy_load():
+    skiboot.set_lazy_load(True)
+    yield
+    skiboot.set_lazy_load(False)
+
+
+def instances():
+    "Returns the projects of two instances of the skis project, the second added to the first as a sub project"
+    first = WSGIApplication('skis', skis.PROJECTFILES, {}, skis.start_call, skis.submit_data, skis.end_call, proj_ident='first')
+    second = WSGIApplication('skis', skis.PROJECTFILES, {}, skis.start_call, skis.submit_data, skis.end_call, proj_ident='second')
+    first.add_project(second, url='/second')
+    return first._skipoleproject, first._skipoleproject.subprojects['second']
+
+
+def test_textblocks_shared():
+    "Instances of a project share its TextBlocks"
+    first, second = instances()
+    assert first.textblocks is second.textblocks
+
+
+def test_pages_per_instance():
+    "Each instance builds its own pages, holding its own idents"
+    first, second = instances()
+    for ident in first.identitems:
+        other = skiboot.Ident('second', ident.num)
+        assert first.identitems[ident] is not second.identitems[other]
+        assert second.identitems[other].ident.proj == 'second'
+    assert first.identitems[ident].url != second.identitems[other].url
+
+
+def test_page_json_shared(lazy_load):
+    "In lazy load mode, instances created in turn share the json of their template and svg pages"
+    first, second = instances()
+    sources = { item.ident.num:item for item in first.identitems.values() if hasattr(item, 'json_string') }
+    assert sources
+    for item in second.identitems.values():
+        if hasattr(item, 'json_string'):
+            assert item.json_string is sources[item.ident.num].json_string
@@ -0,0 +1,119 @@
+"""
+Tests of project snapshots, written by read_json.create_project when snapshots are enabled,
+using a copy of the skis project data
+"""
+
+import os, shutil
+
+import pytest
+
+from skipole import skis
+from skipole.ski import read_json, skiboot
+
+
+@pytest.fixture
+def projectfiles(tmp_path, monkeypatch):
+    """Copies the skis project data to a temporary directory, enables snapshots, and counts
+       the projects built from project.json in the list builds"""
+    shutil.copytree(os.path.join(skis.PROJECTFILES, 'skis', 'data'), str(tmp_path / 'skis' / 'data'))
+    builds = []
+    create = read_json._create_project
+    def counted(*args):
+        builds.append(args)
+        return create(*args)
+    monkeypatch.setattr(read_json, '_create_project', counted)
+    skiboot.set_snapshot(True, 'test secret')
+    yield str(tmp_path), builds
+    skiboot.set_snapshot(False)
+
+
+def snapshotpath(projectfiles):
+    return os.path.join(projectfiles, 'skis', 'data', 'project.snapshot')
+
+
+def projectjson(projectfiles):
+    return os.path.join(projectfiles, 'skis', 'data', 'project.json')
+
+
+def test_snapshot_written_and_used(projectfiles):
+    "The first load writes a snapshot, and the next load uses it"
+    projectfiles, builds = projectfiles
+    first = read_json.create_project('skis', projectfiles, 'skis')
+    assert len(builds) == 1
+    assert os.path.isfile(snapshotpath(projectfiles))
+    second = read_json.create_project('skis', projectfiles, 'skis')
+    assert len(builds) == 1
+    assert sorted(second['sections']) == sorted(first['sections'])
+    assert len(second['itemlist']) == len(first['itemlist'])
+
+
+def test_changed_file_is_stale(projectfiles):
+    "A snapshot is not used once project.json has a different modification time"
+    projectfiles, builds = projectfiles
+    read_json.create_project('skis', projectfiles, 'skis')
+    filestat = os.stat(projectjson(projectfiles))
+    os.utime(projectjson(projectfiles), ns=(filestat.st_atime_ns, filestat.st_mtime_ns + 10**9))
+    read_json.create_project('skis', projectfiles, 'skis')
+    assert len(builds) == 2
+    # and the new snapshot is then used
+    read_json.create_project('skis', projectfiles, 'skis')
+    assert len(builds) == 2
+
+
+def test_changed_size_is_stale(projectfiles):
+    "A snapshot is not used once project.json has a different size, even with the same modification time"
+    projectfiles, builds = projectfiles
+    read_json.create_project('skis', projectfiles, 'skis')
+    filestat = os.stat(projectjson(projectfiles))
+    with open(projectjson(projectfiles), 'a') as fp:
+        fp.write('\n')
+    os.utime(projectjson(projectfiles), ns=(filestat.st_atime_ns, filestat.st_mtime_ns))
+    read_json.create_project('skis', projectfiles, 'skis')
+    assert len(builds) == 2
+
+
+def test_lazy_mode_is_stale(projectfiles, monkeypatch):
+    "A snapshot written in one lazy load mode is not used in the other"
+    projectfiles, builds = projectfiles
+    read_json.create_project('skis', projectfiles, 'skis')
+    monkeypatch.setattr(skiboot, 'get_lazy_load', lambda: True)
+    read_json.create_project('skis', projectfiles, 'skis')
+    assert len(builds) == 2
+
+
+def test_wrong_secret(projectfiles):
+    "A snapshot signed with a different secret is not unpickled"
+    projectfiles, builds = projectfiles
+    read_json.create_project('skis', projectfiles, 'skis')
+    skiboot.set_snapshot(True, 'another secret')
+    read_json.create_project('skis', projectfiles, 'skis')
+    assert len(builds) == 2
+
+
+def test_tampered_snapshot(projectfiles):
+    "A snapshot with an altered payload is not unpickled"
+    projectfiles, builds = projectfiles
+    read_json.create_project('skis', projectfiles, 'skis')
+    with open(snapshotpath(projectfiles), 'rb') as fp:
+        data = fp.read()
+    with open(snapshotpath(projectfiles), 'wb') as fp:
+        fp.write(data[:-10] + b'x' * 10)
+    read_json.create_project('skis', projectfiles, 'skis')
+    assert len(builds) == 2
+
+
+def test_proj_ident_snapshot(projectfiles):
+    "A project loaded with a different proj_ident has its own snapshot"
+    projectfiles, builds = projectfiles
+    read_json.create_project('skis', projectfiles, 'skis')
+    read_json.create_project('tenant', projectfiles, 'skis')
+    assert len(builds) == 2
+    assert os.path.isfile(os.path.join(projectfiles, 'skis', 'data', 'project.tenant.snapshot'))
+    read_json.create_project('tenant', projectfiles, 'skis')
+    assert len(builds) == 2
+
+
+def test_secret_required():
+    "Snapshots cannot be enabled without a secret"
+    with pytest.raises(ValueError):
+        skiboot.set_snapshot(True)